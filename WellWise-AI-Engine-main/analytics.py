@@ -0,0 +1,283 @@
+"""
+Population analytics over stored predictions.
+
+Dashboards ask for the same aggregates over and over: mean predicted life
+expectancy, smoking prevalence and health-score distributions, broken down by
+state, age band and lifestyle. Rather than scanning every prediction per
+query, refresh_rollups() aggregates only the predictions saved since the last
+refresh (an _id watermark) on the server and folds the grouped cells into the
+`analytics_rollups` collection. Reports then aggregate those cells, whose
+number depends on the dimensions rather than on the number of predictions.
+Refreshing writes to the database, so it runs on a schedule (`refresh` from
+cron, e.g. every few minutes), never on the request path; GET /analytics only
+reads the rollups.
+
+Usage:
+    python analytics.py refresh
+    python analytics.py report --by state age_band --since 2025-10-01
+    python analytics.py report --by smoking --where state=Kerala --json
+    python analytics.py rebuild            # after rescoring stored predictions
+"""
+import argparse
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+import database
+import doc_schema
+
+ROLLUPS_COLLECTION = "analytics_rollups"
+META_COLLECTION = "analytics_meta"
+WATERMARK_ID = "predictions_rollup"
+# Predictions younger than this are left for the next refresh, so a writer
+# whose ObjectId was generated a little earlier than its insert isn't skipped.
+SETTLE_SECONDS = int(os.getenv("WELLWISE_ANALYTICS_SETTLE_SECONDS", 60))
+
+AGE_BANDS = [(30, "18-29"), (45, "30-44"), (60, "45-59"), (75, "60-74")]
+OLDEST_AGE_BAND = "75+"
+SMOKING_HABITS = ["Daily", "Occasionally"]
+HEALTH_SCORES = ["Diet", "Exercise", "Sleep", "Stress", "Habits"]
+SCORE_BINS = 6  # unit-wide bins 0-1 ... 5+
+# Rollup cell dimension -> field in the prediction document (either layout, see doc_schema).
+DIMENSIONS = {
+    "state": "$state",
+    "age_band": None,  # derived from $age below
+    "smoking": doc_schema.health_expr("Smoking"),
+    "alcohol": doc_schema.health_expr("Alcohol"),
+    "exercise": doc_schema.health_expr("Exercise Type"),
+    "diet_quality": doc_schema.health_expr("Diet Quality"),
+}
+
+
+def _age_band_expr():
+    return {"$switch": {
+        "branches": [{"case": {"$lt": ["$age", upper]}, "then": label} for upper, label in AGE_BANDS],
+        "default": OLDEST_AGE_BAND,
+    }}
+
+
+def _score_bin_expr(name):
+    """Histogram bin of a health score, or -1 when the prediction has no such score."""
+    score = f"$health_scores.{name}"
+    # Scores are never negative, and a missing score compares below any number.
+    return {"$cond": [
+        {"$gte": [score, 0]},
+        {"$min": [SCORE_BINS - 1, {"$max": [0, {"$floor": score}]}]},
+        -1,
+    ]}
+
+
+def _cell_pipeline(match):
+    """Aggregation that groups predictions into rollup cells (day x dimensions)."""
+    key = {"day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}}}
+    for dim, field in DIMENSIONS.items():
+        key[dim] = _age_band_expr() if dim == "age_band" else field
+
+    group = {
+        "_id": key,
+        "count": {"$sum": 1},
+        "prediction_sum": {"$sum": "$prediction"},
+        "prediction_sq_sum": {"$sum": {"$multiply": ["$prediction", "$prediction"]}},
+        "smokers": {"$sum": {"$cond": [{"$in": [DIMENSIONS["smoking"], SMOKING_HABITS]}, 1, 0]}},
+    }
+    for name in HEALTH_SCORES:
+        group[f"score_sum_{name}"] = {"$sum": f"$health_scores.{name}"}
+        for b in range(SCORE_BINS):
+            group[f"score_hist_{name}_{b}"] = {"$sum": {"$cond": [{"$eq": [_score_bin_expr(name), b]}, 1, 0]}}
+    return [
+        {"$match": match},
+        {"$match": {"prediction": {"$type": "number"}}},
+        {"$group": group},
+    ]
+
+
+def _cell_update(cell):
+    """Upsert that adds one grouped cell into its materialized rollup document."""
+    key = cell.pop("_id")
+    cell_id = "|".join(str(key.get(k)) for k in ["day", *DIMENSIONS])
+    return UpdateOne({"_id": cell_id}, {"$setOnInsert": key, "$inc": cell}, upsert=True)
+
+
+def refresh_rollups(db=None, since=None):
+    """
+    Fold predictions saved since the last refresh into the rollups.
+
+    The watermark is advanced with a compare-and-set before the new range is
+    aggregated, so concurrent refreshes never count the same predictions
+    twice; a refresh that dies halfway undercounts until the next rebuild().
+
+    Args:
+        since (datetime, optional): Also skip predictions timestamped before this
+
+    Returns:
+        int: Number of predictions folded in
+    """
+    db = db if db is not None else database.get_database()
+    if db is None:
+        return 0
+
+    meta = db[META_COLLECTION].find_one({"_id": WATERMARK_ID}) or {}
+    last_id = meta.get("last_id")
+    upper_id = ObjectId.from_datetime(datetime.now(timezone.utc) - timedelta(seconds=SETTLE_SECONDS))
+    if last_id is not None and upper_id <= last_id:
+        return 0
+
+    try:
+        claim = db[META_COLLECTION].update_one(
+            {"_id": WATERMARK_ID, "last_id": last_id},
+            {"$set": {"last_id": upper_id, "refreshed_at": datetime.now()}},
+            upsert=last_id is None
+        )
+    except DuplicateKeyError:
+        return 0  # a concurrent first refresh created the watermark
+    if claim.modified_count == 0 and claim.upserted_id is None:
+        return 0  # another refresh claimed this range
+
+    id_range = {"$lt": upper_id} if last_id is None else {"$gte": last_id, "$lt": upper_id}
+    match = {"_id": id_range}
+    if since is not None:
+        match["timestamp"] = {"$gte": since}
+    cells = list(db.predictions.aggregate(_cell_pipeline(match), allowDiskUse=True))
+    folded = sum(cell["count"] for cell in cells)
+    if cells:
+        db[ROLLUPS_COLLECTION].bulk_write([_cell_update(cell) for cell in cells], ordered=False)
+    return folded
+
+
+def rebuild(db=None):
+    """
+    Drop the rollups and watermark and aggregate all predictions again.
+
+    With a retention period (see retention.py) the cells of days whose raw
+    predictions have expired are kept, and only the retained days are rebuilt.
+    """
+    db = db if db is not None else database.get_database()
+    if db is None:
+        return 0
+    horizon = database.retention_horizon()
+    if horizon is None:
+        db[ROLLUPS_COLLECTION].delete_many({})
+    else:
+        db[ROLLUPS_COLLECTION].delete_many({"day": {"$gte": horizon.strftime("%Y-%m-%d")}})
+    db[META_COLLECTION].delete_one({"_id": WATERMARK_ID})
+    return refresh_rollups(db, since=horizon)
+
+
+def last_refresh(db=None):
+    """When the rollups were last refreshed (a datetime), or None if never."""
+    db = db if db is not None else database.get_database()
+    if db is None:
+        return None
+    meta = db[META_COLLECTION].find_one({"_id": WATERMARK_ID}) or {}
+    return meta.get("refreshed_at")
+
+
+def report(group_by=("state",), since=None, until=None, where=None, db=None):
+    """
+    Aggregate the rollups into population statistics.
+
+    Args:
+        group_by (sequence): Dimensions to break down by (see DIMENSIONS);
+            empty for one overall row
+        since (str, optional): First day, YYYY-MM-DD
+        until (str, optional): Last day, YYYY-MM-DD
+        where (dict, optional): Dimension -> value filters
+
+    Returns:
+        list: One dict per group with count, mean/std predicted life
+            expectancy, smoking prevalence and per-score mean and histogram
+    """
+    unknown = [dim for dim in list(group_by) + list(where or {}) if dim not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown dimension(s) {unknown}; choose from {list(DIMENSIONS)}.")
+    db = db if db is not None else database.get_database()
+    if db is None:
+        return []
+
+    match = dict(where or {})
+    if since or until:
+        match["day"] = {}
+        if since:
+            match["day"]["$gte"] = since
+        if until:
+            match["day"]["$lte"] = until
+
+    sum_fields = ["count", "prediction_sum", "prediction_sq_sum", "smokers"]
+    for name in HEALTH_SCORES:
+        sum_fields.append(f"score_sum_{name}")
+        sum_fields.extend(f"score_hist_{name}_{b}" for b in range(SCORE_BINS))
+    group = {"_id": {dim: f"${dim}" for dim in group_by} or None}
+    group.update({field: {"$sum": f"${field}"} for field in sum_fields})
+
+    rows = []
+    for g in db[ROLLUPS_COLLECTION].aggregate([{"$match": match}, {"$group": group}]):
+        count = g["count"]
+        if not count:
+            continue
+        mean = g["prediction_sum"] / count
+        variance = max(0.0, g["prediction_sq_sum"] / count - mean * mean)
+        row = dict(g["_id"] or {})
+        row.update({
+            "count": count,
+            "mean_prediction": round(mean, 2),
+            "std_prediction": round(variance ** 0.5, 2),
+            "smoking_prevalence": round(g["smokers"] / count, 4),
+            "health_scores": {
+                name: {
+                    "mean": round(g[f"score_sum_{name}"] / count, 2),
+                    "histogram": [g[f"score_hist_{name}_{b}"] for b in range(SCORE_BINS)],
+                }
+                for name in HEALTH_SCORES
+            },
+        })
+        rows.append(row)
+    rows.sort(key=lambda r: [str(r.get(dim)) for dim in group_by])
+    return rows
+
+
+def print_report(rows, group_by):
+    header = [*group_by, "count", "mean LE", "std", "smokers"]
+    print("  ".join(f"{h:>14}" for h in header))
+    for row in rows:
+        cells = [str(row.get(dim)) for dim in group_by]
+        cells += [f"{row['count']:,}", f"{row['mean_prediction']:.1f}", f"{row['std_prediction']:.1f}",
+                  f"{row['smoking_prevalence']:.1%}"]
+        print("  ".join(f"{c:>14}" for c in cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Population analytics over stored predictions.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("refresh", help="Fold new predictions into the rollups")
+    sub.add_parser("rebuild", help="Recompute the rollups from scratch")
+    rep = sub.add_parser("report", help="Print aggregates from the rollups")
+    rep.add_argument("--by", nargs="*", default=["state"], help=f"Dimensions: {', '.join(DIMENSIONS)}")
+    rep.add_argument("--since")
+    rep.add_argument("--until")
+    rep.add_argument("--where", nargs="*", default=[], metavar="DIM=VALUE")
+    rep.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    db = database.get_database()
+    if db is None:
+        raise SystemExit("❌ Could not connect to MongoDB.")
+    if args.command == "refresh":
+        print(f"Folded {refresh_rollups(db):,} predictions into the rollups.")
+    elif args.command == "rebuild":
+        print(f"Rebuilt the rollups from {rebuild(db):,} predictions.")
+    else:
+        refresh_rollups(db)
+        where = dict(item.split("=", 1) for item in args.where)
+        rows = report(args.by, args.since, args.until, where, db)
+        if args.json:
+            print(json.dumps(rows, indent=2))
+        else:
+            print_report(rows, args.by)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,22 @@
-from flask import Flask, request, jsonify
+import time
+import startup
+
+_import_start = time.perf_counter()
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS 
-import pandas as pd
-import numpy as np
-import joblib
-import os
 from datetime import datetime
 import json
-import database
+import analytics
+import batching
+import features
+import model_registry
+import prediction_cache
+import rules
+import storage
+import tracing
+import whatif
+np = startup.lazy_import('numpy')
+startup.record('imports', time.perf_counter() - _import_start)
 
 
 USER_DATA_FILE = "user_data.txt"
@@ -14,76 +24,123 @@ USER_DATA_FILE = "user_data.txt"
 
 app = Flask(__name__)
 CORS(app)  
+tracing.init_app(app)
 
-ALL_FAMILY_HISTORIES = ['Diabetes', 'Heart Disease', 'Cancer']
-ALL_EXISTING_CONDITIONS = ['Hypertension', 'Asthma', 'COPD']
-
-STATE_DATA = {
-    'Andhra Pradesh': {'avg_le': 70.0}, 'Arunachal Pradesh': {'avg_le': 70.3}, 'Assam': {'avg_le': 67.2},
-    'Bihar': {'avg_le': 69.5}, 'Chhattisgarh': {'avg_le': 68.9}, 'Goa': {'avg_le': 74.5},
-    'Gujarat': {'avg_le': 72.8}, 'Haryana': {'avg_le': 72.3}, 'Himachal Pradesh': {'avg_le': 74.6},
-    'Jharkhand': {'avg_le': 69.4}, 'Karnataka': {'avg_le': 72.8}, 'Kerala': {'avg_le': 77.8},
-    'Madhya Pradesh': {'avg_le': 69.4}, 'Maharashtra': {'avg_le': 73.6}, 'Manipur': {'avg_le': 75.0},
-    'Meghalaya': {'avg_le': 72.7}, 'Mizoram': {'avg_le': 74.3}, 'Nagaland': {'avg_le': 73.4},
-    'Odisha': {'avg_le': 69.8}, 'Punjab': {'avg_le': 74.4}, 'Rajasthan': {'avg_le': 70.8},
-    'Sikkim': {'avg_le': 73.5}, 'Tamil Nadu': {'avg_le': 73.8}, 'Telangana': {'avg_le': 72.7},
-    'Tripura': {'avg_le': 74.6}, 'Uttar Pradesh': {'avg_le': 68.7}, 'Uttarakhand': {'avg_le': 73.5},
-    'West Bengal': {'avg_le': 72.8}, 'Delhi': {'avg_le': 75.3}
-}
-
-try:
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    model_path = os.path.join(script_dir, 'models', 'life_expectancy_model_v15.pkl')
-    encoders_path = os.path.join(script_dir, 'models', 'label_encoders_v15.pkl')
-    model = joblib.load(model_path)
-    encoders = joblib.load(encoders_path)
-    print(" Final multi-condition model (v15) loaded successfully!")
-except FileNotFoundError:
-    print("❌ Error: Model v15 files not found. Please ensure they are in the 'models' folder.")
-    model = None
-    encoders = None
-
-def generate_recommendations(data, family_histories, existing_conditions):
-    recommendations = []
-    if data.get('Smoking') in ['Daily', 'Occasionally']:
-        recommendations.append({'title': 'Address Smoking Habit', 'text': 'Quitting smoking is the single most impactful change you can make. It could potentially add up to <strong>7 years</strong> to your life expectancy.'})
-    if data.get('Diet Quality') == 'Low':
-        recommendations.append({'title': 'Improve Your Diet Quality', 'text': 'Improving your diet by reducing junk food and sugar could shift your life expectancy by up to <strong>12 years</strong>.'})
-    if data.get('Exercise Type') == 'None':
-        recommendations.append({'title': 'Introduce Regular Exercise', 'text': 'Incorporating regular activity could extend your lifespan by up to <strong>9 years</strong> compared to being sedentary.'})
-    if 'Heart Disease' in family_histories or 'Hypertension' in existing_conditions:
-          recommendations.append({'title': 'Focus on Cardiovascular Health', 'text': 'With a predisposition to heart-related issues, focusing on a heart-healthy diet low in sodium and saturated fats is highly recommended.'})
-    
-    if not recommendations:
-        recommendations.append({
-            'title': 'Keep Up the Great Work!',
-            'text': 'Your current lifestyle choices are setting you up for a long, healthy life. Continue to focus on a balanced diet, regular exercise, and stress management. Consider regular health check-ups to stay proactive.'
-        })
-
-    return sorted(recommendations, key=lambda x: x.get('potential_gain', 0), reverse=True)
+registry = model_registry.ModelRegistry()
+batcher = batching.PredictionBatcher.from_env()
+cache = prediction_cache.PredictionCache.from_env()
+ruleset = rules.RuleSet.load()
+store = storage.get_storage()
+if startup.FAST_STARTUP:
+    # The first registry.active access loads the model; the first database call connects.
+    print(" Fast startup: model and MongoDB connection are deferred until first use.")
+else:
+    try:
+        bundle = registry.reload()
+        print(f" Model {bundle.version} loaded successfully from the registry!")
+    except (OSError, KeyError, model_registry.ModelRegistryError) as e:
+        print(f"❌ Error: Could not load the active model from 'models/manifest.json': {e}")
 
 # Initialize database
-database.init_database()
+if not startup.FAST_STARTUP:
+    with startup.timed('database_init'):
+        store.init()
+startup.record('total', time.perf_counter() - _import_start)
+print(startup.format_report())
 
 @app.route('/')
 def home():
     return jsonify({"status": "success", "message": "Life Expectancy Prediction API is running."})
 
+@app.route('/startup', methods=['GET'])
+def get_startup():
+    """Startup-time breakdown for this worker, including deferred phases that have run since."""
+    return jsonify({"status": "success", "startup": startup.report()})
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request and per-stage latency histograms of this worker, in the Prometheus text format."""
+    return Response(tracing.metrics.render(), content_type=tracing.CONTENT_TYPE)
+
 @app.route('/history', methods=['GET'])
 def get_history():
-    """Get prediction history for a user."""
+    """Get prediction history for a user, one page at a time (pass next_cursor back as ?cursor=)."""
     user_email = request.args.get('email', 'guest@wellwise.com')
-    limit = int(request.args.get('limit', 10))
-    
     try:
-        predictions = database.get_user_predictions(user_email, limit)
-        return jsonify({"status": "success", "predictions": predictions})
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({"status": "error", "message": "limit must be an integer."}), 400
+    cursor = request.args.get('cursor')
+
+    try:
+        with tracing.stage('query'):
+            predictions, next_cursor = store.get_user_predictions_page(user_email, limit, cursor)
+        return jsonify({"status": "success", "predictions": predictions, "next_cursor": next_cursor})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/history/trends', methods=['GET'])
+def get_history_trends():
+    """Prediction and health-score trends for a user, bucketed by day, week or month."""
+    user_email = request.args.get('email', 'guest@wellwise.com')
+    bucket = request.args.get('bucket', 'day')
+    since = request.args.get('since')
+
+    try:
+        with tracing.stage('query'):
+            trends = store.get_user_trends(user_email, bucket, since)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    if trends is None:
+        return jsonify({"status": "success", "trends": None, "message": "No predictions yet."})
+    return jsonify({"status": "success", "trends": trends})
+
+@app.route('/analytics', methods=['GET'])
+def get_analytics():
+    """
+    Population aggregates from the materialized rollups, e.g.
+    /analytics?by=state,age_band&since=2025-10-01&smoking=Daily
+
+    Only reads the rollups; `python analytics.py refresh` (cron) keeps them
+    current, and `refreshed_at` says how current they are.
+    """
+    group_by = [dim for dim in request.args.get('by', 'state').split(',') if dim]
+    where = {dim: value for dim, value in request.args.items() if dim in analytics.DIMENSIONS}
+    try:
+        rows = analytics.report(group_by, request.args.get('since'), request.args.get('until'), where)
+        refreshed_at = analytics.last_refresh()
+        return jsonify({"status": "success", "group_by": group_by, "rows": rows,
+                        "refreshed_at": refreshed_at.isoformat() if refreshed_at else None})
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+@app.route('/models', methods=['GET'])
+def get_models():
+    """Active/shadow model versions for this worker."""
+    status = registry.status()
+    status["batching"] = batcher.status() if batcher is not None else None
+    status["prediction_cache"] = cache.status() if cache is not None else None
+    return jsonify({"status": "success", "models": status})
+
+@app.route('/models/reload', methods=['POST'])
+def reload_models():
+    """Re-read models/manifest.json now instead of waiting for the next poll."""
+    try:
+        registry.reload()
+        return jsonify({"status": "success", "models": registry.status()})
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 @app.route('/predict', methods=['POST'])
 def predict():
-    if not model or not encoders:
+    bundle = registry.active
+    if bundle is None:
         return jsonify({'error': 'Model not loaded.'}), 500
 
     try:
@@ -92,112 +149,46 @@ def predict():
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "data": form_data
         }
-        with open(USER_DATA_FILE, "a") as f:
-            f.write(json.dumps(submission) + "\n")
+        with tracing.stage('append'):
+            with open(USER_DATA_FILE, "a") as f:
+                f.write(json.dumps(submission) + "\n")
 
         if not form_data:
             return jsonify({'error': 'Invalid JSON or no data received.'}), 400
 
-        family_histories = form_data.get('Family History', [])
-        existing_conditions = form_data.get('Existing Conditions', [])
-        
-        numeric_fields = ['Age', 'Height', 'Weight', 'BMI', 'Resting Heart Rate', 'SpO2', 'Sleep Duration', 'Daily Activity', 'Stress Score', 'Air Quality Index', 'Work Hours']
-        for field in numeric_fields:
-            if form_data.get(field): form_data[field] = pd.to_numeric(form_data[field])
-
-        input_df = pd.DataFrame([form_data])
-        
-        cols_to_map_none = ['Exercise Type']
-        for col in cols_to_map_none:
-            if col in input_df.columns:
-                input_df.loc[input_df[col] == 'None', col] = np.nan
-        
-        for h in ALL_FAMILY_HISTORIES:
-            input_df[f'FamilyHistory_{h}'] = 1 if h in family_histories else 0
-        for c in ALL_EXISTING_CONDITIONS:
-            input_df[f'ExistingConditions_{c}'] = 1 if c in existing_conditions else 0
-
-        if 'Blood Pressure' in input_df.columns:
-            bp_series = input_df.pop('Blood Pressure')
-            bp_split = bp_series.str.split('/', expand=True)
-            input_df['Systolic_Pressure'] = pd.to_numeric(bp_split[0])
-            input_df['Diastolic_Pressure'] = pd.to_numeric(bp_split[1])
-        
-        input_df = input_df.drop(columns=['Family History', 'Existing Conditions'], errors='ignore')
-
-        for col, le in encoders.items():
-            if col in input_df.columns: 
-                try:
-                    input_df[col] = le.transform(input_df[col])
-                except Exception as e:
-                    valid_labels = [str(label) for label in le.classes_]
-                    error_msg = f"Error encoding column '{col}': Value '{input_df[col].iloc[0]}' not recognized. Valid options: {valid_labels}."
-                    return jsonify({'error': error_msg}), 400
-        
-        state = form_data.get('State', 'Delhi')
-        base_le = STATE_DATA.get(state, {}).get('avg_le', 72.0)
-        
-        adjustments = []
-        if form_data.get('Smoking') in ['Daily', 'Occasionally']: adjustments.append({'factor': 'Smoking', 'impact': -7.0})
-        if form_data.get('Alcohol') == 'Daily': adjustments.append({'factor': 'Daily Alcohol', 'impact': -5.0})
-        if form_data.get('Exercise Type') == 'None' or pd.isna(form_data.get('Exercise Type')): adjustments.append({'factor': 'Lack of Exercise', 'impact': -4.0})
-        else: adjustments.append({'factor': 'Regular Exercise', 'impact': 4.5})
-        if form_data.get('Diet Quality') == 'High': adjustments.append({'factor': 'a High Quality Diet', 'impact': 5.0})
-        elif form_data.get('Diet Quality') == 'Low': adjustments.append({'factor': 'a Low Quality Diet', 'impact': -5.0})
-        
-        total_adjustment = sum(item['impact'] for item in adjustments)
-        formula_le = base_le + total_adjustment
-
-        raw_model_prediction = model.predict(input_df)[0]
-        model_adjustment = max(-5, min(5, (raw_model_prediction - formula_le) * 0.2))
-        tuned_prediction = formula_le + model_adjustment
-        
-        current_age = form_data['Age']
-        final_prediction = tuned_prediction
-        if current_age < 70 and (final_prediction - current_age) < 8: final_prediction = current_age + 8
-        elif current_age >= 70 and (final_prediction - current_age) < 4: final_prediction = current_age + 4
-        
-        state_avg_le = STATE_DATA.get(state, {}).get('avg_le', 72.0)
-        difference_from_avg = final_prediction - state_avg_le
-        years_from_current = final_prediction - current_age
-
-        if current_age > state_avg_le:
-            summary = (f"Congratulations! You have already surpassed the average life expectancy of {state_avg_le:.1f} years in {state}. "
-                       f"Based on your current lifestyle, you are on track to live up to {final_prediction:.1f} years, "
-                       f"which is {difference_from_avg:.1f} more years than the average and about {years_from_current:.1f} years from your current age.")
-        else:
-            summary_start = f"Based on your location in {state}, the average life expectancy is around {state_avg_le:.1f} years. "
-            if difference_from_avg < -1:
-                years_less = abs(difference_from_avg)
-                negative_factors = [adj['factor'].replace('a ', '') for adj in adjustments if adj['impact'] < 0]
-                factor_string = f" primarily due to factors like {', and '.join(negative_factors)}" if negative_factors else ""
-                summary = summary_start + f"You are on track to live {years_less:.1f} fewer years than the average{factor_string}."
-            elif difference_from_avg > 1:
-                years_more = difference_from_avg
-                positive_factors = [adj['factor'].replace('a ', '') for adj in adjustments if adj['impact'] > 0]
-                factor_string = f" This is largely thanks to positive choices like {', and '.join(positive_factors)}" if positive_factors else ""
-                summary = summary_start + f"You are on track to live {years_more:.1f} more years than the average.{factor_string}."
-            else:
-                summary = summary_start + f"Your predicted life expectancy of {final_prediction:.1f} years is in line with the regional average."
-        
-        recommendations = generate_recommendations(form_data, family_histories, existing_conditions)
-        
-        response_data = {
-            "prediction": round(final_prediction, 1), "current_age": current_age, "adjustments": adjustments,
-            "health_scores": {
-                "Diet": 5 - (['Low', 'Medium', 'High'].index(form_data.get('Diet Quality')) * 2),
-                "Exercise": 5 if form_data.get('Exercise Type') != 'None' and not pd.isna(form_data.get('Exercise Type')) else 1,
-                "Sleep": form_data.get('Sleep Duration', 0) / 9 * 5,
-                "Stress": 6 - (form_data.get('Stress Score', 0) / 2),
-                "Habits": 5 - (['Never', 'Occasionally', 'Daily'].index(form_data.get('Smoking'))) - (['Never', 'Occasionally', 'Daily'].index(form_data.get('Alcohol')))
-            },
-            "summary": summary, "recommendations": recommendations, "status": "success"
-        }
-        
+        with tracing.stage('normalize'):
+            features.normalize_form_data(form_data)
+        try:
+            with tracing.stage('encode'):
+                feature_vector = features.encode_vector(form_data, bundle.encoders, bundle.feature_names)
+        except features.FeatureEncodingError as e:
+            return jsonify({'error': str(e)}), 400
+
+        with tracing.stage('cache_lookup'):
+            cache_key = prediction_cache.make_key(bundle.version, feature_vector) if cache is not None else None
+            response_data = cache.get(cache_key) if cache is not None else None
+            if cache is not None:
+                tracing.cache_lookup('prediction', response_data is not None)
+        if response_data is None:
+            with tracing.stage('model'):
+                if batcher is not None:
+                    raw_model_prediction = batcher.predict(bundle, feature_vector)
+                else:
+                    raw_model_prediction = model_registry.predict_matrix(bundle, feature_vector.reshape(1, -1))[0]
+            with tracing.stage('shadow'):
+                registry.score_shadow(form_data, bundle, raw_model_prediction)
+            with tracing.stage('summary'):
+                response_data = ruleset.evaluate_one(form_data, raw_model_prediction)
+                response_data["model_version"] = bundle.version
+                response_data["status"] = "success"
+            if cache is not None:
+                cache.put(cache_key, response_data)
+
         # Save prediction to database
         try:
             user_email = form_data.get('email', 'guest@wellwise.com')
-            database.save_prediction(user_email, form_data, response_data)
+            with tracing.stage('save'):
+                store.save_prediction(user_email, form_data, response_data)
         except Exception as db_error:
             print(f"Database save error: {db_error}")
 
@@ -207,5 +198,59 @@ def predict():
         print(f"❌ An error occurred during prediction: {e}")
         return jsonify({'error': f"An unexpected error occurred: {e}"}), 500
 
+@app.route('/predict/whatif', methods=['POST'])
+def predict_whatif():
+    """Measured effect of lifestyle changes on a profile's prediction, scored in one model call."""
+    bundle = registry.active
+    if bundle is None:
+        return jsonify({'error': 'Model not loaded.'}), 500
+
+    try:
+        form_data = request.get_json()
+        if not form_data:
+            return jsonify({'error': 'Invalid JSON or no data received.'}), 400
+
+        scenario_ids = form_data.pop('scenarios', None)
+        try:
+            whatif.check_scenario_ids(scenario_ids)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        with tracing.stage('normalize'):
+            features.normalize_form_data(form_data)
+            variants = whatif.build_variants(form_data, scenario_ids)
+        try:
+            with tracing.stage('encode'):
+                X = np.vstack([features.encode_vector(data, bundle.encoders, bundle.feature_names)
+                               for data in [form_data] + [variant for _, _, _, variant in variants]])
+        except features.FeatureEncodingError as e:
+            return jsonify({'error': str(e)}), 400
+
+        with tracing.stage('model'):
+            raw_predictions = model_registry.predict_matrix(bundle, X)
+        with tracing.stage('summary'):
+            final_predictions = np.round(ruleset.final_predictions(
+                [form_data] + [variant for _, _, _, variant in variants], raw_predictions), 1)
+        if np.isnan(final_predictions[0]):
+            return jsonify({'error': "Could not score the profile: 'Age' is missing or not a number."}), 400
+
+        scenarios = []
+        for (scenario_id, title, changes, _), prediction, raw in zip(variants, final_predictions[1:], raw_predictions[1:]):
+            scenarios.append({
+                "id": scenario_id, "title": title, "changes": changes, "prediction": float(prediction),
+                "delta_years": round(float(prediction - final_predictions[0]), 1),
+                "model_delta_years": round(float(raw - raw_predictions[0]), 2)
+            })
+        scenarios.sort(key=lambda x: x['delta_years'], reverse=True)
+
+        return jsonify({
+            "baseline_prediction": float(final_predictions[0]), "current_age": form_data.get('Age'),
+            "scenarios": scenarios, "model_version": bundle.version, "status": "success"
+        })
+
+    except Exception as e:
+        print(f"❌ An error occurred during what-if prediction: {e}")
+        return jsonify({'error': f"An unexpected error occurred: {e}"}), 500
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
\ No newline at end of file
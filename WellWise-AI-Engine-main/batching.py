@@ -0,0 +1,105 @@
+"""
+Micro-batching for concurrent /predict traffic.
+
+Request threads hand their encoded feature row to a PredictionBatcher and
+block; a single dispatcher thread gathers whatever arrives within a few
+milliseconds (up to a maximum batch size), scores it as one matrix and hands
+each result back to its waiting request. One model call per batch instead of
+one per request raises throughput per core at peak.
+
+Enabled by setting WELLWISE_BATCH_MAX_SIZE above 1; WELLWISE_BATCH_MAX_WAIT_MS
+bounds the extra latency a request can pick up while a batch fills.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import model_registry
+import startup
+
+np = startup.lazy_import('numpy')
+
+BATCH_MAX_SIZE = int(os.getenv("WELLWISE_BATCH_MAX_SIZE", 1))
+BATCH_MAX_WAIT_MS = float(os.getenv("WELLWISE_BATCH_MAX_WAIT_MS", 2.0))
+
+
+class PredictionBatcher:
+    """Coalesces concurrent single-row predictions into batched model calls."""
+
+    def __init__(self, max_batch=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'requests': 0, 'batches': 0, 'largest_batch': 0}
+
+    @classmethod
+    def from_env(cls):
+        """A batcher configured from the environment, or None when batching is off."""
+        return cls() if BATCH_MAX_SIZE > 1 else None
+
+    def predict(self, bundle, feature_vector):
+        """Raw model prediction for one encoded feature vector; blocks until its batch is scored."""
+        row = np.asarray(feature_vector, dtype=np.float64).reshape(-1)
+        future = Future()
+        self._ensure_dispatcher()
+        self._queue.put((bundle, row, future))
+        return future.result()
+
+    def _ensure_dispatcher(self):
+        # Started on first use rather than in __init__, so a preloading
+        # gunicorn master never forks with a live thread.
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._dispatch_forever, name="prediction-batcher", daemon=True)
+                    self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            try:
+                # Take anything already queued without waiting, then wait out the deadline.
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch_forever(self):
+        while True:
+            batch = self._collect()
+            self.stats['requests'] += len(batch)
+            self.stats['batches'] += 1
+            self.stats['largest_batch'] = max(self.stats['largest_batch'], len(batch))
+
+            # A hot swap can land mid-batch; score each model version's rows with that version.
+            by_version = {}
+            for bundle, row, future in batch:
+                by_version.setdefault(bundle.version, (bundle, []))[1].append((row, future))
+            for bundle, items in by_version.values():
+                futures = [future for _, future in items]
+                try:
+                    preds = model_registry.predict_matrix(bundle, np.vstack([row for row, _ in items]))
+                except Exception as e:
+                    for future in futures:
+                        future.set_exception(e)
+                    continue
+                for future, pred in zip(futures, preds):
+                    future.set_result(float(pred))
+
+    def status(self):
+        batches = self.stats['batches']
+        return dict(self.stats, max_batch=self.max_batch, max_wait_ms=self.max_wait * 1000,
+                    mean_batch=round(self.stats['requests'] / batches, 2) if batches else None)
@@ -1,42 +1,97 @@
+from bson import ObjectId
+from bson.errors import InvalidId
 from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 
+import doc_schema
+
 load_dotenv()
 
 # MongoDB connection
 MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017/")
 DATABASE_NAME = "wellwise_db"
 
+# Largest /history page; deeper history is paged with the keyset cursor.
+MAX_HISTORY_PAGE_SIZE = 50
+# Only the fields the history endpoint returns (_id is always included).
+HISTORY_PROJECTION = {"timestamp": 1, "prediction": 1, "current_age": 1, "age": 1, "state": 1, "health_scores": 1}
+
+# One rollup document per user (_id = user_email) with per-day sums, kept
+# current by save_prediction so trend reads are a single document fetch.
+TRENDS_COLLECTION = "prediction_trends"
+TREND_BUCKETS = ['day', 'week', 'month']
+
+# Opt-in MongoDB time-series layout for `predictions` (metaField user_email);
+# rescoring and retention.py then need MongoDB 7.0+ for updates and deletes.
+PREDICTIONS_TIMESERIES = os.getenv("WELLWISE_PREDICTIONS_TIMESERIES", "0") == "1"
+# Raw predictions older than this many days are dropped by retention.py once
+# folded into the rollups; 0 keeps them forever.
+PREDICTION_RETENTION_DAYS = int(os.getenv("WELLWISE_PREDICTION_RETENTION_DAYS", 0))
+# A time-series collection also expires its buckets natively, this many days
+# after retention.py should already have removed them.
+TIMESERIES_TTL_GRACE_DAYS = 7
+
+_client = None
+_initialized = False
+
 def get_database():
-    """Get MongoDB database connection."""
+    """
+    Get MongoDB database connection.
+
+    The client is created (and pinged) once per process and reused; the first
+    successful connection also creates collections and indexes if needed.
+    """
+    global _client
     try:
-        client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
-        # Test connection
-        client.admin.command('ping')
-        return client[DATABASE_NAME]
+        if _client is None:
+            client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=5000)
+            # Test connection
+            client.admin.command('ping')
+            _client = client
+        db = _client[DATABASE_NAME]
     except ConnectionFailure as e:
         print(f"MongoDB connection failed: {e}")
         return None
+    if not _initialized:
+        init_database(db)
+    return db
+
+def reset_connection():
+    """Drop the process-wide client, e.g. in a freshly forked worker."""
+    global _client
+    _client = None
 
-def init_database():
+def init_database(db=None):
     """Initialize MongoDB and create collections if needed."""
-    db = get_database()
+    global _initialized
     if db is None:
-        print("Failed to connect to MongoDB")
-        return False
+        if get_database() is None:
+            print("Failed to connect to MongoDB")
+            return False
+        return True
+    _initialized = True
     
     # Create collections  if they don't exist
     collections = db.list_collection_names()
     
     if 'predictions' not in collections:
-        db.create_collection('predictions')
-        # Create indexes
-        db.predictions.create_index([("user_email", 1), ("timestamp", -1)])
+        create_predictions_collection(db)
         print("Created 'predictions' collection with indexes")
     
+    # Serves per-user history newest-first, including the (timestamp, _id) keyset
+    # pagination; created unconditionally so existing deployments get it too.
+    db.predictions.create_index([("user_email", 1), ("timestamp", -1), ("_id", -1)])
+
+    if TRENDS_COLLECTION not in collections:
+        db.create_collection(TRENDS_COLLECTION)
+        print(f"Created '{TRENDS_COLLECTION}' collection")
+
+    # Rollup cells are matched on day ranges by analytics.report.
+    db.analytics_rollups.create_index("day")
+
     if 'users' not in collections:
         db.create_collection('users')
         db.users.create_index("email", unique=True)
@@ -45,6 +100,40 @@ def init_database():
     print("MongoDB initialized successfully!")
     return True
 
+def retention_horizon(now=None):
+    """
+    Start of the oldest day whose raw predictions are kept, or None when they
+    are kept forever. Day-aligned, so a day is either entirely raw or entirely
+    rolled up.
+    """
+    if not PREDICTION_RETENTION_DAYS:
+        return None
+    today = (now or datetime.now()).date()
+    return datetime.combine(today - timedelta(days=PREDICTION_RETENTION_DAYS), datetime.min.time())
+
+def create_predictions_collection(db, name='predictions'):
+    """Create the predictions collection in the configured layout."""
+    if PREDICTIONS_TIMESERIES:
+        options = {"timeseries": {"timeField": "timestamp", "metaField": "user_email", "granularity": "hours"}}
+        if PREDICTION_RETENTION_DAYS:
+            options["expireAfterSeconds"] = (PREDICTION_RETENTION_DAYS + TIMESERIES_TTL_GRACE_DAYS) * 86400
+        # Time-series collections don't support schema validation.
+        db.create_collection(name, **options)
+    else:
+        db.create_collection(name)
+        # Existing collections get the validator from scripts/migrate_prediction_docs.py.
+        apply_prediction_validator(db)
+
+def apply_prediction_validator(db):
+    """Validate new prediction documents against the compact schema (see doc_schema.py)."""
+    try:
+        db.command("collMod", "predictions", validator=doc_schema.validator(), validationLevel="moderate")
+        return True
+    except Exception as e:
+        # e.g. a user without collMod rights; documents are still written in the compact layout.
+        print(f"Could not apply the predictions schema validator: {e}")
+        return False
+
 def save_prediction(user_email, form_data, prediction_data):
     """
     Save a health prediction to MongoDB.
@@ -58,60 +147,289 @@ def save_prediction(user_email, form_data, prediction_data):
     if db is None:
         return {"status": "error", "message": "Database connection failed"}
     
-    prediction_doc = {
-        "user_email": user_email,
-        "timestamp": datetime.now(),
-        "age": form_data.get('Age'),
-        "prediction": prediction_data.get('prediction'),
-        "current_age": prediction_data.get('current_age'),
-        "state": form_data.get('State'),
-        "health_data": form_data,
-        "adjustments": prediction_data.get('adjustments', []),
-        "recommendations": prediction_data.get('recommendations', []),
-        "health_scores": prediction_data.get('health_scores', {})
-    }
-    
+    prediction_doc = doc_schema.encode_prediction(user_email, datetime.now(), form_data, prediction_data)
+
     try:
         result = db.predictions.insert_one(prediction_doc)
-        return {"status": "success", "id": str(result.inserted_id)}
     except Exception as e:
         return {"status": "error", "message": str(e)}
 
-def get_user_predictions(user_email, limit=10):
+    try:
+        update_user_trends(db, user_email, prediction_doc["timestamp"],
+                           prediction_doc["prediction"], prediction_doc["health_scores"])
+    except Exception as e:
+        # The rollup can be rebuilt from the predictions; don't fail the save over it.
+        print(f"Error updating trend rollup: {e}")
+    return {"status": "success", "id": str(result.inserted_id)}
+
+def update_user_trends(db, user_email, timestamp, prediction, health_scores):
+    """Fold one just-saved prediction into the user's trend rollup document."""
+    day = timestamp.strftime("%Y-%m-%d")
+    inc = {"count": 1, f"days.{day}.count": 1}
+    if isinstance(prediction, (int, float)):
+        inc["prediction_sum"] = prediction
+        inc[f"days.{day}.prediction_sum"] = prediction
+    for name, score in (health_scores or {}).items():
+        if isinstance(score, (int, float)):
+            inc[f"days.{day}.scores.{name}"] = score
+    result = db[TRENDS_COLLECTION].update_one(
+        {"_id": user_email},
+        {"$inc": inc, "$min": {"first_at": timestamp}, "$max": {"last_at": timestamp},
+         "$set": {"latest_prediction": prediction}}
+    )
+    if result.matched_count == 0:
+        # No rollup yet: build it from all of the user's predictions (this one
+        # included) so history saved before rollups existed is not lost.
+        rebuild_user_trends(user_email, db)
+
+def rebuild_user_trends(user_email, db=None):
     """
-    Get recent predictions for a user.
-    
+    Recompute a user's trend rollup from their predictions with an aggregation pipeline.
+
+    Used for users whose history predates the rollup, or to repair it.
+
+    Returns:
+        dict: The rollup document, or None if the user has no predictions
+    """
+    db = db if db is not None else get_database()
+    if db is None:
+        return None
+
+    match = {"user_email": user_email}
+    existing, kept = None, {}
+    horizon = retention_horizon()
+    if horizon is not None:
+        # Days whose raw predictions have expired survive only in the rollup.
+        match["timestamp"] = {"$gte": horizon}
+        existing = db[TRENDS_COLLECTION].find_one({"_id": user_email})
+        horizon_day = horizon.strftime("%Y-%m-%d")
+        kept = {day: v for day, v in (existing or {}).get("days", {}).items() if day < horizon_day}
+
+    latest = db.predictions.find_one(match, {"prediction": 1, "health_scores": 1},
+                                     sort=[("timestamp", -1), ("_id", -1)])
+    if latest is None:
+        return existing
+    score_names = list(latest.get("health_scores") or {})
+
+    group = {
+        "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$timestamp"}},
+        "count": {"$sum": 1},
+        "prediction_sum": {"$sum": "$prediction"},
+        "first_at": {"$min": "$timestamp"},
+        "last_at": {"$max": "$timestamp"},
+    }
+    for name in score_names:
+        group[f"score_{name}"] = {"$sum": f"$health_scores.{name}"}
+    days = list(db.predictions.aggregate([
+        {"$match": match},
+        {"$group": group},
+        {"$sort": {"_id": 1}},
+    ]))
+
+    day_sums = dict(kept)
+    day_sums.update({
+        d["_id"]: {"count": d["count"], "prediction_sum": d["prediction_sum"],
+                   "scores": {name: d[f"score_{name}"] for name in score_names}}
+        for d in days
+    })
+    rollup = {
+        "_id": user_email,
+        "count": sum(d["count"] for d in day_sums.values()),
+        "prediction_sum": sum(d["prediction_sum"] for d in day_sums.values()),
+        "first_at": existing["first_at"] if kept else days[0]["first_at"],
+        "last_at": days[-1]["last_at"],
+        "latest_prediction": latest.get("prediction"),
+        "days": day_sums,
+    }
+    db[TRENDS_COLLECTION].replace_one({"_id": user_email}, rollup, upsert=True)
+    return rollup
+
+def _bucket_key(day, bucket):
+    if bucket == 'day':
+        return day
+    if bucket == 'month':
+        return day[:7]
+    year, week, _ = datetime.strptime(day, "%Y-%m-%d").isocalendar()
+    return f"{year}-W{week:02d}"
+
+def get_user_trends(user_email, bucket='day', since=None):
+    """
+    Bucketed series of a user's predictions and health scores over time.
+
     Args:
         user_email (str): User's email
-        limit (int): Number of predictions to retrieve
-    
+        bucket (str): 'day', 'week' (ISO) or 'month'
+        since (str, optional): First day to include, as YYYY-MM-DD
+
     Returns:
-        list: List of prediction documents
+        dict: Overall summary and a chronological list of buckets with the
+            number of predictions and mean prediction/health scores, or None
+            if the user has no predictions
     """
+    if bucket not in TREND_BUCKETS:
+        raise ValueError(f"bucket must be one of {TREND_BUCKETS}.")
+    if since:
+        datetime.strptime(since, "%Y-%m-%d")
+
     db = get_database()
     if db is None:
-        return []
-    
+        return None
+    rollup = db[TRENDS_COLLECTION].find_one({"_id": user_email})
+    if rollup is None:
+        rollup = rebuild_user_trends(user_email, db)
+        if rollup is None:
+            return None
+    return summarize_trends(rollup, bucket, since)
+
+def summarize_trends(rollup, bucket='day', since=None):
+    """get_user_trends' response for a trend rollup document (per-day sums)."""
+    buckets = {}
+    for day in sorted(rollup.get("days", {})):
+        if since and day < since:
+            continue
+        stats = rollup["days"][day]
+        b = buckets.setdefault(_bucket_key(day, bucket), {"count": 0, "prediction_sum": 0.0, "scores": {}})
+        b["count"] += stats["count"]
+        b["prediction_sum"] += stats.get("prediction_sum", 0)
+        for name, total in stats.get("scores", {}).items():
+            b["scores"][name] = b["scores"].get(name, 0) + total
+
+    series = [{
+        "period": period, "count": b["count"],
+        "prediction": round(b["prediction_sum"] / b["count"], 1),
+        "health_scores": {name: round(total / b["count"], 2) for name, total in b["scores"].items()}
+    } for period, b in buckets.items()]
+
+    count = rollup.get("count", 0)
+    return {
+        "count": count,
+        "first_at": rollup["first_at"].isoformat(),
+        "last_at": rollup["last_at"].isoformat(),
+        "latest_prediction": rollup.get("latest_prediction"),
+        "mean_prediction": round(rollup.get("prediction_sum", 0) / count, 1) if count else None,
+        "bucket": bucket,
+        "series": series
+    }
+
+def save_predictions(records):
+    """
+    Save many predictions with one bulk insert.
+
+    Args:
+        records (iterable): (user_email, timestamp, form_data, prediction_data) tuples
+
+    Returns:
+        dict: status and the number of predictions saved
+    """
+    db = get_database()
+    if db is None:
+        return {"status": "error", "message": "Database connection failed"}
+
+    docs = [doc_schema.encode_prediction(user_email, timestamp, form_data, prediction_data)
+            for user_email, timestamp, form_data, prediction_data in records]
+    if not docs:
+        return {"status": "success", "count": 0}
     try:
-        predictions = db.predictions.find(
-            {"user_email": user_email}
-        ).sort("timestamp", -1).limit(limit)
-        
-        results = []
-        for pred in predictions:
-            results.append({
-                "id": str(pred["_id"]),
-                "timestamp": pred["timestamp"].isoformat(),
-                "prediction": pred.get("prediction"),
-                "current_age": pred.get("current_age"),
-                "state": pred.get("state"),
-                "health_scores": pred.get("health_scores", {})
-            })
-        
-        return results
+        db.predictions.insert_many(docs, ordered=False)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    # A user without a rollup gets one rebuilt from everything just inserted,
+    # so their other predictions in this batch must not be added on top.
+    rebuilt, has_rollup = set(), set()
+    for doc in docs:
+        user_email = doc["user_email"]
+        if user_email in rebuilt:
+            continue
+        try:
+            if user_email not in has_rollup:
+                if db[TRENDS_COLLECTION].count_documents({"_id": user_email}, limit=1) == 0:
+                    rebuild_user_trends(user_email, db)
+                    rebuilt.add(user_email)
+                    continue
+                has_rollup.add(user_email)
+            update_user_trends(db, user_email, doc["timestamp"], doc["prediction"], doc["health_scores"])
+        except Exception as e:
+            print(f"Error updating trend rollup: {e}")
+    return {"status": "success", "count": len(docs)}
+
+def encode_history_cursor(timestamp, prediction_id):
+    """Opaque keyset cursor for the history entry after which the next page starts."""
+    return f"{timestamp.isoformat()}_{prediction_id}"
+
+def decode_history_cursor(cursor):
+    """Inverse of encode_history_cursor; raises ValueError for a malformed cursor."""
+    timestamp, _, prediction_id = cursor.rpartition('_')
+    try:
+        return datetime.fromisoformat(timestamp), ObjectId(prediction_id)
+    except (InvalidId, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid history cursor: {cursor!r}") from e
+
+def get_user_predictions_page(user_email, limit=10, cursor=None):
+    """
+    Get one page of a user's predictions, newest first.
+
+    Pages are keyed on (timestamp, _id) rather than skipped over, so deep pages
+    cost the same as the first one, and only the returned fields are fetched.
+
+    Args:
+        user_email (str): User's email
+        limit (int): Page size, capped at MAX_HISTORY_PAGE_SIZE
+        cursor (str, optional): next_cursor of the previous page
+
+    Returns:
+        tuple: (list of prediction documents, next_cursor or None)
+    """
+    db = get_database()
+    if db is None:
+        return [], None
+
+    limit = max(1, min(limit, MAX_HISTORY_PAGE_SIZE))
+    query = {"user_email": user_email}
+    if cursor:
+        timestamp, prediction_id = decode_history_cursor(cursor)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "_id": {"$lt": prediction_id}}
+        ]
+
+    try:
+        # One extra document tells us whether there is a next page.
+        predictions = list(db.predictions.find(query, HISTORY_PROJECTION)
+                           .sort([("timestamp", -1), ("_id", -1)]).limit(limit + 1))
     except Exception as e:
         print(f"Error retrieving predictions: {e}")
-        return []
+        return [], None
+
+    next_cursor = None
+    if len(predictions) > limit:
+        predictions = predictions[:limit]
+        next_cursor = encode_history_cursor(predictions[-1]["timestamp"], predictions[-1]["_id"])
+
+    results = []
+    for pred in predictions:
+        results.append({
+            "id": str(pred["_id"]),
+            "timestamp": pred["timestamp"].isoformat(),
+            "prediction": pred.get("prediction"),
+            # Compact (v2) documents keep the age only once, as "age".
+            "current_age": pred.get("current_age", pred.get("age")),
+            "state": pred.get("state"),
+            "health_scores": pred.get("health_scores", {})
+        })
+    return results, next_cursor
+
+def get_user_predictions(user_email, limit=10):
+    """
+    Get recent predictions for a user.
+    
+    Args:
+        user_email (str): User's email
+        limit (int): Number of predictions to retrieve (capped at MAX_HISTORY_PAGE_SIZE)
+    
+    Returns:
+        list: List of prediction documents
+    """
+    return get_user_predictions_page(user_email, limit)[0]
 
 def save_user(email, name, password_hash):
     """
@@ -0,0 +1,284 @@
+"""
+Compact layout of documents in the `predictions` collection.
+
+Version 1 documents (no "v" field) store the submitted form under its human
+keys ("Junk Food Frequency": "Never"), the full recommendation text and the
+adjustment list in every document. Version 2 keeps the fields that indexes
+and aggregation pipelines query (user_email, timestamp, prediction, state,
+age, model_version, health_scores) and stores the rest compactly:
+
+    h   the form, with short keys and categorical values as integer codes
+    r   recommendation ids into the rule table's catalog (rules.json)
+    a   [adjustment id, impact] pairs
+
+decode_prediction() turns either version back into the version 1 layout, so
+readers never need to know which one they got. The code tables below are
+append-only: existing codes must never be reordered or removed. A value that
+isn't in a table is stored as-is, so nothing is lost when the form grows a
+new option; a number is stored as {"raw": number}, so that it is never read
+back as a code.
+"""
+import json
+
+import rules
+
+SCHEMA_VERSION = 2
+
+# Form field -> (short key, code table or None). Lists are encoded item-wise.
+HEALTH_FIELDS = {
+    "Age": ("ag", None),
+    "Gender": ("g", ["Male", "Female", "Other"]),
+    "Ethnicity": ("et", ["North Indian", "South Indian", "Punjabi", "Gujarati", "Bengali"]),
+    "Height": ("ht", None),
+    "Weight": ("wt", None),
+    "BMI": ("bmi", None),
+    "Blood Pressure": ("bp", None),
+    "Resting Heart Rate": ("hr", None),
+    "SpO2": ("o2", None),
+    "Diet Type": ("dt", ["Vegetarian", "Non-Vegetarian", "Vegan", "Mixed"]),
+    "Protein Intake": ("pi", ["Low", "Medium", "High"]),
+    "Junk Food Frequency": ("jf", ["Never", "Low", "Medium", "High"]),
+    "Sugar Intake": ("si", ["Low", "Medium", "High"]),
+    "Diet Quality": ("dq", ["Low", "Medium", "High"]),
+    "Smoking": ("sm", ["Never", "Occasionally", "Daily"]),
+    "Alcohol": ("al", ["Never", "Occasionally", "Daily"]),
+    "Sleep Duration": ("sd", None),
+    "Sleep Quality": ("sq", ["Poor", "Average", "Good"]),
+    "Daily Activity": ("da", None),
+    "Exercise Type": ("ex", ["None", "Walking", "Gym", "Yoga", "Running"]),
+    "Work Hours": ("wh", None),
+    "Existing Conditions": ("ec", ["Hypertension", "Asthma", "COPD"]),
+    "Family History": ("fh", ["Diabetes", "Heart Disease", "Cancer"]),
+    "Stress Score": ("ss", None),
+    "Air Quality Index": ("aq", None),
+    "Exposure": ("xp", ["Low", "Medium", "High"]),
+    "Urban/Rural": ("ur", ["Urban", "Rural"]),
+    "State": ("st", [
+        "Andhra Pradesh", "Arunachal Pradesh", "Assam", "Bihar", "Chhattisgarh", "Goa", "Gujarat", "Haryana",
+        "Himachal Pradesh", "Jharkhand", "Karnataka", "Kerala", "Madhya Pradesh", "Maharashtra", "Manipur",
+        "Meghalaya", "Mizoram", "Nagaland", "Odisha", "Punjab", "Rajasthan", "Sikkim", "Tamil Nadu", "Telangana",
+        "Tripura", "Uttar Pradesh", "Uttarakhand", "West Bengal", "Delhi"]),
+    "City": ("ci", None),
+    "email": ("em", None),
+}
+_FIELD_BY_KEY = {key: field for field, (key, _) in HEALTH_FIELDS.items()}
+_CODES = {field: {value: i for i, value in enumerate(table)}
+          for field, (_, table) in HEALTH_FIELDS.items() if table}
+
+# Version 1 fields that the compact layout replaces.
+LEGACY_FIELDS = ["health_data", "recommendations", "adjustments", "current_age"]
+
+_catalog = None
+
+
+class Catalog:
+    """Recommendation and adjustment ids <-> their entries in the rule table."""
+
+    def __init__(self, table):
+        self.recommendations = {rule['id']: {'id': rule['id'], 'title': rule['title'], 'text': rule['text']}
+                                for rule in table['recommendations']}
+        self.adjustments = {rule['id']: rule['factor'] for rule in table['adjustments']}
+        self.adjustment_ids = {factor: rule_id for rule_id, factor in self.adjustments.items()}
+
+
+def catalog():
+    """The shared catalog, read once from the rule table."""
+    global _catalog
+    if _catalog is None:
+        with open(rules.RULES_FILE) as f:
+            _catalog = Catalog(json.load(f))
+    return _catalog
+
+
+def _plain(value):
+    # numpy scalars from normalize_form_data -> BSON-encodable Python numbers
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _encode_value(field, value):
+    codes = _CODES.get(field)
+    if codes is None:
+        return _plain(value)
+    if isinstance(value, list):
+        return [_encode_code(codes, item) for item in value]
+    return _encode_code(codes, value)
+
+
+def _encode_code(codes, value):
+    if isinstance(value, str) and value in codes:
+        return codes[value]
+    value = _plain(value)
+    # A number is never a code here (codes come only from the table above), so
+    # it is marked as raw to keep it from being decoded as one.
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return {"raw": value}
+    return value
+
+
+def _decode_value(field, value):
+    table = HEALTH_FIELDS.get(field, (None, None))[1]
+    if table is None:
+        return value
+    if isinstance(value, list):
+        return [_lookup_code(table, item) for item in value]
+    return _lookup_code(table, value)
+
+
+def _lookup_code(table, value):
+    if isinstance(value, dict) and "raw" in value:
+        return value["raw"]
+    # bool is an int subclass but never a code
+    if isinstance(value, int) and not isinstance(value, bool) and 0 <= value < len(table):
+        return table[value]
+    return value
+
+
+def encode_health(form_data):
+    """Compact form of a health form: short keys and integer category codes."""
+    compact = {}
+    for field, value in form_data.items():
+        key = HEALTH_FIELDS[field][0] if field in HEALTH_FIELDS else field
+        compact[key] = _encode_value(field, value)
+    return compact
+
+
+def decode_health(compact):
+    """Inverse of encode_health."""
+    form_data = {}
+    for key, value in compact.items():
+        field = _FIELD_BY_KEY.get(key, key)
+        form_data[field] = _decode_value(field, value)
+    return form_data
+
+
+def compact_fields(form_data, prediction_data, model_version=None):
+    """The version 2 fields derived from a form and its /predict response."""
+    cat = catalog()
+    return {
+        "v": SCHEMA_VERSION,
+        "age": _plain(form_data.get('Age')),
+        "state": form_data.get('State'),
+        "prediction": prediction_data.get('prediction'),
+        "model_version": model_version or prediction_data.get('model_version'),
+        "health_scores": prediction_data.get('health_scores', {}),
+        "h": encode_health(form_data),
+        "r": [rec.get('id') for rec in prediction_data.get('recommendations', [])],
+        "a": [[cat.adjustment_ids.get(adj['factor'], adj['factor']), adj['impact']]
+              for adj in prediction_data.get('adjustments', [])],
+    }
+
+
+def encode_prediction(user_email, timestamp, form_data, prediction_data):
+    """A new prediction document in the current layout."""
+    doc = {"user_email": user_email, "timestamp": timestamp}
+    doc.update(compact_fields(form_data, prediction_data))
+    return doc
+
+
+def upgrade(doc):
+    """
+    The version 2 fields for a version 1 document.
+
+    Stored recommendations are matched to the catalog by id or, for
+    documents older than the ids, by title; one the catalog doesn't know
+    is kept as its title.
+    """
+    cat = catalog()
+    by_title = {rec['title']: rec_id for rec_id, rec in cat.recommendations.items()}
+    recommendations = [{'id': rec.get('id') or by_title.get(rec.get('title'), rec.get('title'))}
+                       for rec in doc.get('recommendations', [])]
+    prediction_data = {
+        'prediction': doc.get('prediction'),
+        'health_scores': doc.get('health_scores', {}),
+        'recommendations': recommendations,
+        'adjustments': doc.get('adjustments', []),
+    }
+    fields = compact_fields(doc.get('health_data') or {}, prediction_data, doc.get('model_version'))
+    # Keep what the document already had for the fields queried in place.
+    for name in ("age", "state"):
+        if name in doc:
+            fields[name] = doc[name]
+    return fields
+
+
+def decode_prediction(doc):
+    """Any stored prediction document in the version 1 layout (missing fields stay missing)."""
+    if doc is None or doc.get('v') is None:
+        return doc
+    cat = catalog()
+    decoded = {k: v for k, v in doc.items() if k not in ('v', 'h', 'r', 'a')}
+    if 'h' in doc:
+        decoded['health_data'] = decode_health(doc['h'])
+    if 'age' in doc:
+        decoded['current_age'] = doc['age']
+    if 'r' in doc:
+        decoded['recommendations'] = [cat.recommendations.get(rec_id, {'id': rec_id, 'title': rec_id, 'text': ''})
+                                      for rec_id in doc['r']]
+    if 'a' in doc:
+        decoded['adjustments'] = [{'factor': cat.adjustments.get(adj_id, adj_id), 'impact': impact}
+                                  for adj_id, impact in doc['a']]
+    return decoded
+
+
+def projection(fields):
+    """A find() projection that fetches `fields` (version 1 names) from either layout."""
+    if not fields:
+        return None
+    proj = {"v": 1}
+    compact = {"health_data": "h", "recommendations": "r", "adjustments": "a", "current_age": "age"}
+    for field in fields:
+        proj[field] = 1
+        head, _, rest = field.partition('.')
+        if head == "health_data" and rest in HEALTH_FIELDS:
+            proj[f"h.{HEALTH_FIELDS[rest][0]}"] = 1
+        elif head in compact:
+            proj[compact[head]] = 1
+    # A parent and one of its subfields can't both be projected.
+    for field in list(proj):
+        head = field.partition('.')[0]
+        if head != field and head in proj:
+            del proj[field]
+    return proj
+
+
+def health_filter(field, value):
+    """find() filter matching documents in either layout whose health form `field` equals `value`."""
+    key = HEALTH_FIELDS[field][0]
+    return {"$or": [{f"health_data.{field}": value}, {f"h.{key}": _encode_value(field, value)}]}
+
+
+def health_expr(field):
+    """
+    Aggregation expression for a health form field in either layout, with
+    category codes turned back into their values.
+    """
+    key, table = HEALTH_FIELDS[field]
+    compact = f"$h.{key}"
+    if table:
+        compact = {"$switch": {
+            "branches": [{"case": {"$eq": [compact, i]}, "then": value} for i, value in enumerate(table)],
+            "default": {"$ifNull": [f"{compact}.raw", compact]},
+        }}
+    return {"$ifNull": [f"$health_data.{field}", compact]}
+
+
+def validator():
+    """$jsonSchema for version 2 documents (applied with validationLevel 'moderate')."""
+    number = ["double", "int", "long", "decimal"]
+    return {"$jsonSchema": {
+        "bsonType": "object",
+        "required": ["v", "user_email", "timestamp", "prediction", "h"],
+        "properties": {
+            "v": {"enum": [SCHEMA_VERSION]},
+            "user_email": {"bsonType": "string"},
+            "timestamp": {"bsonType": "date"},
+            "prediction": {"bsonType": number},
+            "model_version": {"bsonType": ["string", "null"]},
+            "age": {"bsonType": number + ["null"]},
+            "state": {"bsonType": ["string", "null"]},
+            "health_scores": {"bsonType": "object", "additionalProperties": {"bsonType": number}},
+            "h": {"bsonType": "object"},
+            "r": {"bsonType": "array", "items": {"bsonType": "string"}},
+            "a": {"bsonType": "array", "items": {"bsonType": "array", "minItems": 2, "maxItems": 2}},
+        },
+    }}
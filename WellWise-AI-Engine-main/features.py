@@ -0,0 +1,167 @@
+"""
+Feature pipeline shared by the API and the model registry.
+
+Turns submitted health form data into the encoded frame the life expectancy
+model was trained on (see scripts/new_model_train.py).
+"""
+import startup
+
+pd = startup.lazy_import('pandas')
+np = startup.lazy_import('numpy')
+
+ALL_FAMILY_HISTORIES = ['Diabetes', 'Heart Disease', 'Cancer']
+ALL_EXISTING_CONDITIONS = ['Hypertension', 'Asthma', 'COPD']
+
+NUMERIC_FIELDS = ['Age', 'Height', 'Weight', 'BMI', 'Resting Heart Rate', 'SpO2', 'Sleep Duration',
+                  'Daily Activity', 'Stress Score', 'Air Quality Index', 'Work Hours']
+
+
+class FeatureEncodingError(ValueError):
+    """Raised when a submitted value is not recognised by the model's encoders."""
+
+
+class LabelLookup:
+    """
+    Drop-in for a fitted LabelEncoder, loaded from the JSON encoder export.
+
+    Avoids importing scikit-learn and unpickling encoders at startup. A null
+    class in the export stands for NaN, as in the 'Exercise Type' encoder.
+    """
+
+    def __init__(self, classes):
+        self.classes_ = [float('nan') if c is None else c for c in classes]
+        self._index = {c: i for i, c in enumerate(classes) if c is not None}
+        self._nan_index = classes.index(None) if None in classes else None
+
+    @classmethod
+    def from_encoder(cls, encoder):
+        """Lookup with the classes of a fitted LabelEncoder; encoding a single value becomes a dict hit."""
+        return cls([None if isinstance(c, float) and c != c else c.item() if hasattr(c, 'item') else c
+                    for c in encoder.classes_])
+
+    def transform(self, values):
+        codes = []
+        for value in values:
+            if value is None or (isinstance(value, float) and value != value):
+                if self._nan_index is None:
+                    raise ValueError("y contains previously unseen labels: nan")
+                codes.append(self._nan_index)
+            elif value in self._index:
+                codes.append(self._index[value])
+            else:
+                raise ValueError(f"y contains previously unseen labels: {value!r}")
+        return np.asarray(codes, dtype=np.int64)
+
+
+def normalize_form_data(form_data):
+    """Convert numeric form fields in place and return the same dict."""
+    for field in NUMERIC_FIELDS:
+        if form_data.get(field): form_data[field] = pd.to_numeric(form_data[field])
+    return form_data
+
+
+def build_feature_frame(form_data, encoders, feature_names=None):
+    """
+    Build the encoded one-row model input for a (normalized) form submission.
+
+    Args:
+        form_data (dict): Health form data
+        encoders (dict): Column name -> fitted LabelEncoder
+        feature_names (list, optional): Model feature schema. When given, the
+            frame is reordered to it, missing features become NaN and fields
+            the model doesn't know about (e.g. 'email') are dropped.
+
+    Returns:
+        pd.DataFrame: Encoded input frame
+    """
+    family_histories = form_data.get('Family History', [])
+    existing_conditions = form_data.get('Existing Conditions', [])
+
+    input_df = pd.DataFrame([form_data])
+
+    cols_to_map_none = ['Exercise Type']
+    for col in cols_to_map_none:
+        if col in input_df.columns:
+            input_df.loc[input_df[col] == 'None', col] = np.nan
+
+    for h in ALL_FAMILY_HISTORIES:
+        input_df[f'FamilyHistory_{h}'] = 1 if h in family_histories else 0
+    for c in ALL_EXISTING_CONDITIONS:
+        input_df[f'ExistingConditions_{c}'] = 1 if c in existing_conditions else 0
+
+    if 'Blood Pressure' in input_df.columns:
+        bp_series = input_df.pop('Blood Pressure')
+        bp_split = bp_series.str.split('/', expand=True)
+        input_df['Systolic_Pressure'] = pd.to_numeric(bp_split[0])
+        input_df['Diastolic_Pressure'] = pd.to_numeric(bp_split[1])
+
+    input_df = input_df.drop(columns=['Family History', 'Existing Conditions'], errors='ignore')
+
+    for col, le in encoders.items():
+        if col in input_df.columns:
+            try:
+                input_df[col] = le.transform(input_df[col])
+            except Exception:
+                valid_labels = [str(label) for label in le.classes_]
+                raise FeatureEncodingError(
+                    f"Error encoding column '{col}': Value '{input_df[col].iloc[0]}' not recognized. "
+                    f"Valid options: {valid_labels}."
+                )
+
+    if feature_names:
+        input_df = input_df.reindex(columns=feature_names)
+    return input_df
+
+
+def encode_vector(form_data, encoders, feature_names):
+    """
+    Encode a (normalized) form submission straight to a model input row.
+
+    Equivalent to build_feature_frame(...) reindexed to `feature_names`, but
+    built without pandas, so it is cheap enough to run before the prediction
+    cache lookup on every request.
+
+    Args:
+        form_data (dict): Health form data
+        encoders (dict): Column name -> fitted LabelEncoder
+        feature_names (list): Model feature schema
+
+    Returns:
+        np.ndarray: float64 vector in `feature_names` order; absent features are NaN
+    """
+    family_histories = form_data.get('Family History', [])
+    existing_conditions = form_data.get('Existing Conditions', [])
+
+    values = {key: value for key, value in form_data.items() if key not in ('Family History', 'Existing Conditions')}
+    if values.get('Exercise Type') == 'None':
+        values['Exercise Type'] = float('nan')
+    for h in ALL_FAMILY_HISTORIES:
+        values[f'FamilyHistory_{h}'] = 1 if h in family_histories else 0
+    for c in ALL_EXISTING_CONDITIONS:
+        values[f'ExistingConditions_{c}'] = 1 if c in existing_conditions else 0
+    if 'Blood Pressure' in values:
+        systolic, _, diastolic = str(values.pop('Blood Pressure')).partition('/')
+        values['Systolic_Pressure'] = systolic
+        values['Diastolic_Pressure'] = diastolic
+
+    vector = np.full(len(feature_names), np.nan)
+    for i, col in enumerate(feature_names):
+        if col not in values:
+            continue
+        value = values[col]
+        if col in encoders:
+            le = encoders[col]
+            try:
+                vector[i] = le.transform([value])[0]
+            except Exception:
+                valid_labels = [str(label) for label in le.classes_]
+                raise FeatureEncodingError(
+                    f"Error encoding column '{col}': Value '{value}' not recognized. "
+                    f"Valid options: {valid_labels}."
+                )
+        elif value is not None:
+            try:
+                vector[i] = float(value)
+            except (TypeError, ValueError):
+                raise FeatureEncodingError(f"Error reading column '{col}': Value '{value}' is not a number.")
+    return vector
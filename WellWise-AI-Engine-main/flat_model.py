@@ -0,0 +1,142 @@
+"""
+Flat, memory-mapped layout for the LightGBM life expectancy model.
+
+The booster's trees are exported to a handful of contiguous .npy arrays
+(split features, thresholds, children, node values). Workers open them with
+np.load(mmap_mode='r'), so every gunicorn worker on a node shares one copy in
+the page cache instead of unpickling its own booster, and serving doesn't need
+to import LightGBM or scikit-learn at all. Prediction walks all trees for all
+rows at once with NumPy gathers, one tree level per step.
+"""
+import json
+import os
+
+import startup
+
+np = startup.lazy_import('numpy')
+
+# children holds [right, left] per node, so a node's next node is
+# children[2 * node + go_left].
+ARRAY_NAMES = ['split_feature', 'threshold', 'children', 'default_left', 'missing_type', 'node_value', 'tree_root']
+META_FILE = 'meta.json'
+
+# LightGBM's MissingType and kZeroThreshold (include/LightGBM/tree.h, meta.h).
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+MISSING_TYPES = {'None': MISSING_NONE, 'Zero': MISSING_ZERO, 'NaN': MISSING_NAN}
+ZERO_THRESHOLD = 1e-35
+
+
+def export_flat(booster, output_dir):
+    """
+    Write a LightGBM booster as flat node arrays into `output_dir`.
+
+    Leaves are stored as nodes whose children point back at themselves, so
+    evaluation is a fixed number of branch-free gather steps (the deepest
+    leaf's depth) and a row that reaches a leaf early simply stays there.
+    Only numerical splits are supported, which is all the model uses since
+    categoricals are label-encoded before training.
+    """
+    dump = booster.dump_model()
+    if dump.get('num_tree_per_iteration', 1) != 1 or dump.get('average_output'):
+        raise ValueError("Only single-output boosted (non-RF) models can be flattened.")
+
+    columns = {name: [] for name in ARRAY_NAMES if name not in ('children', 'tree_root')}
+    columns['left_child'], columns['right_child'] = [], []
+    roots = []
+    max_depth = 0
+
+    def add(node, depth):
+        nonlocal max_depth
+        index = len(columns['node_value'])
+        is_leaf = 'split_index' not in node
+        if not is_leaf and node['decision_type'] != '<=':
+            raise ValueError(f"Unsupported split type '{node['decision_type']}'.")
+        columns['split_feature'].append(0 if is_leaf else node['split_feature'])
+        columns['threshold'].append(0.0 if is_leaf else node['threshold'])
+        columns['default_left'].append(True if is_leaf else node['default_left'])
+        columns['missing_type'].append(MISSING_NONE if is_leaf else MISSING_TYPES[node['missing_type']])
+        columns['node_value'].append(node['leaf_value'] if is_leaf else 0.0)
+        columns['left_child'].append(index)
+        columns['right_child'].append(index)
+        if is_leaf:
+            max_depth = max(max_depth, depth)
+        else:
+            columns['left_child'][index] = add(node['left_child'], depth + 1)
+            columns['right_child'][index] = add(node['right_child'], depth + 1)
+        return index
+
+    for tree in dump['tree_info']:
+        roots.append(add(tree['tree_structure'], 0))
+
+    # Index arrays are stored as intp so NumPy never has to cast them per gather.
+    arrays = {
+        'split_feature': np.asarray(columns['split_feature'], dtype=np.intp),
+        'threshold': np.asarray(columns['threshold'], dtype=np.float64),
+        'children': np.column_stack([columns['right_child'], columns['left_child']]).astype(np.intp).ravel(),
+        'default_left': np.asarray(columns['default_left'], dtype=np.bool_),
+        'missing_type': np.asarray(columns['missing_type'], dtype=np.int8),
+        'node_value': np.asarray(columns['node_value'], dtype=np.float64),
+        'tree_root': np.asarray(roots, dtype=np.intp),
+    }
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name in ARRAY_NAMES:
+        np.save(os.path.join(output_dir, f'{name}.npy'), arrays[name])
+    meta = {
+        'num_feature': booster.num_feature(), 'num_trees': len(roots), 'max_depth': max_depth,
+        'has_missing_splits': bool((arrays['missing_type'] != MISSING_NONE).any()),
+    }
+    with open(os.path.join(output_dir, META_FILE), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return [f'{name}.npy' for name in ARRAY_NAMES] + [META_FILE]
+
+
+class FlatTreeModel:
+    """Vectorized evaluator over the arrays written by export_flat()."""
+
+    def __init__(self, model_dir, mmap=True):
+        with open(os.path.join(model_dir, META_FILE)) as f:
+            meta = json.load(f)
+        self.num_feature = meta['num_feature']
+        self.num_trees = meta['num_trees']
+        self.max_depth = meta['max_depth']
+        self.has_missing_splits = meta['has_missing_splits']
+        mode = 'r' if mmap else None
+        for name in ARRAY_NAMES:
+            array = np.load(os.path.join(model_dir, f'{name}.npy'), mmap_mode=mode)
+            # A plain ndarray view over the mapping avoids np.memmap's per-operation overhead.
+            setattr(self, name, array.view(np.ndarray))
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.num_feature:
+            raise ValueError(f"Expected {self.num_feature} features, got {X.shape[1]}.")
+
+        if not self.has_missing_splits:
+            # With no missing-aware splits LightGBM evaluates NaN as 0.0 everywhere.
+            X = np.where(np.isnan(X), 0.0, X)
+        n_rows, n_features = X.shape
+        X_flat = np.ascontiguousarray(X).ravel()
+        row_offset = (np.arange(n_rows, dtype=np.intp) * n_features)[:, np.newaxis]
+
+        # node[i, t] is row i's current node in tree t; all trees advance together.
+        node = np.broadcast_to(self.tree_root, (n_rows, self.num_trees))
+        for _ in range(self.max_depth):
+            fval = X_flat.take(row_offset + self.split_feature.take(node))
+            if self.has_missing_splits:
+                go_left = self._decision_with_missing(fval, node)
+            else:
+                go_left = fval <= self.threshold.take(node)
+            node = self.children.take(2 * node + go_left)
+        return self.node_value.take(node).sum(axis=1)
+
+    def _decision_with_missing(self, fval, node):
+        """LightGBM's NumericalDecision, including the Zero/NaN missing-value rules."""
+        missing_type = self.missing_type.take(node)
+        is_nan = np.isnan(fval)
+        fval = np.where(is_nan & (missing_type != MISSING_NAN), 0.0, fval)
+        is_missing = (((missing_type == MISSING_ZERO) & (np.abs(fval) <= ZERO_THRESHOLD))
+                      | ((missing_type == MISSING_NAN) & is_nan))
+        return np.where(is_missing, self.default_left.take(node), fval <= self.threshold.take(node))
@@ -0,0 +1,32 @@
+"""
+Gunicorn settings for the prediction engine.
+
+    gunicorn -c gunicorn.conf.py app:app
+
+The app is imported once in the master (preload_app) using the flat,
+memory-mapped model from flat_model.py and then forked, so all workers share
+one physical copy of the model instead of each unpickling its own.
+Run `python model_registry.py export <version>` first to write the flat arrays.
+"""
+import gc
+import os
+
+# Must be set before the app (and model_registry) is imported by preload_app.
+os.environ.setdefault("WELLWISE_MODEL_FORMAT", "flat")
+
+bind = os.getenv("WELLWISE_BIND", "0.0.0.0:5001")
+workers = int(os.getenv("WEB_CONCURRENCY", (os.cpu_count() or 1) * 2 + 1))
+threads = int(os.getenv("WELLWISE_THREADS", 4))
+preload_app = True
+
+
+def when_ready(server):
+    # Move everything allocated while preloading into the permanent generation,
+    # so garbage collection in the workers doesn't touch (and un-share) those pages.
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # MongoClient is not fork-safe; each worker opens its own connection on first use.
+    import database
+    database.reset_connection()
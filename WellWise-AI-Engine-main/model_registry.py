@@ -0,0 +1,397 @@
+"""
+Versioned model registry for the life expectancy model.
+
+models/manifest.json lists every model version with its artifact files,
+feature schema and SHA-256 checksums, plus which version is active and which
+(if any) is scored in shadow mode. Every worker polls the manifest's mtime and
+swaps the new active model in without a restart, so activating a version from
+the CLI rolls it out to all running workers within a few seconds.
+
+Usage:
+    python model_registry.py list
+    python model_registry.py register v16 --model life_expectancy_model_v16.pkl --encoders label_encoders_v16.pkl
+    python model_registry.py shadow v16 --rate 0.05
+    python model_registry.py shadow off
+    python model_registry.py activate v16
+    python model_registry.py export v16
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import features
+import flat_model
+import startup
+
+joblib = startup.lazy_import('joblib')
+pd = startup.lazy_import('pandas')
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(script_dir, 'models')
+MANIFEST_NAME = 'manifest.json'
+SHADOW_LOG_FILE = "shadow_predictions.jsonl"
+RELOAD_CHECK_INTERVAL = float(os.getenv("WELLWISE_MODEL_RELOAD_INTERVAL", 2.0))
+# 'native' loads the LightGBM text model and JSON encoders written by `export`,
+# 'flat' the memory-mapped tree arrays (see flat_model.py) with the same JSON
+# encoders. Versions that haven't been exported fall back to the pickles.
+MODEL_FORMAT = os.getenv("WELLWISE_MODEL_FORMAT", "native" if startup.FAST_STARTUP else "pickle")
+
+ModelBundle = namedtuple('ModelBundle', ['version', 'model', 'encoders', 'feature_names'])
+
+
+class ModelRegistryError(Exception):
+    """Raised when the manifest or a model artifact is missing or invalid."""
+
+
+def file_checksum(path):
+    """SHA-256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(models_dir=MODELS_DIR):
+    with open(os.path.join(models_dir, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def write_manifest(manifest, models_dir=MODELS_DIR):
+    """Write the manifest atomically so workers never read a half-written file."""
+    path = os.path.join(models_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _verified_path(version, files, kind, models_dir):
+    path = os.path.join(models_dir, files[kind])
+    expected = files.get('sha256', {}).get(kind)
+    if expected and file_checksum(path) != expected:
+        raise ModelRegistryError(f"Checksum mismatch for {version} {kind} file '{files[kind]}'.")
+    return path
+
+
+def _load_native(version, native, models_dir):
+    with startup.timed('import lightgbm'):
+        import lightgbm as lgb
+    model = lgb.Booster(model_file=_verified_path(version, native, 'booster', models_dir))
+    with open(_verified_path(version, native, 'encoders', models_dir)) as f:
+        encoders = {col: features.LabelLookup(classes) for col, classes in json.load(f).items()}
+    return model, encoders, model.num_feature()
+
+
+def _load_flat(version, native, flat, models_dir):
+    flat_dir = os.path.join(models_dir, flat['dir'])
+    for name, expected in flat.get('sha256', {}).items():
+        if file_checksum(os.path.join(flat_dir, name)) != expected:
+            raise ModelRegistryError(f"Checksum mismatch for {version} flat model file '{name}'.")
+    model = flat_model.FlatTreeModel(flat_dir)
+    with open(_verified_path(version, native, 'encoders', models_dir)) as f:
+        encoders = {col: features.LabelLookup(classes) for col, classes in json.load(f).items()}
+    return model, encoders, model.num_feature
+
+
+def load_bundle(version, entry, models_dir=MODELS_DIR, model_format=None):
+    """Load and verify the artifacts of one manifest entry."""
+    model_format = model_format or MODEL_FORMAT
+    if model_format == 'flat' and entry.get('flat') and entry.get('native'):
+        model, encoders, n_features = _load_flat(version, entry['native'], entry['flat'], models_dir)
+    elif model_format in ('native', 'flat') and entry.get('native'):
+        model, encoders, n_features = _load_native(version, entry['native'], models_dir)
+    else:
+        model = joblib.load(_verified_path(version, entry, 'model', models_dir))
+        encoders = {col: features.LabelLookup.from_encoder(le)
+                    for col, le in joblib.load(_verified_path(version, entry, 'encoders', models_dir)).items()}
+        n_features = getattr(model, 'n_features_in_', None)
+
+    feature_names = entry.get('features')
+    if feature_names and n_features is not None and n_features != len(feature_names):
+        raise ModelRegistryError(
+            f"Model {version} expects {n_features} features but its schema lists {len(feature_names)}."
+        )
+    return ModelBundle(version, model, encoders, feature_names)
+
+
+def predict_matrix(bundle, X):
+    """Raw predictions for an encoded feature matrix whose columns follow bundle.feature_names."""
+    if isinstance(bundle.model, flat_model.FlatTreeModel):
+        return bundle.model.predict(X)
+    return bundle.model.predict(pd.DataFrame(X, columns=bundle.feature_names))
+
+
+def export_native(version, models_dir=MODELS_DIR):
+    """
+    Write a version's booster in LightGBM's text format and as flat arrays,
+    and its encoders as JSON.
+
+    Loading these needs neither scikit-learn nor unpickling, which makes cold
+    starts noticeably faster than joblib.load on the pickles.
+    """
+    manifest = read_manifest(models_dir)
+    entry = manifest['versions'].get(version)
+    if entry is None:
+        raise ModelRegistryError(f"Unknown model version '{version}'.")
+    bundle = load_bundle(version, entry, models_dir, model_format='pickle')
+
+    booster_file = f"life_expectancy_model_{version}.txt"
+    encoders_file = f"label_encoders_{version}.json"
+    bundle.model.booster_.save_model(os.path.join(models_dir, booster_file))
+    classes = {
+        col: [None if isinstance(c, float) and c != c else c for c in le.classes_]
+        for col, le in bundle.encoders.items()
+    }
+    with open(os.path.join(models_dir, encoders_file), 'w') as f:
+        json.dump(classes, f, indent=1)
+
+    entry['native'] = {
+        'booster': booster_file,
+        'encoders': encoders_file,
+        'sha256': {
+            'booster': file_checksum(os.path.join(models_dir, booster_file)),
+            'encoders': file_checksum(os.path.join(models_dir, encoders_file)),
+        },
+    }
+    flat_dir = f"life_expectancy_model_{version}.flat"
+    flat_files = flat_model.export_flat(bundle.model.booster_, os.path.join(models_dir, flat_dir))
+    entry['flat'] = {
+        'dir': flat_dir,
+        'sha256': {name: file_checksum(os.path.join(models_dir, flat_dir, name)) for name in flat_files},
+    }
+    write_manifest(manifest, models_dir)
+    return entry['native']
+
+
+def register_version(version, model_file, encoders_file, feature_names, notes=None, models_dir=MODELS_DIR):
+    """Add (or replace) a version in the manifest. Does not activate it."""
+    manifest = read_manifest(models_dir)
+    manifest['versions'][version] = {
+        'model': model_file,
+        'encoders': encoders_file,
+        'features': list(feature_names),
+        'sha256': {
+            'model': file_checksum(os.path.join(models_dir, model_file)),
+            'encoders': file_checksum(os.path.join(models_dir, encoders_file)),
+        },
+        'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'status': 'available',
+        'notes': notes or "",
+    }
+    write_manifest(manifest, models_dir)
+    return manifest
+
+
+def activate_version(version, force=False, models_dir=MODELS_DIR):
+    manifest = read_manifest(models_dir)
+    entry = manifest['versions'].get(version)
+    if entry is None:
+        raise ModelRegistryError(f"Unknown model version '{version}'.")
+    if entry.get('status') == 'retired' and not force:
+        raise ModelRegistryError(f"Model {version} is retired; pass --force to activate it anyway.")
+    # Load it once here so a broken artifact never reaches the workers.
+    load_bundle(version, entry, models_dir)
+    manifest['active'] = version
+    if (manifest.get('shadow') or {}).get('version') == version:
+        manifest['shadow'] = None
+    write_manifest(manifest, models_dir)
+    return manifest
+
+
+def set_shadow(version, sample_rate=0.05, models_dir=MODELS_DIR):
+    """Score `version` on a `sample_rate` fraction of live traffic, or disable shadowing with None."""
+    manifest = read_manifest(models_dir)
+    if version is None:
+        manifest['shadow'] = None
+    else:
+        if version not in manifest['versions']:
+            raise ModelRegistryError(f"Unknown model version '{version}'.")
+        manifest['shadow'] = {'version': version, 'sample_rate': float(sample_rate)}
+    write_manifest(manifest, models_dir)
+    return manifest
+
+
+class ModelRegistry:
+    """Holds the active (and shadow) model for one worker and hot-swaps them on manifest changes."""
+
+    def __init__(self, models_dir=MODELS_DIR, check_interval=RELOAD_CHECK_INTERVAL):
+        self.models_dir = models_dir
+        self.manifest_path = os.path.join(models_dir, MANIFEST_NAME)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._bundles = {}
+        self._active = None
+        self._shadow = None
+        self._shadow_rate = 0.0
+        self._manifest_mtime = None
+        self._next_check = 0.0
+        self._shadow_executor = ThreadPoolExecutor(max_workers=1)
+        self.shadow_stats = {'sampled': 0, 'scored': 0, 'errors': 0, 'abs_delta_sum': 0.0}
+
+    @property
+    def active(self):
+        """The bundle to serve with. Callers should read this once per request."""
+        self.maybe_reload()
+        return self._active
+
+    def maybe_reload(self):
+        """Reload if the manifest changed; checked at most once per `check_interval` seconds."""
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._manifest_mtime:
+            return
+        try:
+            self.reload()
+        except Exception as e:
+            # Keep serving the current model; retry when the manifest changes again.
+            self._manifest_mtime = mtime
+            print(f"❌ Model reload failed, keeping {self._active.version if self._active else 'no model'}: {e}")
+
+    def _get_bundle(self, version, manifest):
+        if version not in self._bundles:
+            entry = manifest['versions'].get(version)
+            if entry is None:
+                raise ModelRegistryError(f"Manifest references unknown version '{version}'.")
+            self._bundles[version] = load_bundle(version, entry, self.models_dir)
+        return self._bundles[version]
+
+    def reload(self):
+        """Re-read the manifest and swap in its active/shadow models."""
+        with self._lock:
+            start = time.perf_counter()
+            first_load = self._active is None
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+            manifest = read_manifest(self.models_dir)
+            active = self._get_bundle(manifest['active'], manifest)
+
+            shadow, shadow_rate = None, 0.0
+            shadow_cfg = manifest.get('shadow') or {}
+            if shadow_cfg.get('version'):
+                try:
+                    shadow = self._get_bundle(shadow_cfg['version'], manifest)
+                    shadow_rate = float(shadow_cfg.get('sample_rate', 0.0))
+                except Exception as e:
+                    print(f"❌ Shadow model {shadow_cfg['version']} could not be loaded: {e}")
+
+            # Plain attribute assignment is atomic: in-flight requests keep the
+            # bundle they already read, new requests see the new one.
+            self._active, self._shadow, self._shadow_rate = active, shadow, shadow_rate
+            self._manifest_mtime = mtime
+            self._bundles = {v: b for v, b in self._bundles.items() if b is active or b is shadow}
+            if first_load:
+                startup.record(f'model_load ({MODEL_FORMAT})', time.perf_counter() - start)
+        return active
+
+    def score_shadow(self, form_data, active_bundle, active_raw):
+        """Sample this request for the shadow model and score it off the request thread."""
+        shadow = self._shadow
+        if shadow is None or shadow.version == active_bundle.version or random.random() >= self._shadow_rate:
+            return
+        self.shadow_stats['sampled'] += 1
+        self._shadow_executor.submit(self._score_shadow, dict(form_data), active_bundle.version, shadow, float(active_raw))
+
+    def _score_shadow(self, form_data, active_version, shadow, active_raw):
+        entry = {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "active_version": active_version, "shadow_version": shadow.version, "active_raw": active_raw
+        }
+        try:
+            input_df = features.build_feature_frame(form_data, shadow.encoders, shadow.feature_names)
+            shadow_raw = float(shadow.model.predict(input_df)[0])
+            entry.update({"shadow_raw": shadow_raw, "delta": shadow_raw - active_raw})
+            self.shadow_stats['scored'] += 1
+            self.shadow_stats['abs_delta_sum'] += abs(shadow_raw - active_raw)
+        except Exception as e:
+            entry["error"] = str(e)
+            self.shadow_stats['errors'] += 1
+        with open(SHADOW_LOG_FILE, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def status(self):
+        scored = self.shadow_stats['scored']
+        return {
+            "active": self._active.version if self._active else None,
+            "shadow": {
+                "version": self._shadow.version if self._shadow else None,
+                "sample_rate": self._shadow_rate,
+                "sampled": self.shadow_stats['sampled'],
+                "scored": scored,
+                "errors": self.shadow_stats['errors'],
+                "mean_abs_delta": round(self.shadow_stats['abs_delta_sum'] / scored, 3) if scored else None,
+            },
+            "loaded_versions": sorted(self._bundles),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the life expectancy model registry.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help="Show registered versions")
+    p_activate = sub.add_parser('activate', help="Make a version active on all workers")
+    p_activate.add_argument('version')
+    p_activate.add_argument('--force', action='store_true', help="Allow activating a retired version")
+    p_shadow = sub.add_parser('shadow', help="Shadow-score a version on live traffic ('off' to disable)")
+    p_shadow.add_argument('version')
+    p_shadow.add_argument('--rate', type=float, default=0.05, help="Fraction of requests to sample")
+    p_export = sub.add_parser('export', help="Write LightGBM text + JSON encoder artifacts for fast loading")
+    p_export.add_argument('version')
+    p_register = sub.add_parser('register', help="Add artifacts already in models/ to the manifest")
+    p_register.add_argument('version')
+    p_register.add_argument('--model', required=True)
+    p_register.add_argument('--encoders', required=True)
+    p_register.add_argument('--features-from', help="Copy the feature schema from this version (default: active)")
+    p_register.add_argument('--notes')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'activate':
+            activate_version(args.version, force=args.force)
+            print(f"✅ {args.version} is now active. Workers pick it up within {RELOAD_CHECK_INTERVAL:.0f}s.")
+        elif args.command == 'shadow':
+            if args.version == 'off':
+                set_shadow(None)
+                print("✅ Shadow scoring disabled.")
+            else:
+                set_shadow(args.version, args.rate)
+                print(f"✅ Shadow-scoring {args.version} on {args.rate:.1%} of requests.")
+        elif args.command == 'export':
+            native = export_native(args.version)
+            print(f"✅ Exported {args.version} to '{native['booster']}', '{native['encoders']}' "
+                  f"and life_expectancy_model_{args.version}.flat/.")
+        elif args.command == 'register':
+            manifest = read_manifest()
+            source = args.features_from or manifest['active']
+            register_version(args.version, args.model, args.encoders,
+                             manifest['versions'][source]['features'], args.notes)
+            print(f"✅ Registered {args.version} (feature schema from {source}).")
+    except ModelRegistryError as e:
+        print(f"❌ {e}")
+        return
+
+    manifest = read_manifest()
+    shadow = manifest.get('shadow') or {}
+    for version, entry in manifest['versions'].items():
+        marker = "active" if version == manifest['active'] else ("shadow" if version == shadow.get('version') else "")
+        print(f"  {version:<8} {entry.get('status', ''):<10} {marker:<7} {entry['model']}  "
+              f"({len(entry.get('features') or [])} features) {entry.get('notes', '')}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+In-process cache of /predict responses.
+
+Users often resubmit the same form (page refreshes, re-checks). Responses
+are keyed by the model version plus a hash of the canonicalized encoded
+feature vector, which determines everything in the response, so a repeat
+submission skips model evaluation and the summary/recommendation building.
+Entries are evicted least-recently-used beyond WELLWISE_PREDICTION_CACHE_SIZE
+and expire after WELLWISE_PREDICTION_CACHE_TTL seconds; a size of 0 turns
+the cache off.
+"""
+import copy
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import startup
+
+np = startup.lazy_import('numpy')
+
+CACHE_MAX_ENTRIES = int(os.getenv("WELLWISE_PREDICTION_CACHE_SIZE", 10000))
+CACHE_TTL_SECONDS = float(os.getenv("WELLWISE_PREDICTION_CACHE_TTL", 3600))
+
+
+def make_key(model_version, feature_vector):
+    """Cache key for an encoded feature vector scored by `model_version`."""
+    vector = np.asarray(feature_vector, dtype=np.float64).copy()
+    # One bit pattern per value: NaN payloads and -0.0 would otherwise split entries.
+    vector[np.isnan(vector)] = np.nan
+    vector += 0.0
+    digest = hashlib.sha256(vector.tobytes()).hexdigest()
+    return f"{model_version}:{digest}"
+
+
+class PredictionCache:
+    """Thread-safe LRU cache with a per-entry time-to-live."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+
+    @classmethod
+    def from_env(cls):
+        """A cache configured from the environment, or None when caching is off."""
+        return cls() if CACHE_MAX_ENTRIES > 0 else None
+
+    def get(self, key):
+        """A copy of the cached response for `key`, or None."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                self.stats['expired'] += 1
+                entry = None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            response = entry[1]
+        return copy.deepcopy(response)
+
+    def put(self, key, response):
+        entry = (time.monotonic() + self.ttl, copy.deepcopy(response))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def status(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return dict(self.stats, size=len(self._entries), max_entries=self.max_entries, ttl_seconds=self.ttl,
+                    hit_rate=round(self.stats['hits'] / lookups, 4) if lookups else None)
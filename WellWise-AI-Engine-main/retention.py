@@ -0,0 +1,171 @@
+"""
+Retention for the `predictions` collection.
+
+With WELLWISE_PREDICTION_RETENTION_DAYS set, raw predictions are kept for that
+many whole days. Older ones survive only downsampled, in the rollups that are
+already maintained for reads: the per-user daily sums in `prediction_trends`
+(updated on every save) and the population cells in `analytics_rollups`.
+enforce() first folds every settled prediction into the analytics rollups and
+then deletes expired predictions that are below the rollup watermark, so
+nothing is dropped before it has been counted. Run it from cron, e.g. daily.
+
+With WELLWISE_PREDICTIONS_TIMESERIES=1 new deployments create `predictions`
+as a MongoDB time-series collection (timeField timestamp, metaField
+user_email), which stores each user's predictions in compressed buckets and
+also expires them natively a grace period after enforce() should have.
+migrate_timeseries() moves an existing collection over.
+
+Usage:
+    python retention.py status
+    python retention.py enforce
+    WELLWISE_PREDICTIONS_TIMESERIES=1 python retention.py migrate-timeseries [--drop-legacy]
+"""
+import argparse
+import sys
+from datetime import timedelta
+
+from bson import ObjectId
+
+import analytics
+import database
+
+LEGACY_COLLECTION = "predictions_v1"
+META_COLLECTION = "storage_meta"
+MIGRATION_ID = "timeseries_migration"
+DEFAULT_BATCH_SIZE = 1000
+
+
+def is_timeseries(db, name='predictions'):
+    info = next(iter(db.list_collections(filter={"name": name})), None)
+    return info is not None and info.get("type") == "timeseries"
+
+
+def enforce(db=None, now=None):
+    """
+    Fold settled predictions into the rollups, then delete the expired ones.
+
+    Returns:
+        int: Number of predictions deleted
+    """
+    db = db if db is not None else database.get_database()
+    horizon = database.retention_horizon(now)
+    if db is None or horizon is None:
+        return 0
+
+    analytics.refresh_rollups(db)
+    watermark = (db[analytics.META_COLLECTION].find_one({"_id": analytics.WATERMARK_ID}) or {}).get("last_id")
+    if watermark is None:
+        return 0
+    # Timestamps are naive local times and ObjectIds UTC; the day of slack
+    # keeps the _id bound (which makes this an index range scan) on the safe
+    # side of any timezone, and the timestamp test is exact.
+    bound = min(watermark, ObjectId.from_datetime(horizon - timedelta(days=1)))
+    result = db.predictions.delete_many({"_id": {"$lt": bound}, "timestamp": {"$lt": horizon}})
+    return result.deleted_count
+
+
+def migrate_timeseries(db, batch_size=DEFAULT_BATCH_SIZE, drop_legacy=False):
+    """
+    Move an existing `predictions` collection into a time-series collection.
+
+    The old collection is renamed to LEGACY_COLLECTION and a time-series
+    `predictions` created in its place, so new predictions land in the new
+    collection straight away; the old documents are then copied over in _id
+    order with their _ids (the analytics watermark stays valid), checkpointed
+    after every batch. Run it at a quiet time: history reads only see the
+    copied part until it finishes.
+
+    Returns:
+        int: Number of documents copied by this run
+    """
+    if not database.PREDICTIONS_TIMESERIES:
+        raise ValueError("Set WELLWISE_PREDICTIONS_TIMESERIES=1 to migrate to a time-series collection.")
+    collections = db.list_collection_names()
+    if LEGACY_COLLECTION not in collections:
+        if 'predictions' not in collections:
+            database.init_database(db)
+            return 0
+        if is_timeseries(db):
+            print("'predictions' is already a time-series collection.")
+            return 0
+        db.predictions.rename(LEGACY_COLLECTION)
+        database.create_predictions_collection(db)
+        db.predictions.create_index([("user_email", 1), ("timestamp", -1), ("_id", -1)])
+        db[META_COLLECTION].replace_one({"_id": MIGRATION_ID}, {"_id": MIGRATION_ID, "last_id": None}, upsert=True)
+
+    meta = db[META_COLLECTION].find_one({"_id": MIGRATION_ID}) or {}
+    query = {"_id": {"$gt": meta["last_id"]}} if meta.get("last_id") else {}
+    horizon = database.retention_horizon()
+    if horizon is not None:
+        query["timestamp"] = {"$gte": horizon}  # already expired; counted in the rollups
+
+    copied = 0
+    batch = []
+
+    def flush():
+        ids = [doc["_id"] for doc in batch]
+        # A batch that was inserted before a crash but not checkpointed is replaced, not duplicated.
+        db.predictions.delete_many({"_id": {"$in": ids}})
+        db.predictions.insert_many(batch, ordered=False)
+        db[META_COLLECTION].update_one({"_id": MIGRATION_ID}, {"$set": {"last_id": ids[-1]}})
+        print(f"  copied {copied:>9,}")
+
+    for doc in db[LEGACY_COLLECTION].find(query).sort("_id", 1).batch_size(batch_size):
+        batch.append(doc)
+        copied += 1
+        if len(batch) == batch_size:
+            flush()
+            batch = []
+    if batch:
+        flush()
+
+    db[META_COLLECTION].update_one({"_id": MIGRATION_ID}, {"$set": {"done": True}})
+    if drop_legacy:
+        db[LEGACY_COLLECTION].drop()
+        db[META_COLLECTION].delete_one({"_id": MIGRATION_ID})
+    return copied
+
+
+def status(db):
+    oldest = db.predictions.find_one({}, {"timestamp": 1}, sort=[("_id", 1)])
+    horizon = database.retention_horizon()
+    print(f"Layout:     {'time-series' if is_timeseries(db) else 'regular'} collection"
+          f"{' (time-series configured)' if database.PREDICTIONS_TIMESERIES else ''}")
+    print(f"Retention:  {f'{database.PREDICTION_RETENTION_DAYS} days (raw kept from {horizon:%Y-%m-%d})' if horizon else 'forever'}")
+    print(f"Documents:  {db.predictions.estimated_document_count():,}")
+    print(f"Oldest:     {oldest['timestamp'] if oldest else '-'}")
+    if LEGACY_COLLECTION in db.list_collection_names():
+        meta = db[META_COLLECTION].find_one({"_id": MIGRATION_ID}) or {}
+        print(f"Migration:  {'done' if meta.get('done') else 'in progress'}, "
+              f"{db[LEGACY_COLLECTION].estimated_document_count():,} documents in '{LEGACY_COLLECTION}'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retention and time-series layout of stored predictions.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="Show the layout and retention of the predictions collection")
+    sub.add_parser("enforce", help="Fold predictions into the rollups and delete the expired ones")
+    mig = sub.add_parser("migrate-timeseries", help="Move predictions into a time-series collection")
+    mig.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    mig.add_argument("--drop-legacy", action="store_true", help=f"Drop '{LEGACY_COLLECTION}' once copied")
+    args = parser.parse_args()
+
+    db = database.get_database()
+    if db is None:
+        sys.exit("❌ Could not connect to MongoDB.")
+    if args.command == "status":
+        status(db)
+    elif args.command == "enforce":
+        if database.retention_horizon() is None:
+            print("No retention period configured (WELLWISE_PREDICTION_RETENTION_DAYS); nothing to do.")
+        else:
+            print(f"Deleted {enforce(db):,} expired predictions.")
+    else:
+        try:
+            print(f"✅ Copied {migrate_timeseries(db, args.batch_size, args.drop_legacy):,} predictions.")
+        except ValueError as e:
+            sys.exit(f"❌ {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""
+Table-driven rules that turn a raw model output into the /predict response.
+
+The lifestyle adjustments, the blend of formula and model, the health scores,
+the summary text and the recommendations are all described in rules.json. A
+RuleSet evaluates that table column-wise over any number of profiles at once
+(a single submission, the what-if variants or a DataFrame of stored
+submissions), so every path shares the same logic and a rule change is a
+JSON edit rather than a code change.
+
+Condition syntax (the "when" of adjustments and recommendations):
+    {"field": f, "equals": v}     {"field": f, "in": [v, ...]}
+    {"field": f, "missing": true} {"field": f, "contains": v}  (list fields)
+    {"any": [...]}  {"all": [...]}  {"not": {...}}
+"""
+import json
+import os
+
+import startup
+
+np = startup.lazy_import('numpy')
+pd = startup.lazy_import('pandas')
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+RULES_FILE = os.getenv("WELLWISE_RULES_FILE", os.path.join(script_dir, 'rules.json'))
+
+
+class RuleError(ValueError):
+    """Raised when the rule table is malformed or a profile can't be scored by it."""
+
+
+class _Columns:
+    """Field -> object array view over a list of form dicts or a DataFrame, built on first use."""
+
+    def __init__(self, profiles):
+        self._profiles = profiles
+        self._is_frame = hasattr(profiles, 'columns')
+        self._cache = {}
+
+    def __len__(self):
+        return len(self._profiles)
+
+    def __getitem__(self, field):
+        if field not in self._cache:
+            if self._is_frame:
+                if field in self._profiles.columns:
+                    values = self._profiles[field].to_numpy(dtype=object)
+                else:
+                    values = np.full(len(self), None, dtype=object)
+            else:
+                values = np.empty(len(self), dtype=object)
+                values[:] = [profile.get(field) for profile in self._profiles]
+            self._cache[field] = values
+        return self._cache[field]
+
+
+def _as_float(values):
+    try:
+        return np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        return pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+
+
+class RuleSet:
+    """A loaded rule table, evaluated over many profiles at once."""
+
+    def __init__(self, table):
+        self.table = table
+        self.default_state = table['default_state']
+        self.default_state_le = float(table['default_state_life_expectancy'])
+        self.state_le = {state: float(le) for state, le in table['state_life_expectancy'].items()}
+        self.adjustments = table['adjustments']
+        self.blend = table['blend']
+        self.health_scores = table['health_scores']
+        self.summary = table['summary']
+        self.recommendations = [rule for rule in table['recommendations'] if not rule.get('fallback')]
+        self.fallback_recommendations = [rule for rule in table['recommendations'] if rule.get('fallback')]
+        # Fail at load time rather than on the first request.
+        try:
+            self.evaluate([{'Age': 30}], [70.0])
+        except (KeyError, TypeError, ValueError) as e:
+            raise RuleError(f"Invalid rule table: {e!r}") from e
+
+    @classmethod
+    def load(cls, path=RULES_FILE):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def _condition(self, cond, cols):
+        if 'any' in cond:
+            return np.logical_or.reduce([self._condition(c, cols) for c in cond['any']])
+        if 'all' in cond:
+            return np.logical_and.reduce([self._condition(c, cols) for c in cond['all']])
+        if 'not' in cond:
+            return ~self._condition(cond['not'], cols)
+
+        values = cols[cond['field']]
+        if 'equals' in cond:
+            return np.asarray(values == cond['equals'], dtype=bool)
+        if 'in' in cond:
+            return np.logical_or.reduce([np.asarray(values == v, dtype=bool) for v in cond['in']])
+        if 'missing' in cond:
+            missing = np.asarray(pd.isna(values), dtype=bool)
+            return missing if cond['missing'] else ~missing
+        if 'contains' in cond:
+            item = cond['contains']
+            return np.fromiter((isinstance(v, (list, tuple)) and item in v for v in values), dtype=bool, count=len(values))
+        raise RuleError(f"Unsupported rule condition: {cond!r}")
+
+    def _score_term(self, term, cols):
+        values = cols[term['field']]
+        if 'map' in term:
+            scores = np.full(len(values), float(term.get('default', np.nan)))
+            for key, score in term['map'].items():
+                scores[np.asarray(values == key, dtype=bool)] = score
+            if 'missing' in term:
+                scores[np.asarray(pd.isna(values), dtype=bool)] = term['missing']
+            return scores
+        if 'slope' in term:
+            x = _as_float(values)
+            if 'fill' in term:
+                x = np.where(np.isnan(x), float(term['fill']), x)
+            return x * term['slope']
+        raise RuleError(f"Unsupported score term: {term!r}")
+
+    def _predictions(self, cols, raw_predictions):
+        """Adjustment mask, state averages, ages and final predictions as arrays."""
+        n = len(cols)
+        raw = np.asarray(raw_predictions, dtype=np.float64).reshape(-1)
+        if raw.shape[0] != n:
+            raise RuleError(f"Got {raw.shape[0]} model outputs for {n} profiles.")
+
+        states = cols['State']
+        state_avg = np.fromiter((self.state_le.get(s if isinstance(s, str) else self.default_state, self.default_state_le)
+                                 for s in states), dtype=np.float64, count=n)
+
+        adjustment_mask = np.zeros((n, len(self.adjustments)), dtype=bool)
+        for j, rule in enumerate(self.adjustments):
+            adjustment_mask[:, j] = self._condition(rule['when'], cols)
+        impacts = np.array([rule['impact'] for rule in self.adjustments], dtype=np.float64)
+        formula_le = state_avg + (adjustment_mask * impacts).sum(axis=1)
+
+        limit = self.blend['max_model_adjustment']
+        tuned = formula_le + np.clip((raw - formula_le) * self.blend['model_weight'], -limit, limit)
+
+        ages = _as_float(cols['Age'])
+        floors = self.blend['minimum_remaining_years']
+        conditions = [ages < rule['below_age'] for rule in floors if 'below_age' in rule]
+        choices = [rule['years'] for rule in floors if 'below_age' in rule]
+        default = next((rule['years'] for rule in floors if 'below_age' not in rule), -np.inf)
+        min_years = np.select(conditions, choices, default=default)
+        final = np.where(tuned - ages < min_years, ages + min_years, tuned)
+        return adjustment_mask, state_avg, ages, final
+
+    def final_predictions(self, profiles, raw_predictions):
+        """Final life expectancy for each profile, without building the response text."""
+        return self._predictions(_Columns(profiles), raw_predictions)[3]
+
+    def evaluate(self, profiles, raw_predictions):
+        """
+        Build /predict responses for many profiles at once.
+
+        Args:
+            profiles (list | pd.DataFrame): Normalized form submissions
+            raw_predictions (array-like): Raw model output per profile
+
+        Returns:
+            list: One response dict per profile (prediction, current_age,
+                adjustments, health_scores, summary, recommendations)
+        """
+        cols = _Columns(profiles)
+        n = len(cols)
+        adjustment_mask, state_avg, ages, final = self._predictions(cols, raw_predictions)
+
+        scores = {}
+        for name, spec in self.health_scores.items():
+            total = np.full(n, float(spec.get('base', 0)))
+            for term in spec['terms']:
+                total = total + self._score_term(term, cols)
+            scores[name] = total.tolist()
+
+        recommendation_mask = np.zeros((n, len(self.recommendations)), dtype=bool)
+        for j, rule in enumerate(self.recommendations):
+            recommendation_mask[:, j] = self._condition(rule['when'], cols)
+        needs_fallback = ~recommendation_mask.any(axis=1)
+
+        summary = self.summary
+        margin = summary['in_line_margin']
+        difference = final - state_avg
+        branch = np.select([ages > state_avg, difference < -margin, difference > margin],
+                           ['surpassed', 'below', 'above'], default='in_line')
+
+        states = cols['State']
+        ages_raw = cols['Age']
+        rounded = np.round(final, 1).tolist()
+        responses = []
+        for i in range(n):
+            state = states[i] if isinstance(states[i], str) else self.default_state
+            adjustments = [{'factor': rule['factor'], 'impact': rule['impact']}
+                           for rule, hit in zip(self.adjustments, adjustment_mask[i]) if hit]
+            values = {'state': state, 'state_avg_le': state_avg[i], 'prediction': final[i],
+                      'difference': difference[i], 'years_remaining': final[i] - ages[i],
+                      'years_less': abs(difference[i]), 'years_more': difference[i]}
+            if branch[i] == 'surpassed':
+                text = summary['surpassed'].format(**values)
+            else:
+                text = summary['intro'].format(**values)
+                if branch[i] in ('below', 'above'):
+                    sign = -1 if branch[i] == 'below' else 1
+                    labels = [rule.get('label', rule['factor']) for rule, hit in zip(self.adjustments, adjustment_mask[i])
+                              if hit and rule['impact'] * sign > 0]
+                    factors = summary[f'{branch[i]}_factors'].format(factors=summary['factor_separator'].join(labels)) if labels else ""
+                    text += summary[branch[i]].format(factors=factors, **values)
+                else:
+                    text += summary['in_line'].format(**values)
+
+            rules = self.fallback_recommendations if needs_fallback[i] else [
+                rule for rule, hit in zip(self.recommendations, recommendation_mask[i]) if hit]
+            responses.append({
+                "prediction": rounded[i], "current_age": ages_raw[i], "adjustments": adjustments,
+                "health_scores": {name: values[i] for name, values in scores.items()},
+                "summary": text,
+                "recommendations": [{'id': rule['id'], 'title': rule['title'], 'text': rule['text']} for rule in rules]
+            })
+        return responses
+
+    def evaluate_one(self, form_data, raw_prediction):
+        """Response for a single submission; raises RuleError if a rule has nothing to score."""
+        response = self.evaluate([form_data], [raw_prediction])[0]
+        unscored = [name for name, score in response['health_scores'].items() if score != score]
+        if response['prediction'] != response['prediction']:
+            unscored.insert(0, 'prediction')
+        if unscored:
+            raise RuleError(f"Could not score {', '.join(unscored)}: required fields are missing or not recognised.")
+        return response
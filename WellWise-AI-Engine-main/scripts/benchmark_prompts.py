@@ -0,0 +1,226 @@
+"""
+Input tokens and end-to-end latency of the backend's plan prompts: the example
+prompts (GEMINI_STRUCTURED_OUTPUT=0) against the structured ones (=1).
+
+`record` runs /api/get_full_plan and /api/get_exercise_plan of backend/app.py
+for a few fixed requests in both styles, with Gemini (the GOOGLE_API_KEY of
+backend/.env) behind them, and saves every prompt's token count, Gemini's
+reply and its latency to a fixture. With --stand-in, loadtest.py's fake model
+answers instead, taking --ms-per-output-token per token of its reply, and
+token counts are estimated at 4 characters per token; that tries the script
+without a key, but only measures the prompt side.
+
+`replay` (the default) serves the fixture's replies, after their recorded
+latencies, in place of Gemini and calls the same endpoints through Flask's test
+client, so the latency includes prompt building, JSON recovery and plan repair.
+Prompts missing from the fixture (they changed since recording) are counted;
+record again after changing them. --parallel-meals records or replays diet
+plans generated one meal per call (GEMINI_PARALLEL_MEALS=1); a fixture only
+holds the prompts of the mode it was recorded in.
+
+Usage:
+    python benchmark_prompts.py record
+    python benchmark_prompts.py record --stand-in --fixture /tmp/prompts.json
+    python benchmark_prompts.py replay --repeats 20
+    python benchmark_prompts.py record --parallel-meals --fixture parallel.json
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import loadtest
+
+DEFAULT_FIXTURE = os.path.join(loadtest.script_dir, 'prompt_fixture.json')
+STYLES = {"example": False, "structured": True}
+
+PROFILE = {"age": 34, "height": 168, "weight": 82, "gender": "female", "activityLevel": 2,
+           "weightLossPlan": "weightLoss"}
+CASES = [("full_plan", "/api/get_full_plan", dict(PROFILE, mealsPerDay=meals)) for meals in (3, 4, 5)] + [
+    ("exercise_plan", "/api/get_exercise_plan",
+     {"fitnessLevel": level, "primaryGoal": goal, "availableEquipment": {"dumbbells": True},
+      "workoutDaysPerWeek": days, "timePerSession": 45})
+    for level, goal, days in [("Beginner", "Weight Loss", 3), ("Intermediate", "Muscle Gain", 5)]]
+
+
+def prompt_key(prompt):
+    return hashlib.sha1(prompt.encode('utf-8')).hexdigest()
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class RecordingModel:
+    """Wraps `model_class`, keeping each call's prompt tokens, reply and latency in `calls`."""
+
+    model_class = None
+    calls = {}
+
+    def __init__(self, model_name=None, **kwargs):
+        self.model = self.model_class(model_name, **kwargs)
+
+    def generate_content(self, prompt, **kwargs):
+        start = time.perf_counter()
+        response = self.model.generate_content(prompt, **kwargs)
+        latency = time.perf_counter() - start
+        usage = getattr(response, 'usage_metadata', None)
+        count_tokens = getattr(self.model, 'count_tokens', None)
+        self.calls[prompt_key(prompt)] = {
+            "prompt_tokens": count_tokens(prompt).total_tokens if count_tokens else estimate_tokens(prompt),
+            "output_tokens": getattr(usage, 'candidates_token_count', None) or estimate_tokens(response.text),
+            "latency_ms": round(latency * 1000, 1),
+            "text": response.text,
+        }
+        return response
+
+
+class StandInModel(loadtest.FakeGenerativeModel):
+    """loadtest's fake Gemini, slowed down in proportion to the length of its reply."""
+
+    ms_per_output_token = 0.0
+
+    def generate_content(self, prompt, **kwargs):
+        response = super().generate_content(prompt, **kwargs)
+        time.sleep(estimate_tokens(response.text) * self.ms_per_output_token / 1000)
+        return response
+
+
+class FixtureModel:
+    """Answers with the fixture's recorded reply to a prompt, after the recorded latency."""
+
+    calls = {}
+    used = []
+    missing = 0
+
+    def __init__(self, model_name=None, **kwargs):
+        pass
+
+    def generate_content(self, prompt, **kwargs):
+        FixtureModel.used.append(prompt_key(prompt))
+        call = self.calls.get(prompt_key(prompt))
+        if call is None:
+            FixtureModel.missing += 1
+            raise KeyError("Prompt not in the fixture; record it again.")
+        time.sleep(call["latency_ms"] / 1000)
+        return SimpleNamespace(text=call["text"])
+
+
+def load_backend(model_class, workdir, parallel_meals=False):
+    """Import backend/app.py with `model_class` in place of genai.GenerativeModel."""
+    if model_class is not RecordingModel or RecordingModel.model_class is not None:
+        # Set before the app configures Gemini, so the key in backend/.env is not used.
+        os.environ["GOOGLE_API_KEY"] = "benchmark"
+    os.environ["GEMINI_PARALLEL_MEALS"] = "1" if parallel_meals else "0"
+    # Every plan has to come from Gemini to be measured.
+    os.environ.update({"DISH_CATALOG": "0", "EXERCISE_CACHE_SIZE": "0", "EXERCISE_PREWARM": "0"})
+    os.environ.update({"WELLWISE_STORAGE": "sqlite", "WELLWISE_SQLITE_PATH": os.path.join(workdir, 'benchmark.db'),
+                       "DISH_CATALOG_PATH": os.path.join(workdir, 'dish_catalog.json')})
+    import google.generativeai as genai
+
+    if model_class is RecordingModel and RecordingModel.model_class is None:
+        RecordingModel.model_class = genai.GenerativeModel
+    genai.GenerativeModel = model_class
+    return loadtest._load_module('benchmark_backend_app', os.path.join(loadtest.backend_dir, 'app.py'))
+
+
+def run_cases(backend, repeats, used=()):
+    """
+    Time each case in each style `repeats` times.
+
+    Args:
+        backend: The loaded backend app module
+        repeats (int): Runs of each case per style
+        used (list): Keys of the prompts sent, appended to by the model
+
+    Returns:
+        dict: {(endpoint, style): [(seconds, keys of the prompts that request sent)]}
+    """
+    client = backend.app.test_client()
+    runs = {}
+    for style, structured in STYLES.items():
+        backend.GEMINI_STRUCTURED_OUTPUT = structured
+        for endpoint, path, body in CASES:
+            for _ in range(repeats):
+                before = len(used)
+                start = time.perf_counter()
+                response = client.post(path, json=body)
+                elapsed = time.perf_counter() - start
+                if response.status_code != 200:
+                    print(f"⚠️ {endpoint} ({style}) returned {response.status_code}")
+                runs.setdefault((endpoint, style), []).append((elapsed, used[before:]))
+    return runs
+
+
+def record(args):
+    if args.stand_in:
+        StandInModel.ms_per_output_token = args.ms_per_output_token
+        RecordingModel.model_class = StandInModel
+    with tempfile.TemporaryDirectory() as workdir:
+        backend = load_backend(RecordingModel, workdir, args.parallel_meals)
+        run_cases(backend, 1)
+    fixture = {
+        "source": "stand-in" if args.stand_in else backend.GEMINI_MODEL,
+        "recorded": datetime.now().isoformat(timespec='seconds'),
+        "response_schema": backend.GEMINI_RESPONSE_SCHEMA,
+        "parallel_meals": args.parallel_meals,
+        "calls": RecordingModel.calls,
+    }
+    with open(args.fixture, 'w', encoding='utf-8') as f:
+        json.dump(fixture, f, indent=2, ensure_ascii=False)
+    print(f"✅ Recorded {len(RecordingModel.calls)} Gemini calls from {fixture['source']} to {args.fixture}")
+
+
+def replay(args):
+    with open(args.fixture, encoding='utf-8') as f:
+        fixture = json.load(f)
+    FixtureModel.calls = fixture["calls"]
+    print(f"Fixture: {args.fixture} ({fixture['source']}, recorded {fixture['recorded']})")
+
+    with tempfile.TemporaryDirectory() as workdir:
+        backend = load_backend(FixtureModel, workdir, args.parallel_meals)
+        runs = run_cases(backend, args.repeats, FixtureModel.used)
+
+    print(f"\n{'Endpoint':<16}{'Style':<12}{'Input tok':>10}{'Output tok':>11}{'p50 ms':>10}{'mean ms':>10}")
+    summary = {}
+    for (endpoint, style), samples in sorted(runs.items()):
+        calls = [[FixtureModel.calls[key] for key in keys if key in FixtureModel.calls] for _, keys in samples]
+        input_tokens = sum(call["prompt_tokens"] for request in calls for call in request) / len(samples)
+        output_tokens = sum(call["output_tokens"] for request in calls for call in request) / len(samples)
+        times = sorted(seconds * 1000 for seconds, _ in samples)
+        p50, mean = loadtest.percentile(times, 50), sum(times) / len(times)
+        summary[(endpoint, style)] = (input_tokens, p50)
+        print(f"{endpoint:<16}{style:<12}{input_tokens:>10.0f}{output_tokens:>11.0f}{p50:>10.1f}{mean:>10.1f}")
+
+    print()
+    for endpoint in sorted({endpoint for endpoint, _ in summary}):
+        (example_tokens, example_p50), (structured_tokens, structured_p50) = (
+            summary[(endpoint, "example")], summary[(endpoint, "structured")])
+        print(f"{endpoint}: {1 - structured_tokens / example_tokens:.0%} fewer input tokens per request, "
+              f"p50 {example_p50:.0f} → {structured_p50:.0f} ms")
+    if FixtureModel.missing:
+        print(f"⚠️ {FixtureModel.missing} prompts were not in the fixture; record it again.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare example and structured Gemini plan prompts")
+    parser.add_argument('command', nargs='?', choices=['record', 'replay'], default='replay')
+    parser.add_argument('--fixture', default=DEFAULT_FIXTURE, help="Recorded responses (JSON)")
+    parser.add_argument('--repeats', type=int, default=10, help="Replays of each case per style")
+    parser.add_argument('--parallel-meals', action='store_true', help="One Gemini call per meal of a diet plan")
+    parser.add_argument('--stand-in', action='store_true', help="Record loadtest's fake model, not Gemini")
+    parser.add_argument('--ms-per-output-token', type=float, default=5.0,
+                        help="Stand-in generation time per reply token (ms)")
+    args = parser.parse_args()
+    if args.command == 'record':
+        record(args)
+    else:
+        replay(args)
+
+
+if __name__ == "__main__":
+    main()
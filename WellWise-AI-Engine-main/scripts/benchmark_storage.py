@@ -0,0 +1,158 @@
+"""
+Compare storage backends on the operations the APIs perform.
+
+Each backend gets the same workload, built from logged submissions:
+single-prediction saves (as /predict does), batched saves, and concurrent
+history reads (first page plus the next one through the keyset cursor) and
+trend reads from several threads. MongoDB runs against a throwaway
+`wellwise_benchmark` database (dropped afterwards), SQLite against a
+temporary file unless --sqlite-path is given.
+
+Usage:
+    python benchmark_storage.py
+    python benchmark_storage.py --backends sqlite --predictions 100000 --threads 8
+    python benchmark_storage.py --mongomock          # no MongoDB server needed
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(script_dir, '..'))
+import database
+import features
+import rules
+import storage
+
+DEFAULT_SUBMISSIONS = os.path.join(script_dir, '..', 'user_data.txt')
+BENCHMARK_DATABASE = "wellwise_benchmark"
+
+
+def build_records(submissions_file, count, users, seed=0):
+    """(user_email, timestamp, form_data, prediction_data) tuples spread over users and the last year."""
+    rng = random.Random(seed)
+    ruleset = rules.RuleSet.load()
+    with open(submissions_file) as f:
+        forms = [features.normalize_form_data(json.loads(line)["data"]) for line in f if line.strip()]
+    forms = [{k: v.item() if hasattr(v, 'item') else v for k, v in form.items()} for form in forms]
+    responses = ruleset.evaluate(forms, [rng.uniform(60, 85) for _ in forms])
+    start = datetime.now() - timedelta(days=365)
+    records = []
+    for _ in range(count):
+        j = rng.randrange(len(forms))
+        timestamp = start + timedelta(seconds=rng.uniform(0, 365 * 86400))
+        records.append((f"user{rng.randrange(users)}@bench.local", timestamp, forms[j], responses[j]))
+    return records
+
+
+def _rate(count, seconds):
+    return count / seconds if seconds else float('inf')
+
+
+def run_backend(store, records, users, batch_size, single, queries, threads, seed=0):
+    """Time each phase on `store`; returns {phase: ops per second}."""
+    results = {}
+    store.init()
+
+    start = time.perf_counter()
+    for user_email, _, form_data, prediction_data in records[:single]:
+        store.save_prediction(user_email, form_data, prediction_data)
+    results["insert_single"] = _rate(single, time.perf_counter() - start)
+
+    rest = records[single:]
+    start = time.perf_counter()
+    for i in range(0, len(rest), batch_size):
+        result = store.save_predictions(rest[i:i + batch_size])
+        if result.get("status") != "success":
+            raise RuntimeError(f"{store.name}: batched insert failed: {result.get('message')}")
+    results["insert_batched"] = _rate(len(rest), time.perf_counter() - start)
+
+    rng = random.Random(seed)
+    emails = [f"user{rng.randrange(users)}@bench.local" for _ in range(queries)]
+
+    def history(email):
+        page, cursor = store.get_user_predictions_page(email, 10)
+        if cursor:
+            store.get_user_predictions_page(email, 10, cursor)
+        return len(page)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        start = time.perf_counter()
+        list(pool.map(history, emails))
+        results["history_pages"] = _rate(2 * queries, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        list(pool.map(lambda email: store.get_user_trends(email, 'month'), emails))
+        results["trends"] = _rate(queries, time.perf_counter() - start)
+    return results
+
+
+def _mongo_store(use_mongomock):
+    database.DATABASE_NAME = BENCHMARK_DATABASE
+    if use_mongomock:
+        import mongomock
+
+        db = mongomock.MongoClient()[BENCHMARK_DATABASE]
+        database.get_database = lambda: db
+    elif database.get_database() is None:
+        return None, None
+    db = database.get_database()
+    db.client.drop_database(BENCHMARK_DATABASE)
+    database.init_database(db)
+    return storage.MongoStorage(), db
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the storage backends.")
+    parser.add_argument('--backends', nargs='*', default=storage.BACKENDS, choices=storage.BACKENDS)
+    parser.add_argument('--submissions', default=DEFAULT_SUBMISSIONS)
+    parser.add_argument('--predictions', type=int, default=20000)
+    parser.add_argument('--single', type=int, default=1000, help="Predictions saved one at a time")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--sqlite-path', help="Database file (default: a temporary file)")
+    parser.add_argument('--mongomock', action='store_true', help="Benchmark an in-memory mongomock instead of MongoDB")
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    records = build_records(args.submissions, args.predictions, args.users)
+    single = min(args.single, len(records))
+    report = {}
+    for backend in args.backends:
+        if backend == 'mongo':
+            store, db = _mongo_store(args.mongomock)
+            if store is None:
+                print("⚠️  MongoDB unreachable; skipping the mongo backend.")
+                continue
+            try:
+                report[backend] = run_backend(store, records, args.users, args.batch_size, single,
+                                              args.queries, args.threads)
+            finally:
+                db.client.drop_database(BENCHMARK_DATABASE)
+        else:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = args.sqlite_path or os.path.join(tmp, 'benchmark.db')
+                store = storage.create_storage('sqlite', path)
+                report[backend] = run_backend(store, records, args.users, args.batch_size, single,
+                                              args.queries, args.threads)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    phases = ["insert_single", "insert_batched", "history_pages", "trends"]
+    print(f"\n{args.predictions:,} predictions, {args.users} users, {args.threads} threads (ops/s)")
+    print(f"{'backend':>10}" + "".join(f"{phase:>16}" for phase in phases))
+    for backend, results in report.items():
+        print(f"{backend:>10}" + "".join(f"{results[phase]:>16,.0f}" for phase in phases))
+
+
+if __name__ == '__main__':
+    main()
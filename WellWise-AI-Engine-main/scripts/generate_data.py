@@ -91,54 +91,67 @@ def calculate_logical_le(row, state_avg_le):
     else: # age >= 90
         return max(base_le, age + 3)
 
+def sample_profile(rng=random, elderly=False):
+    """
+    One synthetic person, with the family history and existing conditions one-hot encoded.
+
+    Args:
+        rng: Source of randomness (the `random` module or a random.Random)
+        elderly (bool): Draw the age from 85-98 instead of around the state's median age
+
+    Returns:
+        dict: Form fields plus FamilyHistory_*/ExistingConditions_* columns
+    """
+    state = rng.choice(list(STATE_DATA.keys()))
+    state_info = STATE_DATA[state]
+
+    if elderly:
+        age = rng.randint(85, 98)
+    else:
+        age = max(18, int(rng.gauss(state_info['median_age'], 5)))
+
+    sleep_quality = rng.choice(['Good', 'Average', 'Poor'])
+    if sleep_quality == 'Good': sleep_duration = round(rng.uniform(7.0, 9.0), 1)
+    elif sleep_quality == 'Poor':
+        sleep_duration = round(rng.uniform(5.0, 6.4), 1) if rng.random() > 0.5 else round(rng.uniform(9.6, 11.0), 1)
+    else:
+        sleep_duration = round(rng.uniform(6.5, 6.9), 1) if rng.random() > 0.5 else round(rng.uniform(9.1, 9.5), 1)
+
+    row = {
+        'Age': age, 'Gender': rng.choice(['Male', 'Female', 'Other']),
+        'Ethnicity': rng.choice(['North Indian', 'South Indian', 'Bengali', 'Gujarati', 'Punjabi']),
+        'Height': rng.randint(150, 190), 'Weight': rng.randint(45, 100),
+        'Blood Pressure': f"{rng.randint(110, 160)}/{rng.randint(70, 100)}", 'Resting Heart Rate': rng.randint(60, 100),
+        'SpO2': rng.randint(94, 100), 'Diet Type': rng.choice(['Non-Vegetarian', 'Vegetarian', 'Vegan', 'Mixed']),
+        'Protein Intake': rng.choice(['High', 'Medium', 'Low']), 'Junk Food Frequency': rng.choice(['High', 'Medium', 'Low', 'Never']),
+        'Sugar Intake': rng.choice(['High', 'Medium', 'Low']), 'Smoking': rng.choice(['Never', 'Occasionally', 'Daily']),
+        'Alcohol': rng.choice(['Never', 'Occasionally', 'Daily']),
+        'Sleep Duration': sleep_duration, 'Sleep Quality': sleep_quality,
+        'Daily Activity': rng.randint(1000, 10000), 'Exercise Type': rng.choice(['Gym', 'Walking', 'Yoga', 'None']),
+        'Stress Score': rng.randint(1, 10),
+        'Air Quality Index': max(20, int(rng.gauss(state_info['avg_aqi'], 30))), 'Exposure': rng.choice(['Low', 'Medium', 'High']),
+        'Urban/Rural': rng.choice(['Urban', 'Rural']), 'Work Hours': rng.randint(4, 10),
+        'State': state, 'City': rng.choice(state_info['cities'])
+    }
+
+    row['Diet Quality'] = calculate_diet_quality(row)
+    row['BMI'] = round(row['Weight'] / ((row['Height'] / 100) ** 2), 1)
+
+    selected_histories = rng.sample(ALL_FAMILY_HISTORIES, k=rng.randint(0, 2))
+    for h in ALL_FAMILY_HISTORIES: row[f'FamilyHistory_{h}'] = 1 if h in selected_histories else 0
+
+    selected_conditions = rng.sample(ALL_EXISTING_CONDITIONS, k=rng.randint(0, 2))
+    for c in ALL_EXISTING_CONDITIONS: row[f'ExistingConditions_{c}'] = 1 if c in selected_conditions else 0
+    return row
+
 def generate_health_data(num_records=100000):
     print(f"Generating {num_records} records with one-hot encoding...")
     data = []
     num_elderly = int(num_records * 0.01)
     
     for i in range(num_records):
-        state = random.choice(list(STATE_DATA.keys()))
-        state_info = STATE_DATA[state]
-        
-        if i < num_elderly:
-            age = random.randint(85, 98)
-        else:
-            age = max(18, int(random.gauss(state_info['median_age'], 5)))
-
-        sleep_quality = random.choice(['Good', 'Average', 'Poor'])
-        if sleep_quality == 'Good': sleep_duration = round(random.uniform(7.0, 9.0), 1)
-        elif sleep_quality == 'Poor':
-            sleep_duration = round(random.uniform(5.0, 6.4), 1) if random.random() > 0.5 else round(random.uniform(9.6, 11.0), 1)
-        else:
-            sleep_duration = round(random.uniform(6.5, 6.9), 1) if random.random() > 0.5 else round(random.uniform(9.1, 9.5), 1)
-        
-        row = {
-            'Age': age, 'Gender': random.choice(['Male', 'Female', 'Other']),
-            'Ethnicity': random.choice(['North Indian', 'South Indian', 'Bengali', 'Gujarati', 'Punjabi']),
-            'Height': random.randint(150, 190), 'Weight': random.randint(45, 100),
-            'Blood Pressure': f"{random.randint(110, 160)}/{random.randint(70, 100)}", 'Resting Heart Rate': random.randint(60, 100),
-            'SpO2': random.randint(94, 100), 'Diet Type': random.choice(['Non-Vegetarian', 'Vegetarian', 'Vegan', 'Mixed']),
-            'Protein Intake': random.choice(['High', 'Medium', 'Low']), 'Junk Food Frequency': random.choice(['High', 'Medium', 'Low', 'Never']),
-            'Sugar Intake': random.choice(['High', 'Medium', 'Low']), 'Smoking': random.choice(['Never', 'Occasionally', 'Daily']),
-            'Alcohol': random.choice(['Never', 'Occasionally', 'Daily']), 
-            'Sleep Duration': sleep_duration, 'Sleep Quality': sleep_quality,
-            'Daily Activity': random.randint(1000, 10000), 'Exercise Type': random.choice(['Gym', 'Walking', 'Yoga', 'None']), 
-            'Stress Score': random.randint(1, 10),
-            'Air Quality Index': max(20, int(random.gauss(state_info['avg_aqi'], 30))), 'Exposure': random.choice(['Low', 'Medium', 'High']),
-            'Urban/Rural': random.choice(['Urban', 'Rural']), 'Work Hours': random.randint(4, 10),
-            'State': state, 'City': random.choice(state_info['cities'])
-        }
-        
-        row['Diet Quality'] = calculate_diet_quality(row)
-        row['BMI'] = round(row['Weight'] / ((row['Height'] / 100) ** 2), 1)
-
-        selected_histories = random.sample(ALL_FAMILY_HISTORIES, k=random.randint(0, 2))
-        for h in ALL_FAMILY_HISTORIES: row[f'FamilyHistory_{h}'] = 1 if h in selected_histories else 0
-            
-        selected_conditions = random.sample(ALL_EXISTING_CONDITIONS, k=random.randint(0, 2))
-        for c in ALL_EXISTING_CONDITIONS: row[f'ExistingConditions_{c}'] = 1 if c in selected_conditions else 0
-
-        row['Life Expectancy'] = round(calculate_logical_le(row, state_info['avg_le']), 1)
+        row = sample_profile(elderly=i < num_elderly)
+        row['Life Expectancy'] = round(calculate_logical_le(row, STATE_DATA[row['State']]['avg_le']), 1)
         data.append(row)
         
     df = pd.DataFrame(data)
@@ -0,0 +1,359 @@
+"""
+Synthetic request streams for load tests and cache-sizing experiments.
+
+Profiles come from generate_data.sample_profile, so they follow the training
+data's distributions and can all be scored by the model. With probability
+--repeat-ratio a request comes from a user seen before, who sends the same
+profile and plan inputs again, as returning users do; the others come from new
+users until --users exist. Dishes in chat questions follow a Zipf distribution
+over DISHES (a few dishes dominate, as in real food searches), and arrivals
+are a Poisson process at --rate requests per second.
+
+Streams are written as JSONL, one request per line:
+
+    {"t": 0.0213, "endpoint": "predict", "body": {...}}
+    {"t": 0.0388, "endpoint": "chat", "body": {"message": "..."}, "dish": "Masala Dosa"}
+
+and can be replayed against running servers (keeping the recorded timing, or
+as fast as possible), fed to scripts/loadtest.py with --traffic, or run
+through the prediction cache at several sizes with cache-sim.
+
+Usage:
+    python generate_traffic.py record traffic.jsonl --count 10000 --repeat-ratio 0.6
+    python generate_traffic.py replay traffic.jsonl --signup --concurrency 8 --speed 2
+    python generate_traffic.py cache-sim traffic.jsonl --sizes 100 1000 10000
+"""
+import argparse
+import bisect
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(script_dir)
+sys.path.append(os.path.join(script_dir, '..'))
+from generate_data import ALL_EXISTING_CONDITIONS, ALL_FAMILY_HISTORIES, sample_profile
+
+PASSWORD = "traffic-password"
+DEFAULT_MIX = {"predict": 0.35, "history": 0.2, "chat": 0.15, "full_plan": 0.1, "exercise_plan": 0.1, "login": 0.1}
+ENDPOINTS = {
+    "predict": ("engine", "POST", "/predict"),
+    "history": ("engine", "GET", "/history"),
+    "chat": ("chatbot", "POST", "/chat"),
+    "full_plan": ("backend", "POST", "/api/get_full_plan"),
+    "exercise_plan": ("backend", "POST", "/api/get_exercise_plan"),
+    "login": ("backend", "POST", "/api/login"),
+}
+DEFAULT_URLS = {"engine": "http://127.0.0.1:5001", "backend": "http://127.0.0.1:5000",
+                "chatbot": "http://127.0.0.1:5002"}
+
+# Roughly in order of popularity; the Zipf ranks follow this order.
+DISHES = [
+    "Masala Dosa", "Chicken Biryani", "Paneer Butter Masala", "Idli Sambar", "Chole Bhature", "Dal Makhani",
+    "Aloo Paratha", "Butter Chicken", "Poha", "Rajma Chawal", "Upma", "Palak Paneer", "Veg Pulao", "Pav Bhaji",
+    "Samosa", "Dhokla", "Chicken Tikka", "Vada Pav", "Khichdi", "Medu Vada", "Fish Curry", "Aloo Gobi",
+    "Egg Curry", "Bhindi Masala", "Jeera Rice", "Tandoori Roti", "Mutton Rogan Josh", "Pongal", "Kadhi Pakora",
+    "Baingan Bharta", "Appam with Stew", "Thepla", "Misal Pav", "Sabudana Khichdi", "Dal Tadka", "Uttapam",
+    "Chana Masala", "Matar Paneer", "Lemon Rice", "Curd Rice", "Malai Kofta", "Litti Chokha", "Pesarattu",
+    "Kathi Roll", "Hyderabadi Haleem", "Goan Fish Curry", "Sarson ka Saag", "Bisi Bele Bath", "Ragi Mudde",
+    "Moong Dal Chilla",
+]
+CHAT_QUESTIONS = ["How can I sleep better?", "Is my BMI healthy?", "How do I lower my stress?",
+                  "What should I eat before a run?", "How much water should I drink a day?"]
+DISH_QUESTIONS = ["How many calories are in {dish}?", "Is {dish} good for weight loss?",
+                  "Can I eat {dish} with high blood pressure?", "What is a healthier version of {dish}?"]
+PLANS = ['maintain', 'mildLoss', 'weightLoss', 'extremeLoss']
+
+
+def to_form(row):
+    """A sample_profile row as the /predict form sends it (conditions as lists)."""
+    form = {key: value for key, value in row.items()
+            if not key.startswith(('FamilyHistory_', 'ExistingConditions_'))}
+    form['Family History'] = [h for h in ALL_FAMILY_HISTORIES if row[f'FamilyHistory_{h}']]
+    form['Existing Conditions'] = [c for c in ALL_EXISTING_CONDITIONS if row[f'ExistingConditions_{c}']]
+    return form
+
+
+class ZipfSampler:
+    """Draws items with probability proportional to 1 / rank**s."""
+
+    def __init__(self, items, s, rng):
+        self.items = items
+        self.rng = rng
+        self.cum_weights = list(itertools.accumulate(1 / rank ** s for rank in range(1, len(items) + 1)))
+
+    def sample(self):
+        return self.items[bisect.bisect(self.cum_weights, self.rng.random() * self.cum_weights[-1])]
+
+
+class TrafficGenerator:
+    """An endless, seeded stream of requests from a population of returning and new users."""
+
+    def __init__(self, seed=0, users=1000, repeat_ratio=0.5, zipf_s=1.1, mix=None, rate=50.0,
+                 domain="traffic.local"):
+        self.rng = random.Random(seed)
+        self.max_users = users
+        self.repeat_ratio = repeat_ratio
+        self.rate = rate
+        self.domain = domain
+        self.dishes = ZipfSampler(DISHES, zipf_s, self.rng)
+        mix = mix or DEFAULT_MIX
+        self.endpoints = list(mix)
+        self.endpoint_weights = list(itertools.accumulate(mix[name] for name in self.endpoints))
+        self.users = []
+        self.t = 0.0
+
+    def _new_user(self):
+        form = to_form(sample_profile(self.rng, elderly=self.rng.random() < 0.01))
+        email = f"user{len(self.users)}@{self.domain}"
+        form['email'] = email
+        activity = form['Daily Activity']
+        exercise = form['Exercise Type']
+        user = {
+            "email": email,
+            "form": form,
+            "diet": {"age": form['Age'], "height": form['Height'], "weight": form['Weight'],
+                     "gender": form['Gender'].lower(), "activityLevel": bisect.bisect([3000, 5000, 7500, 9000], activity),
+                     "weightLossPlan": self.rng.choice(PLANS), "mealsPerDay": self.rng.choice([3, 3, 4, 5])},
+            "exercise": {"fitnessLevel": {"None": "Beginner", "Gym": self.rng.choice(["Intermediate", "Advanced"])}
+                         .get(exercise, self.rng.choice(["Beginner", "Intermediate"])),
+                         "primaryGoal": ("Weight Loss" if form['BMI'] >= 25 else "Muscle Gain" if form['BMI'] < 18.5
+                                         else self.rng.choice(["Endurance", "Flexibility", "Muscle Gain"])),
+                         "availableEquipment": {"dumbbells": exercise == 'Gym', "mat": exercise == 'Yoga'},
+                         "workoutDaysPerWeek": self.rng.randint(3, 6), "timePerSession": self.rng.choice([30, 45, 60])},
+        }
+        self.users.append(user)
+        return user
+
+    def _user(self):
+        if self.users and (len(self.users) >= self.max_users or self.rng.random() < self.repeat_ratio):
+            return self.rng.choice(self.users)
+        return self._new_user()
+
+    def request(self, endpoint):
+        """One request for `endpoint`: {"endpoint", "body"} plus "dish" when a chat question names one."""
+        user = self._user()
+        record = {"endpoint": endpoint}
+        if endpoint == "predict":
+            record["body"] = dict(user["form"])
+        elif endpoint == "history":
+            record["body"] = {"email": user["email"], "limit": 10}
+        elif endpoint == "chat":
+            if self.rng.random() < 0.6:
+                record["dish"] = self.dishes.sample()
+                record["body"] = {"message": self.rng.choice(DISH_QUESTIONS).format(dish=record["dish"])}
+            else:
+                record["body"] = {"message": self.rng.choice(CHAT_QUESTIONS)}
+        elif endpoint == "full_plan":
+            record["body"] = dict(user["diet"])
+        elif endpoint == "exercise_plan":
+            record["body"] = dict(user["exercise"])
+        elif endpoint == "login":
+            record["body"] = {"email": user["email"], "password": PASSWORD}
+        else:
+            raise ValueError(f"Unknown endpoint {endpoint!r}; choose from {list(ENDPOINTS)}.")
+        return record
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.t += self.rng.expovariate(self.rate)
+        endpoint = self.endpoints[bisect.bisect(self.endpoint_weights, self.rng.random() * self.endpoint_weights[-1])]
+        return {"t": round(self.t, 4), **self.request(endpoint)}
+
+
+def parse_mix(values):
+    """['predict=0.5', 'chat=0.5'] -> {'predict': 0.5, 'chat': 0.5}"""
+    mix = {}
+    for value in values:
+        name, _, weight = value.partition('=')
+        if name not in ENDPOINTS or not weight:
+            raise ValueError(f"Expected ENDPOINT=WEIGHT with ENDPOINT in {list(ENDPOINTS)}, got {value!r}.")
+        mix[name] = float(weight)
+    return mix
+
+
+def write_jsonl(records, path):
+    count = 0
+    with open(path, 'w') as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+            count += 1
+    return count
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def send(session, urls, record, timeout=60):
+    """Send one recorded request; returns the HTTP status (0 on a connection error)."""
+    import requests
+
+    service, method, path = ENDPOINTS[record["endpoint"]]
+    try:
+        if method == "GET":
+            response = session.get(urls[service] + path, params=record["body"], timeout=timeout)
+        else:
+            response = session.post(urls[service] + path, json=record["body"], timeout=timeout)
+        return response.status_code
+    except requests.RequestException:
+        return 0
+
+
+def replay(records, urls, concurrency=8, speed=1.0, signup=False):
+    """
+    Send `records` to running servers.
+
+    Args:
+        records (list): Requests as read by read_jsonl
+        urls (dict): Base URL per service ("engine", "backend", "chatbot")
+        concurrency (int): Client threads
+        speed (float): Multiple of the recorded rate; 0 sends as fast as possible
+        signup (bool): Create accounts for the users that log in first
+
+    Returns:
+        dict: {endpoint: {"count", "errors", "latencies"}}
+    """
+    import requests
+
+    local = threading.local()
+
+    def session():
+        if getattr(local, 'session', None) is None:
+            local.session = requests.Session()
+        return local.session
+
+    if signup:
+        emails = sorted({record["body"]["email"] for record in records if record["endpoint"] == "login"})
+        for email in emails:
+            session().post(f"{urls['backend']}/api/signup", timeout=60,
+                           json={"name": email.split('@')[0], "email": email, "password": PASSWORD})
+
+    stats = {}
+    lock = threading.Lock()
+
+    def call(record):
+        start = time.perf_counter()
+        status = send(session(), urls, record)
+        latency = time.perf_counter() - start
+        with lock:
+            entry = stats.setdefault(record["endpoint"], {"count": 0, "errors": 0, "latencies": []})
+            entry["count"] += 1
+            entry["errors"] += not 200 <= status < 400
+            entry["latencies"].append(latency)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for record in records:
+            if speed:
+                delay = start + record["t"] / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            pool.submit(call, record)
+    return stats
+
+
+def cache_sim(records, sizes):
+    """
+    Hit rates of an LRU cache of each size over the stream's repeated keys.
+
+    /predict requests are keyed exactly as the prediction cache keys them (the
+    encoded feature vector under the active model); plan requests by their
+    inputs, and chat questions by the dish they name. TTLs are ignored.
+
+    Returns:
+        dict: {stream: {"requests", "distinct", size: hit rate}}
+    """
+    import features
+    import model_registry
+    import prediction_cache
+
+    bundle = model_registry.ModelRegistry().reload()
+    streams = {"predict": [], "plans": [], "dishes": []}
+    for record in records:
+        if record["endpoint"] == "predict":
+            form = features.normalize_form_data(dict(record["body"]))
+            vector = features.encode_vector(form, bundle.encoders, bundle.feature_names)
+            streams["predict"].append(prediction_cache.make_key(bundle.version, vector))
+        elif record["endpoint"] in ("full_plan", "exercise_plan"):
+            streams["plans"].append(record["endpoint"] + json.dumps(record["body"], sort_keys=True))
+        elif record.get("dish"):
+            streams["dishes"].append(record["dish"])
+
+    results = {}
+    for name, keys in streams.items():
+        results[name] = {"requests": len(keys), "distinct": len(set(keys))}
+        for size in sizes:
+            cache = prediction_cache.PredictionCache(max_entries=size, ttl_seconds=float('inf'))
+            for key in keys:
+                if cache.get(key) is None:
+                    cache.put(key, True)
+            results[name][size] = cache.status()["hit_rate"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate, replay and analyse synthetic request streams.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="Write a synthetic request stream to a JSONL file")
+    rec.add_argument("path")
+    rec.add_argument("--count", type=int, default=10000)
+    rec.add_argument("--seed", type=int, default=0)
+    rec.add_argument("--users", type=int, default=1000, help="Distinct users at most")
+    rec.add_argument("--repeat-ratio", type=float, default=0.5, help="Share of requests from returning users")
+    rec.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent of dish popularity")
+    rec.add_argument("--rate", type=float, default=50.0, help="Mean requests per second")
+    rec.add_argument("--mix", nargs='*', default=[], metavar="ENDPOINT=WEIGHT",
+                     help=f"Endpoint weights (default {' '.join(f'{k}={v}' for k, v in DEFAULT_MIX.items())})")
+
+    rep = sub.add_parser("replay", help="Send a recorded stream to running servers")
+    rep.add_argument("path")
+    for service, url in DEFAULT_URLS.items():
+        rep.add_argument(f"--{service}-url", default=url)
+    rep.add_argument("--concurrency", type=int, default=8)
+    rep.add_argument("--speed", type=float, default=1.0, help="Multiple of the recorded rate; 0 = as fast as possible")
+    rep.add_argument("--signup", action="store_true", help="Create accounts for the logged-in users first")
+
+    sim = sub.add_parser("cache-sim", help="LRU hit rates of a recorded stream at several cache sizes")
+    sim.add_argument("path")
+    sim.add_argument("--sizes", type=int, nargs='+', default=[100, 1000, 10000])
+    args = parser.parse_args()
+
+    if args.command == "record":
+        try:
+            mix = parse_mix(args.mix) or None
+        except ValueError as e:
+            sys.exit(f"❌ {e}")
+        generator = TrafficGenerator(args.seed, args.users, args.repeat_ratio, args.zipf, mix, args.rate)
+        count = write_jsonl(itertools.islice(generator, args.count), args.path)
+        print(f"✅ Wrote {count:,} requests from {len(generator.users):,} users "
+              f"over {generator.t:,.1f}s to {args.path}")
+    elif args.command == "replay":
+        import loadtest
+
+        urls = {service: getattr(args, f"{service}_url") for service in DEFAULT_URLS}
+        stats = replay(read_jsonl(args.path), urls, args.concurrency, args.speed, args.signup)
+        print(f"{'endpoint':<15}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, entry in stats.items():
+            latencies = sorted(entry["latencies"])
+            print(f"{name:<15}{entry['count']:>10,}{entry['errors']:>8}"
+                  + "".join(f"{loadtest.percentile(latencies, p) * 1000:>10,.1f}" for p in loadtest.PERCENTILES))
+    else:
+        results = cache_sim(read_jsonl(args.path), args.sizes)
+        print(f"{'stream':<10}{'requests':>10}{'distinct':>10}" + "".join(f"{f'LRU {size}':>12}" for size in args.sizes))
+        for name, entry in results.items():
+            print(f"{name:<10}{entry['requests']:>10,}{entry['distinct']:>10,}"
+                  + "".join(f"{entry[size]:>12.1%}" if entry[size] is not None else f"{'-':>12}"
+                            for size in args.sizes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,367 @@
+"""
+Load test for the HTTP endpoints of all three services.
+
+Starts the prediction API (app.py), the chatbot (chatbot.py) and the backend
+(backend/app.py) in this process on free local ports, with local stand-ins for
+everything they call out to:
+
+    Gemini      google.generativeai.GenerativeModel replaced by a fake that
+                waits --gemini-latency-ms and returns canned JSON/text
+    Mailtrap    a local HTTP server (--stub-latency-ms) in place of the send API
+    FatSecret   the same server in place of the token and search APIs
+    MongoDB     the SQLite storage backend in a temporary file
+                (--storage mongomock for an in-memory mongomock instead)
+
+and nothing is written to the working tree (the apps run in a temporary
+directory). Request bodies come from generate_traffic.TrafficGenerator (or a
+recording of it, --traffic), and the users they name are seeded as accounts
+with some prediction history. Each endpoint is then driven on its own with
+--concurrency client threads for --requests requests, after a few warm-up
+ones, and reported as throughput and p50/p95/p99 latency.
+
+--save-baseline stores the results; later runs with the same settings compare
+against it and exit with status 1 if any endpoint's throughput dropped or its
+p50/p95 latency rose by more than --tolerance. Baselines are machine-specific,
+so record one on the machine that runs the comparison.
+
+Usage:
+    python loadtest.py
+    python loadtest.py --endpoints predict history --requests 2000 --concurrency 16
+    python loadtest.py --save-baseline
+    python loadtest.py --traffic traffic.jsonl --endpoints predict chat
+"""
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import requests
+
+import generate_traffic
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+engine_dir = os.path.abspath(os.path.join(script_dir, '..'))
+backend_dir = os.path.abspath(os.path.join(engine_dir, '..', 'backend'))
+sys.path.append(engine_dir)
+sys.path.append(backend_dir)
+
+DEFAULT_BASELINE = os.path.join(script_dir, 'loadtest_baseline.json')
+PERCENTILES = [50, 95, 99]
+
+EXERCISE_PLAN = {"weeklyPlan": [
+    {"day": day, "focus": focus, "intensity": "Medium", "icon": "💪", "exercises": [
+        {"name": name, "sets": 3, "reps": 12, "rest": "60s", "equipment": "Bodyweight"}
+        for name in ["Push-ups", "Squats", "Lunges", "Plank", "Burpees"]]}
+    for day, focus in [("Monday", "Upper Body"), ("Wednesday", "Lower Body"), ("Friday", "Full Body"),
+                       ("Saturday", "Core"), ("Sunday", "Mobility")]]}
+
+
+# --- Stand-ins ---
+
+class FakeGenerativeModel:
+    """Answers like gemini-2.5-flash would, after a fixed delay."""
+
+    latency = 0.0
+    calls = 0
+    _lock = threading.Lock()
+
+    def __init__(self, model_name=None, **kwargs):
+        self.model_name = model_name
+
+    def generate_content(self, prompt, generation_config=None, **kwargs):
+        time.sleep(self.latency)
+        with self._lock:
+            FakeGenerativeModel.calls += 1
+        # The plan's keys are in the prompt, or in the response schema when the SDK takes one.
+        spec = prompt + json.dumps((generation_config or {}).get('response_schema') or {})
+        if '"weeklyPlan"' in spec:
+            text = json.dumps(EXERCISE_PLAN, ensure_ascii=False)
+        elif '"mealPlan"' in spec:
+            # Example prompts spell out each meal; structured ones list them on a "Meals:" line.
+            meals = re.findall(r'"mealType": "([^"]+)"', prompt)
+            if not meals:
+                meals = re.search(r'^Meals: ([^.]*)\.', prompt, re.M).group(1).split(', ')
+            text = json.dumps({"mealPlan": [{"mealType": meal, "options": [
+                {"name": f"{meal} Dish {i}", "description": "Steamed rice cakes with lentil stew.",
+                 "calories": 300 + 50 * i, "protein": 15, "fat": 10, "carbs": 40, "saturatedFat": 3,
+                 "sodium": 500, "fiber": 5, "sugar": 6, "ingredients": ["Rice", "Urad dal", "Toor dal"],
+                 "instructions": ["Soak and grind.", "Ferment overnight.", "Steam for 12 minutes."]}
+                for i in range(1, 4)]} for meal in meals]}, ensure_ascii=False)
+        else:
+            text = ("- Aim for 7-9 hours of sleep on a regular schedule.\n"
+                    "- Add 30 minutes of brisk walking on most days.\n"
+                    "- Swap sugary drinks for water or buttermilk.")
+        return SimpleNamespace(text=f"```json\n{text}\n```" if text.startswith('{') else text)
+
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    """Mailtrap's send API and FatSecret's token/search APIs, with canned answers."""
+
+    latency = 0.0
+    hits = {}
+    _lock = threading.Lock()
+
+    def _reply(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+        time.sleep(self.latency)
+        path = self.path.split('?')[0]
+        with self._lock:
+            StubAPIHandler.hits[path] = StubAPIHandler.hits.get(path, 0) + 1
+        if path == '/connect/token':
+            body = {"access_token": "loadtest", "expires_in": 86400, "token_type": "Bearer"}
+        elif path == '/rest/server.api':
+            body = {"foods": {"food": [{"food_id": "1", "food_name": "Idli"}]}}
+        else:
+            body = {"success": True, "message_ids": ["loadtest"]}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _load_module(name, path):
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def _serve(wsgi_app):
+    from werkzeug.serving import make_server
+
+    server = make_server('127.0.0.1', 0, wsgi_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}"
+
+
+def start_services(workdir, storage_backend, gemini_latency, stub_latency):
+    """Start the stand-ins and the three apps; returns {service: base URL} and the Storage in use."""
+    FakeGenerativeModel.latency = gemini_latency
+    StubAPIHandler.latency = stub_latency
+    stub = ThreadingHTTPServer(('127.0.0.1', 0), StubAPIHandler)
+    stub.daemon_threads = True
+    threading.Thread(target=stub.serve_forever, daemon=True).start()
+    stub_url = f"http://127.0.0.1:{stub.server_port}"
+
+    # Set before the apps import their clients, so the real keys in a .env file are never used.
+    os.environ.update({"GOOGLE_API_KEY": "loadtest", "MAILTRAP_API_TOKEN": "loadtest",
+                       "FATSECRET_CLIENT_ID": "loadtest", "FATSECRET_CLIENT_SECRET": "loadtest",
+                       "WELLWISE_STORAGE": "sqlite" if storage_backend == 'sqlite' else "mongo",
+                       "WELLWISE_SQLITE_PATH": os.path.join(workdir, 'loadtest.db'),
+                       "DISH_CATALOG_PATH": os.path.join(workdir, 'dish_catalog.json'),
+                       "EXERCISE_POPULAR_PATH": os.path.join(workdir, 'exercise_popular.json')})
+    import google.generativeai as genai
+
+    genai.GenerativeModel = FakeGenerativeModel
+    import email_utils
+    import fatsecret_api
+
+    email_utils.MAILTRAP_API_URL = f"{stub_url}/api/send"
+    fatsecret_api.TOKEN_URL = f"{stub_url}/connect/token"
+    fatsecret_api.SEARCH_URL = f"{stub_url}/rest/server.api"
+
+    import storage
+
+    if storage_backend == 'mongomock':
+        import database
+        import mongomock
+
+        db = mongomock.MongoClient()[database.DATABASE_NAME]
+        database.get_database = lambda: db
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    os.chdir(workdir)  # user_data.txt is appended to in the working directory
+    engine = _load_module('loadtest_engine_app', os.path.join(engine_dir, 'app.py'))
+    chatbot = _load_module('loadtest_chatbot', os.path.join(engine_dir, 'chatbot.py'))
+    backend = _load_module('loadtest_backend_app', os.path.join(backend_dir, 'app.py'))
+    urls = {"engine": _serve(engine.app), "chatbot": _serve(chatbot.app), "backend": _serve(backend.app)}
+    return urls, storage.get_storage()
+
+
+def seed(store, emails, predictions):
+    """Accounts for `emails` that can log in, with `predictions` stored predictions spread over them."""
+    import bcrypt
+    from benchmark_storage import DEFAULT_SUBMISSIONS, build_records
+
+    password_hash = bcrypt.hashpw(generate_traffic.PASSWORD.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    for email in emails:
+        store.save_user(email, email.split('@')[0], password_hash)
+    owners = {f"user{i}@bench.local": email for i, email in enumerate(emails)}
+    records = build_records(DEFAULT_SUBMISSIONS, predictions, len(emails))
+    store.save_predictions([(owners[user_email], *rest) for user_email, *rest in records])
+
+
+# --- Workload ---
+
+def workload(endpoints, count, users, repeat_ratio, traffic=None):
+    """Request bodies for each endpoint, from a recorded stream or a fresh TrafficGenerator."""
+    if traffic:
+        records = generate_traffic.read_jsonl(traffic)
+        bodies = {name: [record["body"] for record in records if record["endpoint"] == name] for name in endpoints}
+        missing = [name for name, recorded in bodies.items() if not recorded]
+        if missing:
+            raise ValueError(f"{traffic} has no requests for {missing}.")
+        return bodies
+    generator = generate_traffic.TrafficGenerator(users=users, repeat_ratio=repeat_ratio, domain="bench.local")
+    return {name: [generator.request(name)["body"] for _ in range(count)] for name in endpoints}
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(round(p / 100 * len(sorted_values))) - 1))]
+
+
+def run_endpoint(method, url, bodies, requests_count, concurrency, warmup):
+    """Send requests_count requests (cycling through `bodies`) from `concurrency` threads; returns the stats."""
+    local = threading.local()
+
+    def call(i):
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+        body = bodies[i % len(bodies)]
+        start = time.perf_counter()
+        try:
+            if method == "GET":
+                response = session.get(url, params=body, timeout=60)
+            else:
+                response = session.post(url, json=body, timeout=60)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(call, range(-warmup, 0)))
+        start = time.perf_counter()
+        results = list(pool.map(call, range(requests_count)))
+        elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    stats = {"requests": requests_count, "errors": sum(1 for _, ok in results if not ok),
+             "throughput": round(requests_count / elapsed, 1)}
+    for p in PERCENTILES:
+        stats[f"p{p}_ms"] = round(percentile(latencies, p) * 1000, 2)
+    return stats
+
+
+def compare(results, baseline, tolerance):
+    """Regressions of `results` against `baseline`, as messages."""
+    regressions = []
+    for name, stats in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        if stats["throughput"] < before["throughput"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {stats['throughput']:,.1f}/s vs {before['throughput']:,.1f}/s")
+        for key in ("p50_ms", "p95_ms"):
+            if stats[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{name}: {key[:3]} {stats[key]:,.1f} ms vs {before[key]:,.1f} ms")
+        if stats["errors"] > before.get("errors", 0):
+            regressions.append(f"{name}: {stats['errors']} errors vs {before.get('errors', 0)}")
+    return regressions
+
+
+def print_report(results, settings):
+    print(f"\n{settings['requests']} requests per endpoint, concurrency {settings['concurrency']}, "
+          f"Gemini {settings['gemini_latency_ms']} ms, stubs {settings['stub_latency_ms']} ms, "
+          f"storage {settings['storage']}")
+    print(f"{'endpoint':<15}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, stats in results.items():
+        print(f"{name:<15}{stats['throughput']:>10,.1f}{stats['p50_ms']:>10,.1f}{stats['p95_ms']:>10,.1f}"
+              f"{stats['p99_ms']:>10,.1f}{stats['errors']:>8}")
+    calls = [f"Gemini {FakeGenerativeModel.calls}"] + [f"{path} {count}" for path, count in sorted(StubAPIHandler.hits.items())]
+    print(f"Stand-in calls: {', '.join(calls)}")
+
+
+def main():
+    endpoint_names = list(generate_traffic.ENDPOINTS)
+    parser = argparse.ArgumentParser(description="Load-test the WellWise HTTP endpoints against local stand-ins.")
+    parser.add_argument('--endpoints', nargs='*', default=endpoint_names, choices=endpoint_names)
+    parser.add_argument('--requests', type=int, default=500, help="Measured requests per endpoint")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--repeat-ratio', type=float, default=0.5, help="Share of requests from returning users")
+    parser.add_argument('--traffic', help="Replay the request bodies of a generate_traffic.py recording")
+    parser.add_argument('--history', type=int, default=5000, help="Predictions seeded before the run")
+    parser.add_argument('--gemini-latency-ms', type=float, default=200)
+    parser.add_argument('--stub-latency-ms', type=float, default=20)
+    parser.add_argument('--storage', choices=['sqlite', 'mongomock'], default='sqlite')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed relative regression")
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    settings = {"requests": args.requests, "concurrency": args.concurrency, "storage": args.storage,
+                "gemini_latency_ms": args.gemini_latency_ms, "stub_latency_ms": args.stub_latency_ms,
+                "users": args.users, "repeat_ratio": None if args.traffic else args.repeat_ratio,
+                "traffic": os.path.basename(args.traffic) if args.traffic else None}
+    try:
+        bodies = workload(args.endpoints, args.requests, args.users, args.repeat_ratio, args.traffic)
+    except (OSError, ValueError) as e:
+        sys.exit(f"❌ {e}")
+    emails = sorted({body["email"] for sent in bodies.values() for body in sent if "email" in body})
+
+    with tempfile.TemporaryDirectory() as workdir:
+        urls, store = start_services(workdir, args.storage, args.gemini_latency_ms / 1000,
+                                     args.stub_latency_ms / 1000)
+        if emails:
+            seed(store, emails, args.history)
+        results = {}
+        for name in args.endpoints:
+            service, method, path = generate_traffic.ENDPOINTS[name]
+            results[name] = run_endpoint(method, urls[service] + path, bodies[name], args.requests,
+                                         args.concurrency, args.warmup)
+        os.chdir(engine_dir)
+
+    if args.json:
+        print(json.dumps({"settings": settings, "results": results}, indent=2))
+    else:
+        print_report(results, settings)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({"settings": settings, "results": results}, f, indent=2)
+        print(f"✅ Baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --save-baseline to record one.")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["settings"] != settings:
+        print(f"⚠️  Baseline was recorded with different settings ({baseline['settings']}); not comparing.")
+        return 0
+    regressions = compare(results, baseline["results"], args.tolerance)
+    for message in regressions:
+        print(f"❌ {message}")
+    if not regressions:
+        print(f"✅ No regressions beyond {args.tolerance:.0%} of the baseline.")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+Migrate stored predictions to the compact document layout (see doc_schema.py).
+
+Streams documents still in the old layout in _id order with a batched cursor,
+rewrites each one in place ($set the compact fields, $unset the old ones) with
+unordered bulk writes and reports the size saved. Migrated documents no longer
+match the query, so an interrupted run simply picks up where it stopped.
+Readers decode both layouts, so the API can keep serving while this runs.
+
+Usage:
+    python migrate_prediction_docs.py --dry-run          # report the size saving only
+    python migrate_prediction_docs.py --validator        # migrate, then enforce the schema
+    python migrate_prediction_docs.py --mongomock ../user_data.txt --mock-copies 20000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import bson
+from pymongo import UpdateOne
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(script_dir, '..'))
+import database
+import doc_schema
+import features
+import rules
+
+DEFAULT_BATCH_SIZE = 1000
+LEGACY_QUERY = {"v": {"$exists": False}}
+
+
+def _compacted(doc, fields):
+    compact = {k: v for k, v in doc.items() if k not in doc_schema.LEGACY_FIELDS}
+    compact.update(fields)
+    return compact
+
+
+def migrate(collection, batch_size=DEFAULT_BATCH_SIZE, dry_run=False):
+    """
+    Rewrite every old-layout document in `collection` (a pymongo or mongomock collection).
+
+    Returns:
+        dict: migrated/errors counts and BSON bytes before and after
+    """
+    stats = {"migrated": 0, "errors": 0, "bytes_before": 0, "bytes_after": 0}
+    unset = {field: "" for field in doc_schema.LEGACY_FIELDS}
+    start = time.perf_counter()
+    cursor = collection.find(LEGACY_QUERY).sort("_id", 1).batch_size(batch_size)
+
+    def flush(ops):
+        if ops and not dry_run:
+            collection.bulk_write(ops, ordered=False)
+
+    def report_progress():
+        elapsed = time.perf_counter() - start
+        rate = stats["migrated"] / elapsed if elapsed else 0.0
+        print(f"  migrated {stats['migrated']:>9,}  errors {stats['errors']:>6,}  {rate:,.0f} docs/s")
+
+    ops = []
+    for doc in cursor:
+        try:
+            fields = doc_schema.upgrade(doc)
+            after = len(bson.encode(_compacted(doc, fields)))
+        except (KeyError, TypeError, ValueError, bson.errors.InvalidDocument) as e:
+            stats["errors"] += 1
+            print(f"  ⚠️  {doc['_id']}: {e}")
+            continue
+        stats["bytes_before"] += len(bson.encode(doc))
+        stats["bytes_after"] += after
+        stats["migrated"] += 1
+        # Guarded on the layout so a document a rescore already migrated isn't overwritten.
+        ops.append(UpdateOne({"_id": doc["_id"], **LEGACY_QUERY}, {"$set": fields, "$unset": unset}))
+        if len(ops) == batch_size:
+            flush(ops)
+            report_progress()
+            ops = []
+    # The summary that follows covers the last, partial batch.
+    flush(ops)
+    return stats
+
+
+def _mock_collection(submissions_file, copies):
+    """A mongomock collection of old-layout documents built from a user_data.txt-style file."""
+    import mongomock
+
+    ruleset = rules.RuleSet.load()
+    with open(submissions_file) as f:
+        forms = [features.normalize_form_data(json.loads(line)["data"]) for line in f if line.strip()]
+    # Plain Python numbers, as the API's JSON round trip would leave them.
+    forms = [{k: v.item() if hasattr(v, 'item') else v for k, v in form.items()} for form in forms]
+    responses = ruleset.evaluate(forms, [72.0] * len(forms))
+    collection = mongomock.MongoClient()[database.DATABASE_NAME].predictions
+    docs = []
+    for i in range(copies):
+        form_data, response = forms[i % len(forms)], responses[i % len(forms)]
+        docs.append({
+            "user_email": form_data.get('email', 'guest@wellwise.com'), "timestamp": datetime.now(),
+            "age": form_data.get('Age'), "prediction": response['prediction'], "model_version": "v15",
+            "current_age": response['current_age'], "state": form_data.get('State'), "health_data": form_data,
+            "adjustments": response['adjustments'], "recommendations": response['recommendations'],
+            "health_scores": response['health_scores'],
+        })
+    collection.insert_many(docs)
+    return collection
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate stored predictions to the compact document layout.")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--dry-run', action='store_true', help="Only report how much smaller the documents get")
+    parser.add_argument('--validator', action='store_true', help="Apply the $jsonSchema validator afterwards")
+    parser.add_argument('--mongomock', metavar='SUBMISSIONS_FILE',
+                        help="Run against an in-memory collection seeded from a user_data.txt-style file")
+    parser.add_argument('--mock-copies', type=int, default=10000)
+    args = parser.parse_args()
+
+    db = None
+    if args.mongomock:
+        collection = _mock_collection(args.mongomock, args.mock_copies)
+    else:
+        db = database.get_database()
+        if db is None:
+            sys.exit("❌ Could not connect to MongoDB.")
+        collection = db.predictions
+
+    print(f"Migrating predictions to layout v{doc_schema.SCHEMA_VERSION}{' (dry run)' if args.dry_run else ''}...")
+    start = time.perf_counter()
+    stats = migrate(collection, args.batch_size, args.dry_run)
+    before, after = stats["bytes_before"], stats["bytes_after"]
+    saved = 1 - after / before if before else 0.0
+    print(f"✅ Done in {time.perf_counter() - start:.1f}s: {stats['migrated']:,} documents, "
+          f"{stats['errors']:,} errors; {before:,} -> {after:,} bytes ({saved:.0%} smaller)")
+
+    if args.validator and not args.dry_run and db is not None and database.apply_prediction_validator(db):
+        print("✅ Schema validator applied to 'predictions'.")
+
+
+if __name__ == '__main__':
+    main()
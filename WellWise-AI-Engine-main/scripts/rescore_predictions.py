@@ -0,0 +1,280 @@
+"""
+Offline bulk rescoring of stored predictions.
+
+After a new model version is activated, every document in the `predictions`
+collection still carries the old model's output. This job streams their
+`health_data` with a batched cursor in _id order, re-encodes and rescores
+them in large vectorized chunks across a process pool, and writes the new
+prediction, adjustments, scores and recommendations back with unordered
+bulk writes, in the compact document layout (see doc_schema.py), so documents
+still in the old layout are migrated on the way.
+
+Progress is checkpointed after every chunk that has been written (all chunks
+before it included), so an interrupted run resumes where it stopped. The
+checkpoint also lists the users whose predictions were rescored; once every
+chunk is written, their trend rollups (database.rebuild_user_trends) are
+recomputed so /history/trends shows the new model's numbers. The analytics
+rollups still need `python analytics.py rebuild`.
+
+Usage:
+    python rescore_predictions.py                      # rescore to the active model
+    python rescore_predictions.py --version v16 --workers 4 --chunk-size 5000
+    python rescore_predictions.py --restart            # ignore an existing checkpoint
+    python rescore_predictions.py --mongomock ../user_data.txt --mock-copies 20000
+
+With --mongomock, the run ends by checking that every rescored document still
+has its own submission's age and state, and exits with status 1 otherwise.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+from bson import ObjectId
+from pymongo import UpdateOne
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(script_dir, '..'))
+import database
+import doc_schema
+import features
+import model_registry
+import rules
+
+DEFAULT_CHECKPOINT = os.path.join(script_dir, '..', 'reports', 'rescore_checkpoint.json')
+DEFAULT_CHUNK_SIZE = 2000
+
+# Per-worker model and rules, loaded once by _init_worker.
+_bundle = None
+_ruleset = None
+
+
+def _init_worker(version, model_format):
+    global _bundle, _ruleset
+    manifest = model_registry.read_manifest()
+    _bundle = model_registry.load_bundle(version, manifest['versions'][version], model_format=model_format)
+    _ruleset = rules.RuleSet.load()
+
+
+def rescore_documents(docs, bundle, ruleset):
+    """
+    Rescore a chunk of prediction documents.
+
+    Args:
+        docs (list): Documents with `_id` and `health_data` (or its compact `h`)
+        bundle (ModelBundle): Model version to score with
+        ruleset (rules.RuleSet): Rules that turn raw output into the stored fields
+
+    Returns:
+        tuple: ({_id: fields to $set}, number of documents that could not be scored)
+    """
+    ids, forms, rows = [], [], []
+    errors = 0
+    for doc in docs:
+        form_data = dict(doc_schema.decode_prediction(doc).get('health_data') or {})
+        try:
+            features.normalize_form_data(form_data)
+            rows.append(features.encode_vector(form_data, bundle.encoders, bundle.feature_names))
+        except (ValueError, TypeError):
+            errors += 1
+            continue
+        ids.append(doc['_id'])
+        forms.append(form_data)
+    if not ids:
+        return {}, errors
+
+    raw_predictions = model_registry.predict_matrix(bundle, np.vstack(rows))
+    updates = {}
+    for doc_id, form, response in zip(ids, forms, ruleset.evaluate(forms, raw_predictions)):
+        if response['prediction'] != response['prediction']:
+            errors += 1
+            continue
+        updates[doc_id] = doc_schema.compact_fields(form, response, bundle.version)
+    return updates, errors
+
+
+def _rescore_chunk(docs):
+    return rescore_documents(docs, _bundle, _ruleset)
+
+
+def new_checkpoint(version):
+    return {"version": version, "last_id": None, "scanned": 0, "updated": 0, "errors": 0, "users": []}
+
+
+def read_checkpoint(path, version):
+    """The unfinished checkpoint for `version`, or a fresh one."""
+    if os.path.exists(path):
+        with open(path) as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('version') == version and not checkpoint.get('done'):
+            checkpoint.setdefault('users', [])
+            return checkpoint
+    return new_checkpoint(version)
+
+
+def write_checkpoint(path, checkpoint):
+    checkpoint["updated_at"] = datetime.now().isoformat()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _chunks(cursor, size):
+    chunk = []
+    for doc in cursor:
+        chunk.append(doc)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run(collection, version, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, checkpoint_path=DEFAULT_CHECKPOINT,
+        restart=False, rescore_all=False, model_format='flat'):
+    """
+    Rescore every stale document in `collection` (a pymongo or mongomock
+    collection), then rebuild the trend rollups of the users it rescored.
+
+    Returns:
+        dict: The final checkpoint (scanned/updated/errors counts, rescored users)
+    """
+    checkpoint = new_checkpoint(version) if restart else read_checkpoint(checkpoint_path, version)
+    query = {"$or": [{"health_data": {"$exists": True}}, {"h": {"$exists": True}}]}
+    if not rescore_all:
+        query["model_version"] = {"$ne": version}
+    if checkpoint["last_id"]:
+        query["_id"] = {"$gt": ObjectId(checkpoint["last_id"])}
+        print(f"Resuming after _id {checkpoint['last_id']} ({checkpoint['scanned']} documents already scanned)")
+
+    cursor = collection.find(query, {"v": 1, "h": 1, "health_data": 1, "user_email": 1}).sort("_id", 1).batch_size(chunk_size)
+    workers = workers or os.cpu_count()
+    start = time.perf_counter()
+    scanned_at_start = checkpoint["scanned"]
+    users = set(checkpoint["users"])
+
+    unset = {field: "" for field in doc_schema.LEGACY_FIELDS}
+
+    def finish(chunk, future):
+        updates, errors = future.result()
+        if updates:
+            collection.bulk_write([UpdateOne({"_id": doc_id}, {"$set": fields, "$unset": unset})
+                                   for doc_id, fields in updates.items()], ordered=False)
+        checkpoint["last_id"] = str(chunk[-1]["_id"])
+        checkpoint["scanned"] += len(chunk)
+        checkpoint["updated"] += len(updates)
+        checkpoint["errors"] += errors
+        users.update(doc["user_email"] for doc in chunk if doc["_id"] in updates and doc.get("user_email"))
+        checkpoint["users"] = sorted(users)
+        write_checkpoint(checkpoint_path, checkpoint)
+        elapsed = time.perf_counter() - start
+        rate = (checkpoint["scanned"] - scanned_at_start) / elapsed if elapsed else 0.0
+        print(f"  scanned {checkpoint['scanned']:>9,}  updated {checkpoint['updated']:>9,}  "
+              f"errors {checkpoint['errors']:>6,}  {rate:,.0f} docs/s")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(version, model_format)) as pool:
+        # Results are written back in cursor order so the checkpoint only ever
+        # advances past chunks that are fully stored; a bounded window of
+        # chunks in flight keeps memory flat on large collections.
+        in_flight = deque()
+        for chunk in _chunks(cursor, chunk_size):
+            in_flight.append((chunk, pool.submit(_rescore_chunk, chunk)))
+            if len(in_flight) >= 2 * workers:
+                finish(*in_flight.popleft())
+        while in_flight:
+            finish(*in_flight.popleft())
+
+    print(f"Rebuilding the trend rollups of {len(users):,} users...")
+    for user_email in sorted(users):
+        database.rebuild_user_trends(user_email, collection.database)
+
+    checkpoint["done"] = True
+    write_checkpoint(checkpoint_path, checkpoint)
+    return checkpoint
+
+
+def _mock_collection(submissions_file, copies):
+    """A mongomock collection seeded from a user_data.txt-style JSONL file of submissions."""
+    import mongomock
+
+    with open(submissions_file) as f:
+        forms = [json.loads(line)["data"] for line in f if line.strip()]
+    collection = mongomock.MongoClient()[database.DATABASE_NAME].predictions
+    docs = []
+    for i in range(copies):
+        form_data = forms[i % len(forms)]
+        docs.append({"user_email": form_data.get('email', 'guest@wellwise.com'), "timestamp": datetime.now(),
+                     "model_version": "v1", "health_data": form_data})
+    collection.insert_many(docs)
+    return collection
+
+
+def check_own_fields(collection, seeded):
+    """
+    Find rescored documents whose age or state is not their own submission's.
+
+    Args:
+        collection: The rescored collection
+        seeded (dict): {_id: (Age, State)} of the submissions as seeded
+
+    Returns:
+        list: _ids of the mismatched documents
+    """
+    mismatched = []
+    for doc in collection.find({"_id": {"$in": list(seeded)}, "v": {"$exists": True}}, {"age": 1, "state": 1}):
+        age, state = seeded[doc["_id"]]
+        if doc.get("state") != state or float(doc.get("age")) != float(age):
+            mismatched.append(doc["_id"])
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rescore stored predictions with a model version.")
+    parser.add_argument('--version', help="Model version to score with (default: the active version)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--format', default='flat', choices=['pickle', 'native', 'flat'], help="Model artifact format")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT)
+    parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint")
+    parser.add_argument('--all', action='store_true', help="Also rescore documents already on this version")
+    parser.add_argument('--mongomock', metavar='SUBMISSIONS_FILE',
+                        help="Run against an in-memory collection seeded from a user_data.txt-style file")
+    parser.add_argument('--mock-copies', type=int, default=10000)
+    args = parser.parse_args()
+
+    version = args.version or model_registry.read_manifest()['active']
+    if args.mongomock:
+        collection = _mock_collection(args.mongomock, args.mock_copies)
+        seeded = {doc["_id"]: (doc["health_data"].get("Age"), doc["health_data"].get("State"))
+                  for doc in collection.find({}, {"health_data": 1})}
+    else:
+        db = database.get_database()
+        if db is None:
+            sys.exit("❌ Could not connect to MongoDB.")
+        collection = db.predictions
+
+    print(f"Rescoring predictions with model {version} ({args.format})...")
+    start = time.perf_counter()
+    checkpoint = run(collection, version, workers=args.workers, chunk_size=args.chunk_size,
+                     checkpoint_path=args.checkpoint, restart=args.restart, rescore_all=args.all,
+                     model_format=args.format)
+    print(f"✅ Done in {time.perf_counter() - start:.1f}s: {checkpoint['scanned']:,} scanned, "
+          f"{checkpoint['updated']:,} updated, {checkpoint['errors']:,} could not be scored, "
+          f"trends rebuilt for {len(checkpoint['users']):,} users.")
+    if args.mongomock:
+        # Each document of a chunk must be rewritten from its own submission.
+        mismatched = check_own_fields(collection, seeded)
+        if mismatched:
+            sys.exit(f"❌ {len(mismatched):,} documents were stored with another document's age or state.")
+        print("✅ Every rescored document kept its own age and state.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""
+Training harness for the life expectancy model.
+
+Runs k-fold cross-validation over a hyperparameter search space in a process
+pool and reports RMSE, serving latency and model size for every candidate, so
+we can pick a model that is both accurate and cheap to serve.
+
+Each worker process gets a fixed LightGBM thread budget (workers x threads never
+exceeds the number of cores), so the pool does not oversubscribe the CPU.
+
+Usage:
+    python train_harness.py
+    python train_harness.py --folds 5 --workers 4 --sample 20000
+    python train_harness.py --grid my_grid.json --search random --n-iter 12
+    python train_harness.py --save-version v16 --max-latency-us 300
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+import lightgbm as lgb
+from sklearn.model_selection import KFold
+
+from new_model_train import DEFAULT_CSV_PATH, load_dataset, prepare_features, save_artifacts
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(script_dir, '..'))
+import model_registry
+
+REPORTS_DIR = os.path.join(script_dir, '..', 'reports')
+
+# Search space used when no --grid file is given. A grid file is a JSON object
+# with the same shape: {"param_name": [value, value, ...]}.
+DEFAULT_GRID = {
+    'num_leaves': [15, 31, 63],
+    'learning_rate': [0.05, 0.1],
+    'min_child_samples': [20, 50],
+    'max_depth': [-1, 8],
+}
+
+LATENCY_SAMPLES = 200
+
+# Per-worker state, populated once by _init_worker so the training matrix is
+# shipped to each process a single time instead of with every task.
+_X = None
+_y = None
+_folds = None
+_num_threads = 1
+
+
+def _init_worker(X, y, folds, num_threads):
+    global _X, _y, _folds, _num_threads
+    _X, _y, _folds, _num_threads = X, y, folds, num_threads
+
+
+def build_candidates(grid, search='grid', n_iter=10, seed=42):
+    """Expand a search space into a list of parameter dicts."""
+    keys = sorted(grid)
+    combos = [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+    if search == 'random' and n_iter < len(combos):
+        combos = random.Random(seed).sample(combos, n_iter)
+    return combos
+
+
+def _rmse(y_true, y_pred):
+    return float(np.sqrt(np.mean((y_true - y_pred) ** 2)))
+
+
+def _measure_latency(booster, X_sample, num_iteration):
+    """Median single-row and amortised batch latency in microseconds, on one thread."""
+    rows = X_sample[:LATENCY_SAMPLES]
+    timings = []
+    for i in range(len(rows)):
+        start = time.perf_counter()
+        booster.predict(rows[i:i + 1], num_iteration=num_iteration, num_threads=1)
+        timings.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    booster.predict(X_sample, num_iteration=num_iteration, num_threads=1)
+    batch_per_row = (time.perf_counter() - start) / len(X_sample)
+    return float(np.median(timings) * 1e6), float(batch_per_row * 1e6)
+
+
+def evaluate_candidate(params, early_stopping_rounds, max_estimators):
+    """
+    Cross-validate one parameter set inside a worker process.
+
+    Early stopping uses a slice of each training fold, so the held-out fold
+    stays untouched for the RMSE estimate.
+    """
+    fold_rmse, best_iterations = [], []
+    fit_seconds = 0.0
+    model = None
+    val_idx = None
+
+    for fold_no, (train_idx, val_idx) in enumerate(_folds):
+        rng = np.random.default_rng(fold_no)
+        train_idx = rng.permutation(train_idx)
+        n_es = max(1, len(train_idx) // 10)
+        es_idx, fit_idx = train_idx[:n_es], train_idx[n_es:]
+
+        model = lgb.LGBMRegressor(
+            objective='regression', metric='rmse', random_state=42,
+            n_estimators=max_estimators, n_jobs=_num_threads, verbose=-1, **params
+        )
+        start = time.perf_counter()
+        model.fit(
+            _X[fit_idx], _y[fit_idx],
+            eval_set=[(_X[es_idx], _y[es_idx])],
+            callbacks=[lgb.early_stopping(early_stopping_rounds, verbose=False)]
+        )
+        fit_seconds += time.perf_counter() - start
+
+        best_iteration = model.best_iteration_ or max_estimators
+        best_iterations.append(best_iteration)
+        preds = model.predict(_X[val_idx], num_iteration=best_iteration)
+        fold_rmse.append(_rmse(_y[val_idx], preds))
+
+    booster = model.booster_
+    num_iteration = best_iterations[-1]
+    single_us, batch_us = _measure_latency(booster, _X[val_idx], num_iteration)
+    model_bytes = len(booster.model_to_string(num_iteration=num_iteration).encode('utf-8'))
+
+    return {
+        'params': params,
+        'rmse_mean': float(np.mean(fold_rmse)),
+        'rmse_std': float(np.std(fold_rmse)),
+        'best_iteration': int(round(np.mean(best_iterations))),
+        'fit_seconds': round(fit_seconds, 3),
+        'latency_single_us': round(single_us, 1),
+        'latency_batch_us_per_row': round(batch_us, 2),
+        'model_kb': round(model_bytes / 1024, 1),
+    }
+
+
+def mark_pareto(results):
+    """Flag candidates that no other candidate beats on RMSE, latency and size at once."""
+    axes = ('rmse_mean', 'latency_single_us', 'model_kb')
+    for r in results:
+        r['pareto'] = not any(
+            all(o[a] <= r[a] for a in axes) and any(o[a] < r[a] for a in axes)
+            for o in results if o is not r
+        )
+    return results
+
+
+def select_best(results, max_latency_us=None, max_model_kb=None):
+    """Lowest-RMSE candidate that satisfies the optional serving budgets."""
+    eligible = [
+        r for r in results
+        if (max_latency_us is None or r['latency_single_us'] <= max_latency_us)
+        and (max_model_kb is None or r['model_kb'] <= max_model_kb)
+    ]
+    return min(eligible, key=lambda r: r['rmse_mean']) if eligible else None
+
+
+def write_reports(results, meta, output_dir=REPORTS_DIR):
+    os.makedirs(output_dir, exist_ok=True)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    json_path = os.path.join(output_dir, f'train_harness_{stamp}.json')
+    csv_path = os.path.join(output_dir, f'train_harness_{stamp}.csv')
+
+    with open(json_path, 'w') as f:
+        json.dump({'meta': meta, 'results': results}, f, indent=2)
+
+    param_keys = sorted({k for r in results for k in r['params']})
+    metric_keys = [k for k in results[0] if k != 'params'] if results else []
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(param_keys + metric_keys)
+        for r in results:
+            writer.writerow([r['params'].get(k) for k in param_keys] + [r[k] for k in metric_keys])
+    return json_path, csv_path
+
+
+def print_table(results, limit=10):
+    print(f"\n{'RMSE':>8} {'±':>6} {'iters':>6} {'1-row µs':>9} {'batch µs':>9} {'KB':>8}  pareto  params")
+    for r in results[:limit]:
+        print(f"{r['rmse_mean']:8.4f} {r['rmse_std']:6.4f} {r['best_iteration']:6d} "
+              f"{r['latency_single_us']:9.1f} {r['latency_batch_us_per_row']:9.2f} {r['model_kb']:8.1f}  "
+              f"{'  *   ' if r['pareto'] else '      '}  {r['params']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-validated hyperparameter search for the LE model.")
+    parser.add_argument('--data', default=DEFAULT_CSV_PATH, help="Path to the generated dataset CSV")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--grid', help="JSON file with the search space")
+    parser.add_argument('--search', choices=['grid', 'random'], default='grid')
+    parser.add_argument('--n-iter', type=int, default=10, help="Candidates to sample for --search random")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: one per core)")
+    parser.add_argument('--threads-per-worker', type=int, default=None,
+                        help="LightGBM threads per worker (default: cores // workers)")
+    parser.add_argument('--max-estimators', type=int, default=2000)
+    parser.add_argument('--early-stopping-rounds', type=int, default=50)
+    parser.add_argument('--sample', type=int, default=None, help="Train on a random subset of N rows")
+    parser.add_argument('--max-latency-us', type=float, default=None, help="Serving budget for model selection")
+    parser.add_argument('--max-model-kb', type=float, default=None, help="Size budget for model selection")
+    parser.add_argument('--save-version', help="Retrain the selected candidate on all data and save it, e.g. v16")
+    args = parser.parse_args()
+
+    # --- 1. Load and Prepare the Dataset ---
+    print("Loading dataset...")
+    df = load_dataset(args.data)
+    if df is None:
+        exit()
+    if args.sample and args.sample < len(df):
+        df = df.sample(n=args.sample, random_state=42)
+    X_df, y_series, encoder_dict = prepare_features(df)
+    X = X_df.to_numpy(dtype=np.float64)
+    y = y_series.to_numpy(dtype=np.float64)
+    folds = list(KFold(n_splits=args.folds, shuffle=True, random_state=42).split(X))
+    print(f"Loaded {len(X)} rows with {X.shape[1]} features.")
+
+    # --- 2. Build the Search Space and Size the Pool ---
+    grid = DEFAULT_GRID
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+    candidates = build_candidates(grid, args.search, args.n_iter)
+
+    cores = os.cpu_count() or 1
+    workers = max(1, min(args.workers or cores, len(candidates), cores))
+    threads = args.threads_per_worker or max(1, cores // workers)
+    print(f"Evaluating {len(candidates)} candidates x {args.folds} folds "
+          f"on {workers} workers x {threads} LightGBM threads ({cores} cores).")
+
+    # --- 3. Evaluate Candidates in Parallel ---
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(X, y, folds, threads)) as pool:
+        futures = {
+            pool.submit(evaluate_candidate, params, args.early_stopping_rounds, args.max_estimators): params
+            for params in candidates
+        }
+        for i, future in enumerate(as_completed(futures), 1):
+            result = future.result()
+            results.append(result)
+            print(f"  [{i}/{len(candidates)}] RMSE {result['rmse_mean']:.4f}  {result['params']}")
+    elapsed = time.perf_counter() - start
+
+    # --- 4. Report ---
+    results.sort(key=lambda r: r['rmse_mean'])
+    mark_pareto(results)
+    meta = {
+        'data': os.path.abspath(args.data), 'rows': len(X), 'folds': args.folds,
+        'search': args.search, 'workers': workers, 'threads_per_worker': threads,
+        'early_stopping_rounds': args.early_stopping_rounds, 'elapsed_seconds': round(elapsed, 1),
+    }
+    print_table(results)
+    json_path, csv_path = write_reports(results, meta)
+    print(f"\nSearch finished in {elapsed:.1f}s. Reports written to '{json_path}' and '{csv_path}'.")
+
+    # --- 5. Optionally Retrain and Save the Selected Candidate ---
+    best = select_best(results, args.max_latency_us, args.max_model_kb)
+    if best is None:
+        print("❌ No candidate satisfies the latency/size budget.")
+        return
+    print(f"Selected: RMSE {best['rmse_mean']:.4f}, {best['latency_single_us']:.1f}µs/row, "
+          f"{best['model_kb']:.1f}KB  {best['params']}")
+
+    if args.save_version:
+        model = lgb.LGBMRegressor(
+            objective='regression', metric='rmse', random_state=42,
+            n_estimators=max(1, best['best_iteration']), n_jobs=cores, verbose=-1, **best['params']
+        )
+        model.fit(X_df, y_series)
+        model_path, encoders_path = save_artifacts(model, encoder_dict, args.save_version)
+        model_registry.register_version(
+            args.save_version, os.path.basename(model_path), os.path.basename(encoders_path),
+            list(X_df.columns), notes=f"train_harness: CV RMSE {best['rmse_mean']:.4f}, {best['params']}"
+        )
+        print(f"✅ Saved and registered {args.save_version} ('{model_path}', '{encoders_path}').")
+        print(f"   Shadow it with: python model_registry.py shadow {args.save_version} --rate 0.05")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+"""
+SQLite implementation of storage.Storage.
+
+The database runs in WAL mode, so readers never block the writer, with
+synchronous=NORMAL (durable at checkpoints, never corrupt). sqlite3
+connections can't be shared between threads, so every thread gets its own,
+opened on first use; statements are fixed SQL with ? parameters, which each
+connection compiles once and keeps in its statement cache. save_predictions()
+inserts a whole batch in one transaction with executemany().
+
+Predictions are stored in the compact layout of doc_schema.py: the queried
+fields as columns, the rest as JSON.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime
+
+import database
+import doc_schema
+from storage import Storage
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    name TEXT,
+    password_hash TEXT,
+    created_at TEXT NOT NULL,
+    last_login TEXT
+);
+CREATE TABLE IF NOT EXISTS predictions (
+    id INTEGER PRIMARY KEY,
+    user_email TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    v INTEGER NOT NULL,
+    age REAL,
+    state TEXT,
+    prediction REAL,
+    model_version TEXT,
+    health_scores TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS predictions_user_history ON predictions (user_email, timestamp DESC, id DESC);
+"""
+
+INSERT_PREDICTION = """
+INSERT INTO predictions (user_email, timestamp, v, age, state, prediction, model_version, health_scores, body)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+HISTORY_COLUMNS = "SELECT id, timestamp, prediction, age, state, health_scores FROM predictions "
+HISTORY_FIRST_PAGE = HISTORY_COLUMNS + """
+WHERE user_email = ? ORDER BY timestamp DESC, id DESC LIMIT ?
+"""
+HISTORY_NEXT_PAGE = HISTORY_COLUMNS + """
+WHERE user_email = ? AND (timestamp < ? OR (timestamp = ? AND id < ?))
+ORDER BY timestamp DESC, id DESC LIMIT ?
+"""
+USER_PREDICTIONS = """
+SELECT timestamp, prediction, health_scores FROM predictions WHERE user_email = ? ORDER BY timestamp, id
+"""
+INSERT_USER = "INSERT INTO users (email, name, password_hash, created_at, last_login) VALUES (?, ?, ?, ?, NULL)"
+SELECT_USER = "SELECT id, email, name, password_hash, created_at, last_login FROM users WHERE email = ?"
+UPDATE_LAST_LOGIN = "UPDATE users SET last_login = ? WHERE email = ?"
+
+
+def _timestamp(value):
+    # Fixed width, so text order is time order.
+    return value.isoformat(timespec='microseconds')
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+class SQLiteStorage(Storage):
+    """Users and predictions in one SQLite file."""
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._initialized = False
+
+    def _open(self):
+        """This thread's connection, opened on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, cached_statements=64)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _connection(self):
+        if not self._initialized:
+            self.init()
+        return self._open()
+
+    def init(self):
+        with self._init_lock:
+            if self._initialized:
+                return True
+            conn = self._open()
+            columns = [row['name'] for row in conn.execute("PRAGMA table_info(predictions)")]
+            if columns and 'body' not in columns:
+                # A table from an older layout: keep its rows out of the way rather than drop them.
+                legacy = self._free_table_name(conn, 'predictions_legacy')
+                # The index would move with the table and then stop SCHEMA creating it.
+                conn.execute("DROP INDEX IF EXISTS predictions_user_history")
+                conn.execute(f"ALTER TABLE predictions RENAME TO {legacy}")
+                print(f"⚠️ Moved the old-layout predictions table to '{legacy}'.")
+            conn.executescript(SCHEMA)
+            conn.commit()
+            self._initialized = True
+        return True
+
+    @staticmethod
+    def _free_table_name(conn, name):
+        """`name`, or `name` with a timestamp suffix if a table by that name exists (e.g. from an earlier upgrade)."""
+        taken = {row['name'] for row in conn.execute("SELECT name FROM sqlite_master")}
+        if name not in taken:
+            return name
+        base = f"{name}_{datetime.now():%Y%m%d%H%M%S}"
+        candidate, n = base, 1
+        while candidate in taken:
+            n += 1
+            candidate = f"{base}_{n}"
+        return candidate
+
+    def _prediction_row(self, user_email, timestamp, form_data, prediction_data):
+        doc = doc_schema.encode_prediction(user_email, timestamp, form_data, prediction_data)
+        body = {key: doc[key] for key in ('h', 'r', 'a')}
+        return (user_email, _timestamp(timestamp), doc['v'], doc['age'], doc['state'], doc['prediction'],
+                doc['model_version'], json.dumps(doc['health_scores']), json.dumps(body))
+
+    def save_prediction(self, user_email, form_data, prediction_data):
+        try:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute(INSERT_PREDICTION, self._prediction_row(user_email, datetime.now(),
+                                                                              form_data, prediction_data))
+            return {"status": "success", "id": str(cursor.lastrowid)}
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            return {"status": "error", "message": str(e)}
+
+    def save_predictions(self, records):
+        try:
+            rows = [self._prediction_row(*record) for record in records]
+            conn = self._connection()
+            with conn:
+                conn.executemany(INSERT_PREDICTION, rows)
+            return {"status": "success", "count": len(rows)}
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            return {"status": "error", "message": str(e)}
+
+    def get_user_predictions_page(self, user_email, limit=10, cursor=None):
+        limit = max(1, min(limit, database.MAX_HISTORY_PAGE_SIZE))
+        conn = self._connection()
+        # One extra row tells us whether there is a next page.
+        if cursor:
+            timestamp, prediction_id = self.decode_cursor(cursor)
+            rows = conn.execute(HISTORY_NEXT_PAGE, (user_email, timestamp, timestamp, prediction_id, limit + 1)).fetchall()
+        else:
+            rows = conn.execute(HISTORY_FIRST_PAGE, (user_email, limit + 1)).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = f"{rows[-1]['timestamp']}_{rows[-1]['id']}"
+        age = lambda value: int(value) if isinstance(value, float) and value.is_integer() else value
+        return [{
+            "id": str(row['id']),
+            "timestamp": row['timestamp'],
+            "prediction": row['prediction'],
+            "current_age": age(row['age']),
+            "state": row['state'],
+            "health_scores": json.loads(row['health_scores']),
+        } for row in rows], next_cursor
+
+    @staticmethod
+    def decode_cursor(cursor):
+        timestamp, _, prediction_id = cursor.rpartition('_')
+        try:
+            datetime.fromisoformat(timestamp)
+            return timestamp, int(prediction_id)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"Invalid history cursor: {cursor!r}") from e
+
+    def get_user_trends(self, user_email, bucket='day', since=None):
+        if bucket not in database.TREND_BUCKETS:
+            raise ValueError(f"bucket must be one of {database.TREND_BUCKETS}.")
+        if since:
+            datetime.strptime(since, "%Y-%m-%d")
+
+        # A user's history is small and read through the (user_email, timestamp) index,
+        # so the per-day rollup is computed on read instead of being maintained.
+        rollup = {"count": 0, "prediction_sum": 0.0, "days": {}}
+        for row in self._connection().execute(USER_PREDICTIONS, (user_email,)):
+            day = rollup["days"].setdefault(row['timestamp'][:10], {"count": 0, "prediction_sum": 0.0, "scores": {}})
+            prediction = row['prediction'] or 0.0
+            day["count"] += 1
+            day["prediction_sum"] += prediction
+            for name, score in json.loads(row['health_scores']).items():
+                day["scores"][name] = day["scores"].get(name, 0) + score
+            rollup["count"] += 1
+            rollup["prediction_sum"] += prediction
+            rollup.setdefault("first_at", _parse_time(row['timestamp']))
+            rollup["last_at"] = _parse_time(row['timestamp'])
+            rollup["latest_prediction"] = row['prediction']
+        if not rollup["count"]:
+            return None
+        return database.summarize_trends(rollup, bucket, since)
+
+    def save_user(self, email, name, password_hash):
+        try:
+            conn = self._connection()
+            with conn:
+                cursor = conn.execute(INSERT_USER, (email, name, password_hash, _timestamp(datetime.now())))
+            return {"status": "success", "id": str(cursor.lastrowid)}
+        except sqlite3.IntegrityError:
+            return {"status": "error", "message": "Email already exists"}
+        except sqlite3.Error as e:
+            return {"status": "error", "message": str(e)}
+
+    def get_user_by_email(self, email):
+        try:
+            row = self._connection().execute(SELECT_USER, (email,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"Error getting user: {e}")
+            return None
+        if row is None:
+            return None
+        user = dict(row)
+        user["_id"] = str(user.pop("id"))
+        user["created_at"] = _parse_time(user["created_at"])
+        user["last_login"] = _parse_time(user["last_login"])
+        return user
+
+    def update_last_login(self, email):
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(UPDATE_LAST_LOGIN, (_timestamp(datetime.now()), email))
+        except sqlite3.Error as e:
+            print(f"Error updating last login: {e}")
@@ -0,0 +1,57 @@
+"""
+Startup mode and startup-time breakdown for the engine.
+
+Set WELLWISE_FAST_STARTUP=1 to defer heavy imports (pandas, numpy, joblib),
+model loading and the MongoDB connection until first use, and to load models
+from LightGBM's native text format when it has been exported
+(`python model_registry.py export v15`).
+"""
+import importlib
+import importlib.util
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+FAST_STARTUP = os.getenv("WELLWISE_FAST_STARTUP", "0") == "1"
+
+# Phase name -> milliseconds. Deferred phases are recorded when they first run.
+TIMINGS = {}
+
+
+def lazy_import(name):
+    """Import `name`, deferring the actual module execution until first attribute access in fast mode."""
+    if name in sys.modules:
+        # Return the entry as-is: import_module() would touch a lazy module and load it.
+        return sys.modules[name]
+    if not FAST_STARTUP:
+        return importlib.import_module(name)
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def record(phase, seconds):
+    TIMINGS[phase] = round(TIMINGS.get(phase, 0.0) + seconds * 1000, 1)
+
+
+@contextmanager
+def timed(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, time.perf_counter() - start)
+
+
+def report():
+    return {"fast_startup": FAST_STARTUP, "phases_ms": dict(TIMINGS)}
+
+
+def format_report():
+    phases = ", ".join(f"{phase} {ms:.0f}ms" for phase, ms in TIMINGS.items())
+    return f" Startup ({'fast' if FAST_STARTUP else 'eager'} mode): {phases}"
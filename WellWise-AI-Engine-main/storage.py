@@ -0,0 +1,115 @@
+"""
+Storage of users and predictions behind one interface.
+
+The APIs only need a handful of operations (save and page through
+predictions, trends, users and logins), so they talk to a Storage rather than
+to pymongo. WELLWISE_STORAGE picks the implementation:
+
+    mongo   (default) MongoDB via database.py; required for analytics,
+            retention, rescoring and the admin viewer, which use
+            aggregation pipelines directly
+    sqlite  a local WAL-mode SQLite file (sqlite_storage.py) at
+            WELLWISE_SQLITE_PATH, for tests and small single-host deployments
+
+Both store predictions in the compact layout of doc_schema.py and return the
+same shapes, so callers don't know which one they got.
+"""
+import os
+import threading
+
+import database
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+STORAGE_BACKEND = os.getenv("WELLWISE_STORAGE", "mongo")
+SQLITE_PATH = os.getenv("WELLWISE_SQLITE_PATH", os.path.join(script_dir, 'health_predictions.db'))
+BACKENDS = ['mongo', 'sqlite']
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+class Storage:
+    """What the APIs need from a database; see MongoStorage for the reference behaviour."""
+
+    name = None
+
+    def init(self):
+        """Create tables/collections and indexes; returns False if the store is unreachable."""
+        raise NotImplementedError
+
+    def save_prediction(self, user_email, form_data, prediction_data):
+        raise NotImplementedError
+
+    def save_predictions(self, records):
+        """Bulk save of (user_email, timestamp, form_data, prediction_data) tuples."""
+        raise NotImplementedError
+
+    def get_user_predictions_page(self, user_email, limit=10, cursor=None):
+        raise NotImplementedError
+
+    def get_user_predictions(self, user_email, limit=10):
+        return self.get_user_predictions_page(user_email, limit)[0]
+
+    def get_user_trends(self, user_email, bucket='day', since=None):
+        raise NotImplementedError
+
+    def save_user(self, email, name, password_hash):
+        raise NotImplementedError
+
+    def get_user_by_email(self, email):
+        raise NotImplementedError
+
+    def update_last_login(self, email):
+        raise NotImplementedError
+
+
+class MongoStorage(Storage):
+    """MongoDB, through the functions in database.py."""
+
+    name = 'mongo'
+
+    def init(self):
+        return database.init_database()
+
+    def save_prediction(self, user_email, form_data, prediction_data):
+        return database.save_prediction(user_email, form_data, prediction_data)
+
+    def save_predictions(self, records):
+        return database.save_predictions(records)
+
+    def get_user_predictions_page(self, user_email, limit=10, cursor=None):
+        return database.get_user_predictions_page(user_email, limit, cursor)
+
+    def get_user_trends(self, user_email, bucket='day', since=None):
+        return database.get_user_trends(user_email, bucket, since)
+
+    def save_user(self, email, name, password_hash):
+        return database.save_user(email, name, password_hash)
+
+    def get_user_by_email(self, email):
+        return database.get_user_by_email(email)
+
+    def update_last_login(self, email):
+        return database.update_last_login(email)
+
+
+def create_storage(backend=None, sqlite_path=None):
+    """A new Storage for `backend` (default: WELLWISE_STORAGE)."""
+    backend = backend or STORAGE_BACKEND
+    if backend == 'mongo':
+        return MongoStorage()
+    if backend == 'sqlite':
+        import sqlite_storage
+
+        return sqlite_storage.SQLiteStorage(sqlite_path or SQLITE_PATH)
+    raise ValueError(f"Unknown storage backend {backend!r}; choose from {BACKENDS}.")
+
+
+def get_storage():
+    """The process-wide Storage configured by WELLWISE_STORAGE."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
@@ -0,0 +1,95 @@
+"""
+Counterfactual lifestyle scenarios for the /predict/whatif endpoint.
+
+Each scenario is a set of form changes that applies when the profile has
+room to improve on it (a non-smoker gets no "quit smoking" scenario). The
+changes follow the value domains of scripts/generate_data.py, so the
+variants stay inside the distribution the model was trained on.
+"""
+
+SMOKING_HABITS = ['Daily', 'Occasionally']
+HEALTHY_SLEEP_RANGE = (7.0, 9.0)
+
+
+def _is_missing(value):
+    return value is None or value == 'None' or (isinstance(value, float) and value != value)
+
+
+def _quit_smoking(form_data):
+    if form_data.get('Smoking') in SMOKING_HABITS:
+        return {'Smoking': 'Never'}
+
+
+def _improve_diet(form_data):
+    if form_data.get('Diet Quality') != 'High':
+        # The combination generate_data.calculate_diet_quality rates 'High'.
+        return {'Diet Quality': 'High', 'Protein Intake': 'High', 'Junk Food Frequency': 'Never', 'Sugar Intake': 'Low'}
+
+
+def _add_exercise(form_data):
+    if _is_missing(form_data.get('Exercise Type')):
+        return {'Exercise Type': 'Walking'}
+
+
+def _fix_sleep(form_data):
+    low, high = HEALTHY_SLEEP_RANGE
+    duration = form_data.get('Sleep Duration')
+    if form_data.get('Sleep Quality') != 'Good' or duration is None or not low <= duration <= high:
+        fixed = 8.0 if duration is None else min(max(duration, low), high)
+        return {'Sleep Duration': fixed, 'Sleep Quality': 'Good'}
+
+
+# (id, title, change builder)
+SCENARIOS = [
+    ('quit_smoking', 'Quit smoking', _quit_smoking),
+    ('improve_diet', 'Improve diet quality', _improve_diet),
+    ('add_exercise', 'Add regular exercise', _add_exercise),
+    ('fix_sleep', 'Sleep 7-9 hours with good quality', _fix_sleep),
+]
+ALL_CHANGES_ID = 'all_changes'
+
+
+def check_scenario_ids(scenario_ids):
+    """
+    Validate the `scenarios` of a /predict/whatif request.
+
+    Args:
+        scenario_ids: The request's value, None when it has none
+
+    Raises:
+        ValueError: If it is not a list of ids from SCENARIOS
+    """
+    if scenario_ids is None:
+        return
+    if not isinstance(scenario_ids, list) or not all(isinstance(i, str) for i in scenario_ids):
+        raise ValueError("'scenarios' must be a list of scenario ids.")
+    known = [scenario_id for scenario_id, _, _ in SCENARIOS]
+    unknown = [i for i in scenario_ids if i not in known]
+    if unknown:
+        raise ValueError(f"Unknown scenarios {unknown}; expected some of {known}.")
+
+
+def build_variants(form_data, scenario_ids=None):
+    """
+    Counterfactual variants of a (normalized) form submission.
+
+    Args:
+        form_data (dict): Health form data
+        scenario_ids (list, optional): Restrict to these scenario ids
+
+    Returns:
+        list: (id, title, changes, variant_form_data) for every scenario that
+            applies, plus an 'all_changes' variant when more than one does
+    """
+    variants = []
+    combined = {}
+    for scenario_id, title, build_changes in SCENARIOS:
+        if scenario_ids and scenario_id not in scenario_ids:
+            continue
+        changes = build_changes(form_data)
+        if changes:
+            variants.append((scenario_id, title, changes, dict(form_data, **changes)))
+            combined.update(changes)
+    if len(variants) > 1:
+        variants.append((ALL_CHANGES_ID, 'All of the above', combined, dict(form_data, **combined)))
+    return variants
@@ -1,12 +1,19 @@
 # --- Imports ---
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import os
-import json
+import sys
+import inspect
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import google.generativeai as genai
+import tracing
 import email_utils
+import plan_schema
+from dish_catalog import DishCatalog
+from exercise_cache import ExercisePlanCache, canonical_key
+from llm_json import LLMJSONError, extract_json
 
 # Load environment variables
 load_dotenv()
@@ -17,6 +24,43 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'super-secret-key')
 
 # Enable CORS so frontend can call backend
 CORS(app)
+tracing.init_app(app)
+
+GEMINI_MODEL = 'gemini-2.5-flash'
+# Short prompts that give Gemini the plan's response schema, rather than a
+# worked JSON example per meal; set to 0 for the example prompts.
+GEMINI_STRUCTURED_OUTPUT = os.getenv("GEMINI_STRUCTURED_OUTPUT", "1") == "1"
+# Ask for each meal of a diet plan in its own Gemini call, all at once, so the
+# plan takes as long as its slowest meal rather than the whole day's output.
+GEMINI_PARALLEL_MEALS = os.getenv("GEMINI_PARALLEL_MEALS", "0") == "1"
+GEMINI_MEAL_WORKERS = int(os.getenv("GEMINI_MEAL_WORKERS", 16))
+# Serve meals from the local dish catalog when it has enough dishes near the
+# meal's calorie budget, ask Gemini only for the rest and add its dishes to the
+# catalog. Off by default: the catalog writes dish_catalog.json.
+DISH_CATALOG = os.getenv("DISH_CATALOG", "0") == "1"
+# Regenerate the most requested exercise plans in the background before they
+# expire. Off by default: every process that serves requests prewarms, and
+# each round costs up to EXERCISE_PREWARM_TOP Gemini calls.
+EXERCISE_PREWARM = os.getenv("EXERCISE_PREWARM", "0") == "1"
+# google-generativeai >= 0.7 takes the schema natively; older SDKs get it described in the prompt.
+GEMINI_RESPONSE_SCHEMA = 'response_schema' in inspect.signature(genai.GenerationConfig).parameters
+GEMINI_TOKENS_METRIC = "wellwise_gemini_tokens_total"
+GEMINI_JSON_ERRORS_METRIC = "wellwise_gemini_json_errors_total"
+GEMINI_JSON_REPAIRS_METRIC = "wellwise_gemini_json_repairs_total"
+GEMINI_RETRIES_METRIC = "wellwise_gemini_section_retries_total"
+tracing.METRIC_HELP.update({
+    GEMINI_TOKENS_METRIC: "Tokens billed for Gemini calls, by model and kind (prompt or candidates).",
+    GEMINI_JSON_ERRORS_METRIC: "Gemini responses no JSON object could be recovered from.",
+    GEMINI_JSON_REPAIRS_METRIC: "Gemini responses whose JSON needed trailing commas dropped or truncation closed.",
+    GEMINI_RETRIES_METRIC: "Follow-up Gemini calls for plan sections that were missing or unusable, by plan.",
+})
+
+# Shared by all requests, so it also caps the Gemini calls in flight.
+meal_pool = ThreadPoolExecutor(max_workers=GEMINI_MEAL_WORKERS, thread_name_prefix='gemini-meal')
+
+dish_catalog = DishCatalog() if DISH_CATALOG else None
+
+exercise_plans = ExercisePlanCache()
 
 # Configure Gemini API
 try:
@@ -64,14 +108,10 @@ def calculate_calories(weight, height, age, gender, activity_level):
 
     return calories, projections
 
-def create_diet_prompt(user_inputs, calories):
-    meal_names = ["Breakfast", "Lunch", "Dinner"]
-    meals_per_day = user_inputs['mealsPerDay']
-    if meals_per_day == 4:
-        meal_names.insert(2, "Afternoon Snack")
-    elif meals_per_day >= 5:
-        meal_names.insert(1, "Morning Snack")
-        meal_names.insert(3, "Afternoon Snack")
+def create_diet_prompt(user_inputs, calories, meal_names=None):
+    """Prompt for the day's meal plan, or for just `meal_names` of it when re-requesting failed meals."""
+    all_meals = plan_schema.meal_names(user_inputs['mealsPerDay'])
+    meal_names = meal_names or all_meals
 
     meal_options_prompt = ""
     for meal_name in meal_names:
@@ -87,8 +127,13 @@ def create_diet_prompt(user_inputs, calories):
         """
     meal_options_prompt = meal_options_prompt.rstrip(',')
 
+    subset = ""
+    if meal_names != all_meals:
+        subset = (f"\n    This day has {len(all_meals)} meals ({', '.join(all_meals)}); provide ONLY {', '.join(meal_names)}."
+                  f"\n    {meal_budget_text(all_meals, meal_names, calories)}")
+
     prompt = f"""
-    You are an AI that creates Indian diet plans. Total calories: {calories['weightLoss']} kcal.
+    You are an AI that creates Indian diet plans. Total calories: {calories['weightLoss']} kcal.{subset}
     For each meal, provide 3 diverse, authentic Indian dish options with REAL names and descriptions.
     Make the descriptions appetizing and specific to the dish.
     DO NOT include imageUrl field - we'll use text descriptions only.
@@ -96,18 +141,199 @@ def create_diet_prompt(user_inputs, calories):
     """
     return prompt
 
-def make_gemini_call(prompt):
+def meal_budget_text(all_meals, meal_names, calories):
+    """Prompt line giving each of `meal_names` its share of the day's calories, for prompts asking for part of a day."""
+    budgets = plan_schema.meal_budgets(all_meals, calories['weightLoss'])
+    return "Calories per dish: " + ", ".join(f"{name} about {budgets[name]} kcal" for name in meal_names) + "."
+
+def create_structured_diet_prompt(user_inputs, calories, meal_names=None):
+    """Compact prompt and response schema for the day's meal plan, or for just `meal_names` of it."""
+    all_meals = plan_schema.meal_names(user_inputs['mealsPerDay'])
+    meal_names = meal_names or all_meals
+    schema = plan_schema.meal_plan_schema(meal_names)
+
+    subset = ""
+    if meal_names != all_meals:
+        subset = (f" The day has {len(all_meals)} meals; provide only these."
+                  f"\n{meal_budget_text(all_meals, meal_names, calories)}")
+    prompt = f"""You are an AI that creates Indian diet plans. Total calories: {calories['weightLoss']} kcal.
+Meals: {', '.join(meal_names)}.{subset}
+For each meal, give {plan_schema.MEAL_OPTIONS} diverse, authentic Indian dishes with real names and appetizing, dish-specific descriptions.
+Nutrients are plain numbers: calories in kcal, sodium in mg, the rest in grams."""
+    if not GEMINI_RESPONSE_SCHEMA:
+        prompt += f"\nReply with JSON only: {plan_schema.describe(schema)}"
+    return prompt, schema
+
+def create_diet_request(user_inputs, calories, meal_names=None):
+    """(prompt, response schema or None) for a meal plan, in the style GEMINI_STRUCTURED_OUTPUT selects."""
+    if GEMINI_STRUCTURED_OUTPUT:
+        return create_structured_diet_prompt(user_inputs, calories, meal_names)
+    return create_diet_prompt(user_inputs, calories, meal_names), None
+
+def record_gemini_usage(response):
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    for kind in ('prompt', 'candidates'):
+        count = getattr(usage, f'{kind}_token_count', 0) or 0
+        tracing.metrics.inc(GEMINI_TOKENS_METRIC, (("model", GEMINI_MODEL), ("kind", kind)), count)
+
+def create_exercise_prompt(fitness_level, primary_goal, equipment, days, time, exclude_days=()):
+    """Prompt for a `days`-day workout plan; exclude_days names days already planned when topping one up."""
+    exclude = f"\n        Do not use these days, they are already planned: {', '.join(exclude_days)}." if exclude_days else ""
+    return f"""
+        You are a certified fitness coach.
+        Create a {days}-day structured weekly workout plan based on:
+        - Fitness Level: {fitness_level}
+        - Goal: {primary_goal}
+        - Equipment: {equipment}
+        - Days per week: {days}
+        - Duration per session: {time} minutes{exclude}
+
+        Each day must include:
+        - day (e.g., Monday)
+        - focus (e.g., Chest & Triceps)
+        - exercises: list of dicts with "name", "sets", "reps", "rest", "equipment"
+        - intensity: Low/Medium/High
+        - icon: short emoji (💪, 🧘, 🏃 etc.)
+
+        Return strictly JSON in this structure:
+        {{
+          "weeklyPlan": [
+            {{
+              "day": "Monday",
+              "focus": "Upper Body",
+              "exercises": [
+                {{
+                  "name": "Push-ups",
+                  "sets": 3,
+                  "reps": 12,
+                  "rest": "60s",
+                  "equipment": "Bodyweight"
+                }}
+              ],
+              "intensity": "Medium",
+              "icon": "💪"
+            }}
+          ]
+        }}
+        """
+
+def create_structured_exercise_prompt(fitness_level, primary_goal, equipment, days, time, exclude_days=()):
+    """Compact prompt and response schema for a `days`-day workout plan."""
+    exclude = f"\nDo not use these days, they are already planned: {', '.join(exclude_days)}." if exclude_days else ""
+    prompt = f"""You are a certified fitness coach. Create a {days}-day weekly workout plan.
+Fitness level: {fitness_level}. Goal: {primary_goal}. Equipment: {equipment}. {time} minutes per session.{exclude}
+Give each day a weekday name, a focus (e.g. Upper Body), its exercises with sets, reps, rest and equipment, an intensity and a short emoji icon."""
+    if not GEMINI_RESPONSE_SCHEMA:
+        prompt += f"\nReply with JSON only: {plan_schema.describe(plan_schema.WEEKLY_PLAN_SCHEMA)}"
+    return prompt, plan_schema.WEEKLY_PLAN_SCHEMA
+
+def create_exercise_request(fitness_level, primary_goal, equipment, days, time, exclude_days=()):
+    """(prompt, response schema or None) for a workout plan, in the style GEMINI_STRUCTURED_OUTPUT selects."""
+    if GEMINI_STRUCTURED_OUTPUT:
+        return create_structured_exercise_prompt(fitness_level, primary_goal, equipment, days, time, exclude_days)
+    return create_exercise_prompt(fitness_level, primary_goal, equipment, days, time, exclude_days), None
+
+def make_gemini_call(prompt, schema=None):
+    """Gemini's reply to `prompt` as a JSON object (repaired if need be), or None; `schema` constrains the reply."""
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(prompt)
-        response_text = response.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(response_text)
+        model = genai.GenerativeModel(GEMINI_MODEL)
+        kwargs = {}
+        if schema is not None and GEMINI_RESPONSE_SCHEMA:
+            kwargs['generation_config'] = {"response_mime_type": "application/json", "response_schema": schema}
+        with tracing.external_call('gemini', 'generate_content'):
+            response = model.generate_content(prompt, **kwargs)
+        record_gemini_usage(response)
+        plan_data, repaired = extract_json(response.text)
+        if repaired:
+            tracing.metrics.inc(GEMINI_JSON_REPAIRS_METRIC)
+        return plan_data
+    except LLMJSONError as e:
+        tracing.metrics.inc(GEMINI_JSON_ERRORS_METRIC)
+        logging.error(f"Gemini returned no usable JSON: {e}")
+        return None
     except Exception as e:
-        logging.error(f"Error calling Gemini or parsing JSON: {e}")
-        # fallback dummy response
-        return {"mealPlan": []}
+        logging.error(f"Error calling Gemini: {e}")
+        return None
+
+def generate_meals(user_inputs, calories, meal_names):
+    """
+    Sections for `meal_names` from Gemini. Meals missing from or unusable in
+    the reply are asked for again, once and on their own.
+    """
+    plan_data = make_gemini_call(*create_diet_request(user_inputs, calories, meal_names)) or {}
+    sections, failing = plan_schema.repair_meal_plan(plan_data.get("mealPlan"), meal_names)
+    if failing:
+        tracing.metrics.inc(GEMINI_RETRIES_METRIC, (("plan", "diet"),))
+        retry = make_gemini_call(*create_diet_request(user_inputs, calories, failing)) or {}
+        sections.update(plan_schema.repair_meal_plan(retry.get("mealPlan"), failing)[0])
+    return sections
+
+def generate_meal_plan(user_inputs, calories):
+    """
+    The day's meals: from the dish catalog where it has enough dishes near
+    each meal's share of the calories, otherwise from Gemini, in one call or,
+    with GEMINI_PARALLEL_MEALS, one concurrent call per meal. Meals that still
+    fail after a retry are left out.
+    """
+    meal_names = plan_schema.meal_names(user_inputs['mealsPerDay'])
+    sections = {}
+    if DISH_CATALOG:
+        with tracing.stage('dish_catalog'):
+            sections = dish_catalog.plan(meal_names, calories['weightLoss'])
+        for name in meal_names:
+            tracing.cache_lookup('dish_catalog', name in sections)
+    gaps = [name for name in meal_names if name not in sections]
+    if not gaps:
+        return [sections[name] for name in meal_names]
+
+    if GEMINI_PARALLEL_MEALS:
+        # The calls run on pool threads, outside the request's trace; time them here.
+        with tracing.stage('gemini'):
+            futures = [meal_pool.submit(generate_meals, user_inputs, calories, [name]) for name in gaps]
+            generated = {}
+            for future in futures:
+                generated.update(future.result())
+    else:
+        generated = generate_meals(user_inputs, calories, gaps)
+    if DISH_CATALOG:
+        with tracing.stage('dish_catalog_add'):
+            dish_catalog.add_sections(list(generated.values()))
+    sections.update(generated)
+    return [sections[name] for name in meal_names if name in sections]
+
+def generate_weekly_plan(fitness_level, primary_goal, equipment, days, time):
+    """A workout plan of up to `days` days; if Gemini's reply has too few usable days, the rest are asked for once."""
+    plan_data = make_gemini_call(*create_exercise_request(fitness_level, primary_goal, equipment, days, time)) or {}
+    weekly_plan = plan_schema.repair_weekly_plan(plan_data.get("weeklyPlan"))[:days]
+    missing = days - len(weekly_plan)
+    if missing > 0:
+        tracing.metrics.inc(GEMINI_RETRIES_METRIC, (("plan", "exercise"),))
+        planned = [day["day"] for day in weekly_plan]
+        retry = make_gemini_call(*create_exercise_request(fitness_level, primary_goal, equipment, missing, time,
+                                                          planned)) or {}
+        weekly_plan = plan_schema.repair_weekly_plan(weekly_plan + (retry.get("weeklyPlan") or []))[:days]
+    return weekly_plan
+
+def generate_cached_weekly_plan(key):
+    """generate_weekly_plan() for an exercise_cache.PlanKey."""
+    equipment = ", ".join(key.equipment) or "None (bodyweight only)"
+    return generate_weekly_plan(key.fitness_level, key.primary_goal, equipment, key.days, key.time)
+
+@app.before_request
+def start_exercise_prewarming():
+    # On the first request rather than at import, so scripts and tools that
+    # import the app never call Gemini in the background.
+    if EXERCISE_PREWARM:
+        exercise_plans.start_prewarming(generate_cached_weekly_plan)
 
 # --- API Route ---
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Request, Gemini, FatSecret and Mailtrap metrics of this process, in the Prometheus text format."""
+    return Response(tracing.metrics.render(), content_type=tracing.CONTENT_TYPE)
+
 @app.route('/api/get_full_plan', methods=['POST'])
 def get_full_plan():
     try:
@@ -129,8 +355,7 @@ def get_full_plan():
             user_inputs['gender'], user_inputs['activityLevel']
         )
 
-        prompt = create_diet_prompt(user_inputs, calories)
-        plan_data = make_gemini_call(prompt)
+        meal_plan = generate_meal_plan(user_inputs, calories)
 
         final_response = {
             "bmi": {"value": bmi_value, "category": bmi_status},
@@ -140,7 +365,7 @@ def get_full_plan():
                 "weightLoss": {"value": calories['weightLoss'], "projection": projections['weightLoss']},
                 "extremeLoss": {"value": calories['extremeLoss'], "projection": projections['extremeLoss']}
             },
-            "mealPlan": plan_data.get("mealPlan", [])
+            "mealPlan": meal_plan
         }
         return jsonify(final_response)
 
@@ -163,51 +388,10 @@ def get_exercise_plan():
         days = int(data.get("workoutDaysPerWeek", 3))
         time = int(data.get("timePerSession", 45))
 
-        prompt = f"""
-        You are a certified fitness coach.
-        Create a {days}-day structured weekly workout plan based on:
-        - Fitness Level: {fitness_level}
-        - Goal: {primary_goal}
-        - Equipment: {equipment}
-        - Days per week: {days}
-        - Duration per session: {time} minutes
-
-        Each day must include:
-        - day (e.g., Monday)
-        - focus (e.g., Chest & Triceps)
-        - exercises: list of dicts with "name", "sets", "reps", "rest", "equipment"
-        - intensity: Low/Medium/High
-        - icon: short emoji (💪, 🧘, 🏃 etc.)
-
-        Return strictly JSON in this structure:
-        {{
-          "weeklyPlan": [
-            {{
-              "day": "Monday",
-              "focus": "Upper Body",
-              "exercises": [
-                {{
-                  "name": "Push-ups",
-                  "sets": 3,
-                  "reps": 12,
-                  "rest": "60s",
-                  "equipment": "Bodyweight"
-                }}
-              ],
-              "intensity": "Medium",
-              "icon": "💪"
-            }}
-          ]
-        }}
-        """
-
-        plan_data = make_gemini_call(prompt)
-
-        # Ensure fallback structure if Gemini fails
-        if "weeklyPlan" not in plan_data:
-            plan_data = {"weeklyPlan": []}
-
-        return jsonify(plan_data), 200
+        key = canonical_key(fitness_level, primary_goal, equipment, days, time)
+        weekly_plan, hit = exercise_plans.get_or_generate(key, generate_cached_weekly_plan)
+        tracing.cache_lookup('exercise_plan', hit)
+        return jsonify({"weeklyPlan": weekly_plan}), 200
 
     except Exception as e:
         logging.error(f"Error in get_exercise_plan: {e}", exc_info=True)
@@ -217,9 +401,9 @@ def get_exercise_plan():
 def signup():
     """User signup endpoint - checks if account exists, creates if not"""
     try:
-        import sys
         sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'WellWise-AI-Engine-main'))
-        import database as db
+        import storage
+        db = storage.get_storage()
         import bcrypt
         
         data = request.get_json()
@@ -286,9 +470,9 @@ def signup():
 def login():
     """User login endpoint - verifies credentials from MongoDB"""
     try:
-        import sys
         sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'WellWise-AI-Engine-main'))
-        import database as db
+        import storage
+        db = storage.get_storage()
         import bcrypt
         
         data = request.get_json()
@@ -0,0 +1,216 @@
+"""
+Local catalog of Indian dishes, for serving diet plans without Gemini.
+
+Every meal section Gemini returns is added to the catalog by meal type (one
+entry per dish name), and the catalog is kept in a JSON file. plan() fills a
+day's meals from it. Each meal gets MEAL_OPTIONS dishes within
+CALORIE_TOLERANCE of its share of the day's calories
+(plan_schema.meal_budgets), drawn at random from the closest ones so that
+plans vary. The options are alternatives for the same meal, so picking each
+one close to the budget keeps any combination near the day's target. Meals
+with fewer than MIN_CHOICES close dishes are left for Gemini. Its reply then
+fills the gap for later requests.
+
+New dishes are saved on a background thread. Several processes (e.g. gunicorn
+workers) can share the file: a save takes an exclusive lock on
+"<path>.lock", merges the dishes other processes saved since, and replaces
+the file through a temporary file of its own.
+
+Seed it from Gemini replies recorded by benchmark_prompts.py:
+
+    python dish_catalog.py seed ../WellWise-AI-Engine-main/scripts/prompt_fixture.json
+    python dish_catalog.py stats
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows: the development server is a single process.
+    fcntl = None
+
+import plan_schema
+from llm_json import LLMJSONError, extract_json
+
+CATALOG_PATH = os.getenv("DISH_CATALOG_PATH",
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dish_catalog.json'))
+# Width (kcal) of the calorie bands dishes are indexed by.
+BAND_KCAL = 50
+# How far a dish's calories may be from its meal's budget, as a fraction of the budget.
+CALORIE_TOLERANCE = float(os.getenv("DISH_CATALOG_TOLERANCE", 0.15))
+# Close dishes a meal needs before it is served from the catalog, so plans vary.
+MIN_CHOICES = int(os.getenv("DISH_CATALOG_MIN_CHOICES", 6))
+
+
+class DishCatalog:
+    """Dishes by meal type, indexed by calorie band, persisted to a JSON file."""
+
+    def __init__(self, path=CATALOG_PATH, rng=None):
+        self.path = path
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._dishes = {}  # {meal type: {dish name, lowercased: option}}
+        self._bands = {}   # {(meal type, band): [dish name, lowercased]}
+        self._saver = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dish-catalog-save')
+        self._save_queued = False
+        for meal_type, options in self._read().items():
+            self._add(meal_type, options)
+
+    def __len__(self):
+        return sum(len(dishes) for dishes in self._dishes.values())
+
+    def _add(self, meal_type, options):
+        dishes = self._dishes.setdefault(meal_type, {})
+        added = 0
+        for option in options:
+            key = option["name"].lower()
+            if key in dishes:
+                continue
+            dishes[key] = option
+            self._bands.setdefault((meal_type, int(option["calories"] // BAND_KCAL)), []).append(key)
+            added += 1
+        return added
+
+    def add_sections(self, sections):
+        """
+        Add the dishes of meal sections (as repaired by plan_schema); new ones are saved in the background.
+
+        Args:
+            sections (list): {"mealType", "options"} dicts
+
+        Returns:
+            int: Dishes that were new
+        """
+        with self._lock:
+            added = sum(self._add(section["mealType"], section["options"]) for section in sections)
+            if added and self.path and not self._save_queued:
+                self._save_queued = True
+                self._saver.submit(self._save_logged)
+        return added
+
+    def _read(self):
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable {self.path}: {e}")
+            return {}
+
+    def _save_logged(self):
+        try:
+            self.save()
+        except OSError as e:
+            logging.error(f"Could not save the dish catalog: {e}")
+
+    def save(self):
+        """Merge the dishes saved by other processes and write the catalog to its file."""
+        with self._lock:
+            self._save_queued = False
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with open(f"{self.path}.lock", 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            saved = self._read()
+            with self._lock:
+                for meal_type, options in saved.items():
+                    self._add(meal_type, options)
+                data = {meal_type: list(dishes.values()) for meal_type, dishes in self._dishes.items()}
+            fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(self.path)}.", suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False, indent=1)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+
+    def candidates(self, meal_type, budget):
+        """Dishes for `meal_type` within CALORIE_TOLERANCE of `budget` kcal, closest first."""
+        low, high = budget * (1 - CALORIE_TOLERANCE), budget * (1 + CALORIE_TOLERANCE)
+        with self._lock:
+            dishes = self._dishes.get(meal_type, {})
+            found = [dishes[key]
+                     for band in range(int(low // BAND_KCAL), int(high // BAND_KCAL) + 1)
+                     for key in self._bands.get((meal_type, band), [])
+                     if low <= dishes[key]["calories"] <= high]
+        return sorted(found, key=lambda option: abs(option["calories"] - budget))
+
+    def pick(self, meal_type, budget):
+        """A section of MEAL_OPTIONS dishes for `meal_type`, or None if the catalog has too few close ones."""
+        found = self.candidates(meal_type, budget)
+        if len(found) < max(MIN_CHOICES, plan_schema.MEAL_OPTIONS):
+            return None
+        options = self.rng.sample(found[:MIN_CHOICES], plan_schema.MEAL_OPTIONS)
+        return {"mealType": meal_type, "options": [dict(option) for option in options]}
+
+    def plan(self, meal_names, total):
+        """
+        Fill the meals of a day from the catalog.
+
+        Args:
+            meal_names (list): The day's meals, from plan_schema.meal_names()
+            total (float): Calories for the whole day
+
+        Returns:
+            dict: {meal name: section} for the meals the catalog could fill
+        """
+        budgets = plan_schema.meal_budgets(meal_names, total)
+        sections = {}
+        for name in meal_names:
+            section = self.pick(name, budgets[name])
+            if section is not None:
+                sections[name] = section
+        return sections
+
+    def stats(self):
+        """{meal type: {band start kcal: dishes}}."""
+        with self._lock:
+            stats = {}
+            for (meal_type, band), keys in sorted(self._bands.items()):
+                stats.setdefault(meal_type, {})[band * BAND_KCAL] = len(keys)
+            return stats
+
+
+def seed(catalog, fixture_path):
+    """Add the meal plans among the Gemini replies of a benchmark_prompts.py fixture; returns dishes added."""
+    with open(fixture_path, encoding='utf-8') as f:
+        calls = json.load(f)["calls"]
+    added = 0
+    for call in calls.values():
+        try:
+            reply, _ = extract_json(call["text"])
+        except LLMJSONError:
+            continue
+        sections, _ = plan_schema.repair_meal_plan(reply.get("mealPlan"), list(plan_schema.MEAL_CALORIE_SHARES))
+        added += catalog.add_sections(list(sections.values()))
+    return added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local dish catalog")
+    parser.add_argument('command', choices=['seed', 'stats'])
+    parser.add_argument('fixtures', nargs='*', help="benchmark_prompts.py fixtures to seed from")
+    parser.add_argument('--path', default=CATALOG_PATH, help="Catalog file")
+    args = parser.parse_args()
+
+    catalog = DishCatalog(args.path)
+    if args.command == 'seed':
+        for fixture_path in args.fixtures:
+            print(f"✅ {fixture_path}: {seed(catalog, fixture_path)} new dishes")
+        catalog.save()
+    print(f"📚 {len(catalog)} dishes in {args.path}")
+    for meal_type, bands in catalog.stats().items():
+        print(f"   {meal_type}: " + ", ".join(f"{start}-{start + BAND_KCAL} kcal: {count}"
+                                            for start, count in bands.items()))
+
+
+if __name__ == "__main__":
+    main()
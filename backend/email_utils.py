@@ -2,6 +2,8 @@ import os
 import requests
 from dotenv import load_dotenv
 
+import tracing
+
 load_dotenv()
 
 MAILTRAP_API_TOKEN = os.getenv("MAILTRAP_API_TOKEN")
@@ -44,8 +46,9 @@ def send_email(to_email, subject, text_content, html_content=None, from_name="We
     }
     
     try:
-        response = requests.post(MAILTRAP_API_URL, json=payload, headers=headers)
-        response.raise_for_status()
+        with tracing.external_call('mailtrap', 'send'):
+            response = requests.post(MAILTRAP_API_URL, json=payload, headers=headers)
+            response.raise_for_status()
         return {"status": "success", "message": "Email sent successfully"}
     except requests.exceptions.RequestException as e:
         return {"status": "error", "message": str(e)}
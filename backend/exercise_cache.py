@@ -0,0 +1,234 @@
+"""
+In-process cache of exercise plans, with background prewarming.
+
+An exercise plan depends only on the fitness level, goal, equipment, days per
+week and session length, and few combinations of those are common. Requests
+are keyed by the canonicalized inputs (PlanKey). Level and goal are
+title-cased, and the available equipment becomes a sorted tuple of names.
+Days and minutes per session are kept as asked for; the frontend only offers
+a few values of each.
+
+Entries are evicted least-recently-used beyond EXERCISE_CACHE_SIZE and expire
+after EXERCISE_CACHE_TTL seconds. Concurrent misses for one key wait for a
+single generation instead of each calling Gemini. Only complete plans (one day
+per day asked for) are cached.
+
+The cache counts how often each key is asked for. With EXERCISE_PREWARM=1,
+the app calls start_prewarming() on the first request a process serves; it
+runs a daemon thread that, every EXERCISE_PREWARM_INTERVAL seconds, generates the
+EXERCISE_PREWARM_TOP most requested plans that are missing or about to
+expire. The most requested keys are saved to EXERCISE_POPULAR_PATH, so that a
+restarted server prewarms them straight away. Each process (e.g. each gunicorn
+worker) has its own cache and prewarmer.
+"""
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+CACHE_MAX_ENTRIES = int(os.getenv("EXERCISE_CACHE_SIZE", 2000))
+CACHE_TTL_SECONDS = float(os.getenv("EXERCISE_CACHE_TTL", 86400))
+PREWARM_TOP = int(os.getenv("EXERCISE_PREWARM_TOP", 20))
+PREWARM_INTERVAL = float(os.getenv("EXERCISE_PREWARM_INTERVAL", 600))
+POPULAR_PATH = os.getenv("EXERCISE_POPULAR_PATH",
+                         os.path.join(os.path.dirname(os.path.abspath(__file__)), 'exercise_popular.json'))
+# Request counts kept for at most this many keys; the rarest are dropped beyond it.
+MAX_TRACKED_KEYS = 10000
+# Seconds a request waits for another thread generating the same plan.
+GENERATION_WAIT = 60
+
+PlanKey = namedtuple('PlanKey', ['fitness_level', 'primary_goal', 'equipment', 'days', 'time'])
+
+
+def canonical_key(fitness_level, primary_goal, equipment, days, time_per_session):
+    """
+    Canonicalize the inputs of an exercise plan request.
+
+    Args:
+        fitness_level (str): e.g. "beginner"
+        primary_goal (str): e.g. "Weight Loss"
+        equipment: {name: bool} as the frontend sends it, or a list or comma-separated string of names
+        days (int): Workout days per week
+        time_per_session (int): Minutes per session
+
+    Returns:
+        PlanKey: Hashable key; equipment is a sorted tuple of lowercase names
+    """
+    if isinstance(equipment, dict):
+        names = [name for name, available in equipment.items() if available]
+    elif isinstance(equipment, str):
+        names = equipment.split(',')
+    else:
+        names = list(equipment or [])
+    equipment = tuple(sorted({str(name).strip().lower() for name in names if str(name).strip()}))
+    return PlanKey(
+        fitness_level=" ".join(str(fitness_level).split()).title(),
+        primary_goal=" ".join(str(primary_goal).split()).title(),
+        equipment=equipment,
+        days=int(days),
+        time=int(time_per_session),
+    )
+
+
+class ExercisePlanCache:
+    """Thread-safe LRU cache of weekly plans by PlanKey, with a per-entry time-to-live."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS, popular_path=POPULAR_PATH):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.popular_path = popular_path
+        self._entries = OrderedDict()  # {key: (expires at, plan)}
+        self._inflight = {}            # {key: Event set when its generation finishes}
+        self._requests = Counter()
+        self._lock = threading.Lock()
+        self._prewarm_thread = None
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'prewarmed': 0}
+        if popular_path and os.path.exists(popular_path):
+            try:
+                with open(popular_path, encoding='utf-8') as f:
+                    for fields, count in json.load(f):
+                        fields[2] = tuple(fields[2])
+                        self._requests[PlanKey(*fields)] = count
+            except (OSError, ValueError, TypeError) as e:
+                logging.warning(f"Ignoring unreadable {popular_path}: {e}")
+
+    def _get(self, key, now):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= now:
+            del self._entries[key]
+            self.stats['expired'] += 1
+            entry = None
+        return entry
+
+    def put(self, key, plan):
+        """Cache `plan` for `key` if it is complete; returns whether it was cached."""
+        if not plan or len(plan) != key.days:
+            return False
+        entry = (time.monotonic() + self.ttl, copy.deepcopy(plan))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats['evictions'] += 1
+        return True
+
+    def get_or_generate(self, key, generate):
+        """
+        The plan for `key`, from the cache or from `generate(key)`.
+
+        Args:
+            key (PlanKey): From canonical_key()
+            generate (callable): Makes the plan for a key on a miss
+
+        Returns:
+            tuple: (plan, hit)
+        """
+        with self._lock:
+            self._track(key)
+            entry = self._get(key, time.monotonic())
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return copy.deepcopy(entry[1]), True
+            self.stats['misses'] += 1
+            pending = self._inflight.get(key)
+            if pending is None:
+                pending = self._inflight[key] = {'done': threading.Event(), 'plan': []}
+                owner = True
+            else:
+                owner = False
+        if not owner and pending['done'].wait(GENERATION_WAIT):
+            # Another thread was already generating this plan.
+            return copy.deepcopy(pending['plan']), False
+        return self._fill(key, generate, pending if owner else None), False
+
+    def _fill(self, key, generate, pending):
+        """Run `generate(key)` and cache the plan; `pending` is the in-flight entry requests for `key` wait on."""
+        try:
+            plan = generate(key)
+            self.put(key, plan)
+            if pending is not None:
+                pending['plan'] = plan
+            return plan
+        finally:
+            if pending is not None:
+                with self._lock:
+                    del self._inflight[key]
+                pending['done'].set()
+
+    def _track(self, key):
+        self._requests[key] += 1
+        if len(self._requests) > MAX_TRACKED_KEYS:
+            self._requests = Counter(dict(self._requests.most_common(MAX_TRACKED_KEYS // 2)))
+
+    def popular(self, n):
+        """The `n` most requested keys, most requested first."""
+        with self._lock:
+            return [key for key, _ in self._requests.most_common(n)]
+
+    def prewarm(self, generate, top=PREWARM_TOP, horizon=PREWARM_INTERVAL):
+        """
+        Generate the `top` most requested plans that are missing or expire within `horizon` seconds.
+
+        Returns:
+            int: Plans generated
+        """
+        keys = self.popular(top)
+        self._save_popular()
+        generated = 0
+        for key in keys:
+            with self._lock:
+                entry = self._entries.get(key)
+                if (entry is not None and entry[0] > time.monotonic() + horizon) or key in self._inflight:
+                    continue
+                pending = self._inflight[key] = {'done': threading.Event(), 'plan': []}
+            # Requests keep getting the old plan until the new one replaces it.
+            self._fill(key, generate, pending)
+            generated += 1
+        with self._lock:
+            self.stats['prewarmed'] += generated
+        return generated
+
+    def _save_popular(self):
+        if not self.popular_path:
+            return
+        with self._lock:
+            popular = [[list(key), count] for key, count in self._requests.most_common(max(PREWARM_TOP, 100))]
+        if not popular:
+            return
+        try:
+            tmp_path = f"{self.popular_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(popular, f)
+            os.replace(tmp_path, self.popular_path)
+        except OSError as e:
+            logging.warning(f"Could not save popular exercise plans: {e}")
+
+    def start_prewarming(self, generate, interval=PREWARM_INTERVAL, top=PREWARM_TOP):
+        """Prewarm now and then every `interval` seconds on a daemon thread, once per cache; returns the thread."""
+
+        def run():
+            while True:
+                try:
+                    generated = self.prewarm(generate, top, interval)
+                    if generated:
+                        logging.info(f"Prewarmed {generated} exercise plans")
+                except Exception as e:
+                    logging.error(f"Exercise plan prewarming failed: {e}")
+                time.sleep(interval)
+
+        with self._lock:
+            if self._prewarm_thread is None:
+                self._prewarm_thread = threading.Thread(target=run, name='exercise-prewarm', daemon=True)
+                self._prewarm_thread.start()
+            return self._prewarm_thread
+
+    def status(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return dict(self.stats, size=len(self._entries), max_entries=self.max_entries, ttl_seconds=self.ttl,
+                    tracked_keys=len(self._requests),
+                    hit_rate=round(self.stats['hits'] / lookups, 4) if lookups else None)
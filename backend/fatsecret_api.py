@@ -2,21 +2,38 @@
 FatSecret API Integration for Food Images
 """
 import os
+import threading
+import time
+from collections import OrderedDict
 import requests
 import base64
 from dotenv import load_dotenv
 
+import tracing
+
 load_dotenv()
 
 CLIENT_ID = os.getenv("FATSECRET_CLIENT_ID")
 CLIENT_SECRET = os.getenv("FATSECRET_CLIENT_SECRET")
 TOKEN_URL = "https://oauth.fatsecret.com/connect/token"
 SEARCH_URL = "https://platform.fatsecret.com/rest/server.api"
+IMAGE_CACHE_SIZE = int(os.getenv("FATSECRET_IMAGE_CACHE_SIZE", 1000))
+TOKEN_EXPIRY_MARGIN = 60  # seconds; renew a little before FatSecret's expiry
+
+_token = {"value": None, "expires_at": 0.0}
+_image_cache = OrderedDict()
+_cache_lock = threading.Lock()
 
 def get_access_token():
-    """Get OAuth 2.0 access token from FatSecret."""
+    """Get OAuth 2.0 access token from FatSecret, reusing it until shortly before it expires."""
     if not CLIENT_ID or not CLIENT_SECRET:
         return None
+
+    with _cache_lock:
+        if _token["value"] and time.monotonic() < _token["expires_at"]:
+            tracing.cache_lookup('fatsecret_token', True)
+            return _token["value"]
+    tracing.cache_lookup('fatsecret_token', False)
     
     # Create Basic Auth header
     auth_string = f"{CLIENT_ID}:{CLIENT_SECRET}"
@@ -35,15 +52,30 @@ def get_access_token():
     }
     
     try:
-        response = requests.post(TOKEN_URL, headers=headers, data=data)
-        response.raise_for_status()
-        return response.json().get('access_token')
+        with tracing.external_call('fatsecret', 'token'):
+            response = requests.post(TOKEN_URL, headers=headers, data=data)
+            response.raise_for_status()
+        body = response.json()
+        with _cache_lock:
+            _token["value"] = body.get('access_token')
+            _token["expires_at"] = time.monotonic() + float(body.get('expires_in', 0)) - TOKEN_EXPIRY_MARGIN
+        return _token["value"]
     except Exception as e:
         print(f"FatSecret auth error: {e}")
         return None
 
 def search_food_image(food_name):
-    """Search for food and get image URL from FatSecret."""
+    """Search for food and get image URL from FatSecret; answers (including "no image") are cached per name."""
+    key = food_name.strip().lower()
+    with _cache_lock:
+        cached = key in _image_cache
+        if cached:
+            _image_cache.move_to_end(key)
+            image_url = _image_cache[key]
+    tracing.cache_lookup('fatsecret_image', cached)
+    if cached:
+        return image_url
+
     token = get_access_token()
     if not token:
         return None
@@ -61,20 +93,27 @@ def search_food_image(food_name):
     }
     
     try:
-        response = requests.get(SEARCH_URL, headers=headers, params=params)
-        response.raise_for_status()
+        with tracing.external_call('fatsecret', 'search'):
+            response = requests.get(SEARCH_URL, headers=headers, params=params)
+            response.raise_for_status()
         data = response.json()
         
         # Extract image URL if available
+        image_url = None
         foods = data.get('foods', {}).get('food', [])
         if foods and len(foods) > 0:
             food = foods[0] if isinstance(foods, list) else foods
             # FatSecret doesn't always have images, so we construct a fallback
             food_id = food.get('food_id')
             if food_id:
-                return f"https://platform.fatsecret.com/api/static/food/image/{food_id}"
-        
-        return None
+                image_url = f"https://platform.fatsecret.com/api/static/food/image/{food_id}"
+
+        # Only answers are cached; after an error (below) the next call retries.
+        with _cache_lock:
+            _image_cache[key] = image_url
+            while len(_image_cache) > IMAGE_CACHE_SIZE:
+                _image_cache.popitem(last=False)
+        return image_url
     except Exception as e:
         print(f"FatSecret search error: {e}")
         return None
@@ -0,0 +1,106 @@
+"""
+Recovering JSON objects from LLM replies.
+
+Gemini wraps JSON in code fences or prose, leaves trailing commas, and gets
+cut off at its output-token limit. extract_json() scans the reply once from
+the first '{', keeping a stack of open brackets: trailing commas are dropped
+as they are met, and when the reply ends (or breaks) inside the object, it is
+cut back to the end of the last complete element and the open brackets are
+closed. A truncated meal plan so keeps every complete meal, and only the
+missing ones need asking for again (see plan_schema.py).
+"""
+import json
+
+# Starting points tried before giving up, for replies with braces in the prose.
+MAX_STARTS = 20
+
+
+class LLMJSONError(ValueError):
+    """No JSON object could be recovered from a reply."""
+
+
+def extract_json(text):
+    """
+    The first JSON object in `text`, repaired if necessary.
+
+    Args:
+        text (str): Model reply
+
+    Returns:
+        tuple: (dict, repaired), where repaired is True if commas were dropped or the object was truncated
+
+    Raises:
+        LLMJSONError: If no object can be recovered
+    """
+    if not text:
+        raise LLMJSONError("Empty reply.")
+    last_error = None
+    start = text.find('{')
+    for _ in range(MAX_STARTS):
+        if start == -1:
+            break
+        for candidate, repaired in _scan(text, start):
+            try:
+                value = json.loads(candidate)
+                if isinstance(value, dict):
+                    return value, repaired
+            except json.JSONDecodeError as e:
+                last_error = e
+        start = text.find('{', start + 1)
+    raise LLMJSONError(f"No JSON object in the reply{f' ({last_error})' if last_error else ''}.")
+
+
+def _scan(text, start):
+    """Candidate texts, best first, for the object starting at text[start]: (text, repaired) pairs."""
+    out = []
+    stack = []
+    in_string = escaped = False
+    repaired = False
+    # Length of `out` and the open brackets at the end of the last complete element.
+    cut = None
+
+    for ch in text[start:]:
+        if in_string:
+            out.append(ch)
+            if escaped:
+                escaped = False
+            elif ch == '\\':
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+        elif ch in '{[':
+            stack.append('}' if ch == '{' else ']')
+            out.append(ch)
+        elif ch in '}]':
+            end = len(out)
+            while end and out[end - 1].isspace():
+                end -= 1
+            if end and out[end - 1] == ',':
+                del out[end - 1]
+                repaired = True
+            if not stack or stack[-1] != ch:
+                break
+            stack.pop()
+            out.append(ch)
+            if not stack:
+                return [(''.join(out), repaired)]
+            cut = (len(out), list(stack))
+        elif ch == ',':
+            cut = (len(out), list(stack))
+            out.append(ch)
+        else:
+            out.append(ch)
+
+    candidates = []
+    body = ''.join(out).rstrip()
+    # Closing right where the reply stopped is only safe after a finished
+    # string or container; a trailing number may itself be cut short.
+    if stack and not in_string and body.endswith(('"', '}', ']')):
+        candidates.append((body + ''.join(reversed(stack)), True))
+    if cut is not None:
+        length, still_open = cut
+        candidates.append((''.join(out[:length]) + ''.join(reversed(still_open)), True))
+    return candidates or [(body, repaired)]
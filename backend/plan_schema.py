@@ -0,0 +1,201 @@
+"""
+Shapes of the diet and exercise plans the frontend renders, and repair of
+what Gemini returns for them.
+
+repair_meal_plan() and repair_weekly_plan() keep whatever is usable: numbers
+given as strings ("15g", "350 kcal") are converted, malformed dish options or
+days dropped. What remains unusable is reported, so that the caller asks
+Gemini again for those meals or days only instead of repeating the whole
+multi-second call.
+
+meal_plan_schema() and WEEKLY_PLAN_SCHEMA describe the same shapes as
+Gemini response schemas (an OpenAPI subset), for structured output; describe()
+renders one compactly for prompts when the SDK cannot pass it natively.
+"""
+import json
+import re
+
+MEAL_NUTRIENTS = ['calories', 'protein', 'fat', 'carbs', 'saturatedFat', 'sodium', 'fiber', 'sugar']
+INTENSITIES = ['Low', 'Medium', 'High']
+# Dish options the prompt asks for per meal, and the fewest a meal may keep.
+MEAL_OPTIONS = 3
+MIN_MEAL_OPTIONS = 1
+
+# Relative share of the day's calories per meal; meal_budgets() scales the
+# shares of the meals a day has to its total.
+MEAL_CALORIE_SHARES = {"Breakfast": 25, "Morning Snack": 10, "Lunch": 35, "Afternoon Snack": 10, "Dinner": 30}
+
+_STRING = {"type": "STRING"}
+_STRINGS = {"type": "ARRAY", "items": _STRING}
+
+_NUMBER = re.compile(r'-?\d+(?:\.\d+)?')
+
+
+def meal_names(meals_per_day):
+    """The meals of a day with `meals_per_day` meals, in order."""
+    names = ["Breakfast", "Lunch", "Dinner"]
+    if meals_per_day == 4:
+        names.insert(2, "Afternoon Snack")
+    elif meals_per_day >= 5:
+        names.insert(1, "Morning Snack")
+        names.insert(3, "Afternoon Snack")
+    return names
+
+
+def meal_budgets(names, total):
+    """
+    Split a day's calories across its meals.
+
+    Args:
+        names (list): The day's meals, from meal_names()
+        total (float): Calories for the whole day
+
+    Returns:
+        dict: {meal name: calories per dish, rounded to 10 kcal}
+    """
+    weight = sum(MEAL_CALORIE_SHARES[name] for name in names)
+    return {name: int(round(total * MEAL_CALORIE_SHARES[name] / weight, -1)) for name in names}
+
+
+def to_number(value):
+    """A number from a JSON value such as 300, "300", "15g" or "350 kcal", else None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        match = _NUMBER.search(value)
+        if match:
+            number = float(match.group())
+            return int(number) if number.is_integer() else number
+    return None
+
+
+def _string_list(value):
+    if isinstance(value, str):
+        value = [value]
+    return [str(item).strip() for item in value if str(item).strip()] if isinstance(value, list) else []
+
+
+def repair_option(option):
+    """A usable dish option built from `option`, or None when it has no name or calories."""
+    if not isinstance(option, dict) or not str(option.get('name') or '').strip():
+        return None
+    repaired = {"name": str(option['name']).strip(), "description": str(option.get('description') or '').strip()}
+    for nutrient in MEAL_NUTRIENTS:
+        value = to_number(option.get(nutrient))
+        if value is None and nutrient == 'calories':
+            return None
+        repaired[nutrient] = value if value is not None else 0
+    repaired["ingredients"] = _string_list(option.get('ingredients'))
+    repaired["instructions"] = _string_list(option.get('instructions'))
+    return repaired
+
+
+def repair_meal_plan(meal_plan, names):
+    """
+    Match Gemini's meal plan to the meals asked for.
+
+    Args:
+        meal_plan: The "mealPlan" value of the reply (anything, if the reply was bad)
+        names (list): Meal names asked for, in order
+
+    Returns:
+        tuple: (sections, failing) - {meal name: usable section} and the names still needed, in order
+    """
+    sections = {}
+    for meal in meal_plan if isinstance(meal_plan, list) else []:
+        if not isinstance(meal, dict):
+            continue
+        name = str(meal.get('mealType') or '').strip()
+        # Gemini sometimes varies the case or spacing of the meal names.
+        match = next((n for n in names if n.lower() == name.lower()), None)
+        if match is None or match in sections:
+            continue
+        options = [option for option in map(repair_option, meal.get('options') or []) if option is not None]
+        if len(options) >= MIN_MEAL_OPTIONS:
+            sections[match] = {"mealType": match, "options": options[:MEAL_OPTIONS]}
+    return sections, [name for name in names if name not in sections]
+
+
+def repair_exercise(exercise):
+    """A usable exercise built from `exercise`, or None when it has no name."""
+    if not isinstance(exercise, dict) or not str(exercise.get('name') or '').strip():
+        return None
+    sets = to_number(exercise.get('sets'))
+    return {
+        "name": str(exercise['name']).strip(),
+        "sets": int(sets) if sets is not None else 3,
+        # Reps may legitimately be "10-12" or "30s"; keep them as given.
+        "reps": exercise.get('reps') if exercise.get('reps') not in (None, '') else 10,
+        "rest": str(exercise.get('rest') or '60s'),
+        "equipment": str(exercise.get('equipment') or 'Bodyweight'),
+    }
+
+
+def repair_weekly_plan(weekly_plan):
+    """The usable days of Gemini's "weeklyPlan" value (days need a name and at least one exercise)."""
+    days = []
+    seen = set()
+    for day in weekly_plan if isinstance(weekly_plan, list) else []:
+        if not isinstance(day, dict) or not str(day.get('day') or '').strip():
+            continue
+        if str(day['day']).strip().lower() in seen:
+            continue
+        exercises = [exercise for exercise in map(repair_exercise, day.get('exercises') or []) if exercise]
+        if not exercises:
+            continue
+        seen.add(str(day['day']).strip().lower())
+        intensity = str(day.get('intensity') or '').capitalize()
+        days.append({
+            "day": str(day['day']).strip(),
+            "focus": str(day.get('focus') or 'Full Body'),
+            "exercises": exercises,
+            "intensity": intensity if intensity in INTENSITIES else 'Medium',
+            "icon": str(day.get('icon') or '💪'),
+        })
+    return days
+
+
+def _object(properties):
+    return {"type": "OBJECT", "properties": properties, "required": list(properties)}
+
+
+def meal_plan_schema(names):
+    """Response schema of a meal plan for the meals `names`."""
+    option = _object({"name": _STRING, "description": _STRING,
+                      **{nutrient: {"type": "NUMBER"} for nutrient in MEAL_NUTRIENTS},
+                      "ingredients": _STRINGS, "instructions": _STRINGS})
+    meal = _object({"mealType": {"type": "STRING", "enum": list(names)},
+                    "options": {"type": "ARRAY", "items": option}})
+    return _object({"mealPlan": {"type": "ARRAY", "items": meal}})
+
+
+WEEKLY_PLAN_SCHEMA = _object({"weeklyPlan": {"type": "ARRAY", "items": _object({
+    "day": _STRING,
+    "focus": _STRING,
+    "exercises": {"type": "ARRAY", "items": _object({
+        "name": _STRING, "sets": {"type": "INTEGER"}, "reps": _STRING, "rest": _STRING, "equipment": _STRING})},
+    "intensity": {"type": "STRING", "enum": INTENSITIES},
+    "icon": _STRING,
+})}})
+
+
+def describe(schema):
+    """
+    A response schema as compact JSON-like text, e.g. {"day":string,"sets":integer,"intensity":"Low"|"High"}.
+
+    Args:
+        schema (dict): Schema built by meal_plan_schema() or WEEKLY_PLAN_SCHEMA
+
+    Returns:
+        str: One-line description for a prompt
+    """
+    kind = schema["type"]
+    if kind == "OBJECT":
+        return "{" + ",".join(f'"{name}":{describe(value)}' for name, value in schema["properties"].items()) + "}"
+    if kind == "ARRAY":
+        return "[" + describe(schema["items"]) + "]"
+    if "enum" in schema:
+        return "|".join(json.dumps(value) for value in schema["enum"])
+    return kind.lower()
@@ -0,0 +1,258 @@
+"""
+Per-stage request timing, aggregated into Prometheus-format histograms.
+
+The backend's copy of WellWise-AI-Engine-main/tracing.py: the two services
+deploy separately, so each carries the module. Keep them in step.
+
+Handlers wrap their stages in `with tracing.stage("encode"):`. Each stage's
+duration (time.perf_counter, which is monotonic) is added to an in-process
+histogram per route and stage, and every request's total to one per route,
+method and status; GET /metrics renders them in the Prometheus text format.
+The histograms live in the process, so under gunicorn each worker reports its
+own and a scrape sees whichever worker answers; rates and quantiles over
+several scrapes still converge.
+
+With WELLWISE_TRACE_SAMPLE_RATE above 0 (e.g. 0.01), that fraction of
+responses also carries a Server-Timing header with the request's breakdown in
+milliseconds, which browsers show in the network panel:
+
+    Server-Timing: append;dur=0.12, normalize;dur=0.04, ..., total;dur=2.71
+
+Calls to other services go through external_call(), which times them into
+their own histogram (and as a stage of the request), and modules count other
+events, such as cache hits, with metrics.inc().
+
+WELLWISE_PROFILE_SLOW_MS turns on a sampling profiler: a fraction
+WELLWISE_PROFILE_SAMPLE_RATE (default 0.1) of requests runs under cProfile,
+one at a time, and those slower than the threshold are dumped to
+WELLWISE_PROFILE_DIR (default profiles/ next to the app) for
+`python -m pstats` or snakeviz.
+"""
+import bisect
+import cProfile
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+TRACE_SAMPLE_RATE = float(os.getenv("WELLWISE_TRACE_SAMPLE_RATE", 0))
+PROFILE_SLOW_MS = float(os.getenv("WELLWISE_PROFILE_SLOW_MS", 0))
+PROFILE_SAMPLE_RATE = float(os.getenv("WELLWISE_PROFILE_SAMPLE_RATE", 0.1))
+PROFILE_DIR = os.getenv("WELLWISE_PROFILE_DIR")
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# Seconds; the upper bounds of Prometheus' `le` buckets.
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_METRIC = "wellwise_request_duration_seconds"
+STAGE_METRIC = "wellwise_stage_duration_seconds"
+EXTERNAL_METRIC = "wellwise_external_call_duration_seconds"
+CACHE_METRIC = "wellwise_cache_requests_total"
+METRIC_HELP = {
+    REQUEST_METRIC: "Time from request start to response, by route, method and status.",
+    STAGE_METRIC: "Time spent in each stage of a request, by route and stage.",
+    EXTERNAL_METRIC: "Time spent calling other services, by service, operation and outcome.",
+    CACHE_METRIC: "Cache lookups, by cache and result (hit or miss).",
+}
+
+_local = threading.local()
+_profile_lock = threading.Lock()
+
+
+class Histogram:
+    """Counts of observations per bucket, plus their sum."""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Thread-safe set of histograms and counters keyed by metric name and label values."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+
+    def observe(self, metric, labels, value):
+        """Add `value` (seconds) to the histogram of `metric` with `labels`, a tuple of (name, value) pairs."""
+        with self._lock:
+            histogram = self._histograms.get((metric, labels))
+            if histogram is None:
+                histogram = self._histograms[(metric, labels)] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, metric, labels=(), amount=1):
+        """Add `amount` to the counter of `metric` with `labels`."""
+        with self._lock:
+            self._counters[(metric, labels)] = self._counters.get((metric, labels), 0) + amount
+
+    def clear(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            snapshot = sorted((key, list(h.counts), h.sum, h.count, h.buckets) for key, h in self._histograms.items())
+            counters = sorted(self._counters.items())
+        lines = []
+        current = None
+        for (metric, labels), value in counters:
+            if metric != current:
+                current = metric
+                lines.append(f"# HELP {metric} {METRIC_HELP.get(metric, metric)}")
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{_series(metric, _labels(labels))} {value}")
+        for (metric, labels), counts, total, count, buckets in snapshot:
+            if metric != current:
+                current = metric
+                lines.append(f"# HELP {metric} {METRIC_HELP.get(metric, metric)}")
+                lines.append(f"# TYPE {metric} histogram")
+            label_text = _labels(labels)
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float('inf') else repr(bound)
+                lines.append(f'{metric}_bucket{{{label_text}{"," if label_text else ""}le="{le}"}} {cumulative}')
+            lines.append(f"{_series(metric + '_sum', label_text)} {total!r}")
+            lines.append(f"{_series(metric + '_count', label_text)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _series(name, label_text):
+    return f"{name}{{{label_text}}}" if label_text else name
+
+
+def _labels(labels):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
+
+
+class Trace:
+    """The stages timed so far in the current request."""
+
+    def __init__(self, route):
+        self.route = route
+        self.start = time.perf_counter()
+        self.stages = []
+        self.profiler = None
+
+
+@contextmanager
+def stage(name):
+    """Time the enclosed block as stage `name` of the current request (a no-op outside one)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace = getattr(_local, 'trace', None)
+        if trace is not None:
+            elapsed = time.perf_counter() - start
+            trace.stages.append((name, elapsed))
+            metrics.observe(STAGE_METRIC, (("route", trace.route), ("stage", name)), elapsed)
+
+
+@contextmanager
+def external_call(service, operation):
+    """Time a call to another service, e.g. `with tracing.external_call("gemini", "generate_content"):`."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        with stage(service):
+            yield
+        outcome = "ok"
+    finally:
+        metrics.observe(EXTERNAL_METRIC, (("service", service), ("operation", operation), ("outcome", outcome)),
+                        time.perf_counter() - start)
+
+
+def cache_lookup(cache, hit):
+    """Count a lookup in `cache`; the hit ratio is hits / (hits + misses) of CACHE_METRIC."""
+    metrics.inc(CACHE_METRIC, (("cache", cache), ("result", "hit" if hit else "miss")))
+
+
+def server_timing(stages, total):
+    """Server-Timing header value for `stages` [(name, seconds)] and the request `total`."""
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in stages]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+def _start_profile():
+    # cProfile only profiles the calling thread, and on newer Pythons only
+    # one profiler may run at a time, so requests take turns.
+    if not PROFILE_SLOW_MS or random.random() >= PROFILE_SAMPLE_RATE or not _profile_lock.acquire(blocking=False):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        _profile_lock.release()
+        return None
+    return profiler
+
+
+def _finish_profile(profiler, route, total, profile_dir):
+    profiler.disable()
+    try:
+        if total * 1000 >= PROFILE_SLOW_MS:
+            os.makedirs(profile_dir, exist_ok=True)
+            name = route.strip('/').replace('/', '_').replace('<', '').replace('>', '') or 'root'
+            path = os.path.join(profile_dir, f"{datetime.now():%Y%m%d-%H%M%S-%f}_{name}_{total * 1000:.0f}ms.prof")
+            profiler.dump_stats(path)
+    finally:
+        _profile_lock.release()
+
+
+def init_app(app, profile_dir=None):
+    """Trace every request of a Flask `app`; slow-request profiles go to `profile_dir`."""
+    from flask import request
+
+    profile_dir = profile_dir or PROFILE_DIR or os.path.join(app.root_path, 'profiles')
+
+    @app.before_request
+    def _start_trace():
+        # The route pattern, not the path, keeps the label set small.
+        _local.trace = Trace(request.url_rule.rule if request.url_rule is not None else "unmatched")
+        _local.trace.profiler = _start_profile()
+
+    @app.after_request
+    def _finish_trace(response):
+        trace = getattr(_local, 'trace', None)
+        if trace is None:
+            return response
+        total = time.perf_counter() - trace.start
+        if trace.profiler is not None:
+            _finish_profile(trace.profiler, trace.route, total, profile_dir)
+            trace.profiler = None
+        metrics.observe(REQUEST_METRIC, (("route", trace.route), ("method", request.method),
+                                         ("status", str(response.status_code))), total)
+        if TRACE_SAMPLE_RATE and random.random() < TRACE_SAMPLE_RATE:
+            response.headers['Server-Timing'] = server_timing(trace.stages, total)
+        return response
+
+    @app.teardown_request
+    def _clear_trace(exc):
+        trace = getattr(_local, 'trace', None)
+        if trace is not None and trace.profiler is not None:
+            # The request failed before after_request ran.
+            trace.profiler.disable()
+            _profile_lock.release()
+        _local.trace = None
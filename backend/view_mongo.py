@@ -1,116 +1,335 @@
 """
 MongoDB Database Viewer
-View users and health predictions from MongoDB
+View, filter and export users and health predictions from MongoDB.
+
+Documents are streamed from batched cursors and printed or written one at a
+time, so memory stays flat however large the collections are.
+
+Usage:
+    python view_mongo.py                                   # interactive menu
+    python view_mongo.py users
+    python view_mongo.py predictions --email a@b.com --limit 20
+    python view_mongo.py predictions --since 2025-10-01 --where state=Kerala
+    python view_mongo.py predictions --where "health_data.Smoking=Daily"
+    python view_mongo.py predictions --fields user_email prediction health_data.Smoking --export preds.csv
+    python view_mongo.py users --export - --format jsonl > users.jsonl
+    python view_mongo.py stats --by state
 """
+import argparse
+import csv
+import json
 import sys
 import os
+import time
+from datetime import datetime
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'WellWise-AI-Engine-main'))
 
+from bson import ObjectId
 from database import get_database
+import doc_schema
 
-def view_users():
-    """Display all registered users."""
-    db = get_database()
-    if not db:
-        print("❌ Failed to connect to MongoDB")
-        return
-    
-    print("\n" + "="*80)
-    print("👥 REGISTERED USERS")
-    print("="*80 + "\n")
-    
-    users = list(db.users.find())
-    
-    if not users:
-        print("No users found in database.\n")
-        return
-    
-    for i, user in enumerate(users, 1):
-        print(f"User #{i}")
-        print(f"  Name: {user.get('name')}")
-        print(f"  Email: {user.get('email')}")
-        print(f"  Created: {user.get('created_at')}")
-        print(f"  Last Login: {user.get('last_login', 'Never')}")
-        print(f"  Password Hash: {user.get('password_hash')[:20]}... (truncated)")
-        print()
-    
-    print(f"Total Users: {len(users)}\n")
+DEFAULT_BATCH_SIZE = 1000
+# Report throughput on stderr every this many documents while exporting.
+PROGRESS_EVERY = 50000
+
+COLLECTIONS = {
+    "users": {
+        "time_field": "created_at",
+        "email_field": "email",
+        # Exported when --fields isn't given; password hashes are left out.
+        "fields": ["email", "name", "created_at", "last_login"],
+    },
+    "predictions": {
+        "time_field": "timestamp",
+        "email_field": "user_email",
+        "fields": ["user_email", "timestamp", "model_version", "age", "state", "prediction",
+                   "health_scores", "recommendations", "health_data"],
+    },
+}
 
-def view_predictions():
-    """Display all health predictions."""
-    db = get_database()
-    if not db:
-        print("❌ Failed to connect to MongoDB")
-        return
-    
-    print("\n" + "="*80)
-    print("🏥 HEALTH PREDICTIONS")
-    print("="*80 + "\n")
-    
-    predictions = list(db.predictions.find().sort("timestamp", -1))
-    
-    if not predictions:
-        print("No predictions found in database.\n")
-        return
-    
-    for i, pred in enumerate(predictions, 1):
-        print(f"Prediction #{i}")
-        print(f"  User Email: {pred.get('user_email')}")
-        print(f"  Timestamp: {pred.get('timestamp')}")
-        print(f"  Current Age: {pred.get('current_age')}")
-        print(f"  Predicted Life Expectancy: {pred.get('prediction')} years")
-        print(f"  State: {pred.get('state')}")
-        
-        # Show health scores if available
-        health_scores = pred.get('health_scores', {})
-        if health_scores:
-            print(f"  Health Scores:")
-            for key, value in health_scores.items():
-                print(f"    - {key}: {value:.1f}/5.0")
-        
-        # Show top recommendations
-        recommendations = pred.get('recommendations', [])
-        if recommendations:
-            print(f"  Top Recommendations:")
-            for rec in recommendations[:3]:
-                print(f"    - {rec.get('recommendation', 'N/A')}")
-        
-        print()
-    
-    print(f"Total Predictions: {len(predictions)}\n")
 
-def view_stats():
-    """Display database statistics."""
+def _connect():
     db = get_database()
-    if not db:
+    if db is None:
         print("❌ Failed to connect to MongoDB")
-        return
-    
-    print("\n" + "="*80)
+        print("Make sure:")
+        print("1. MongoDB is running (mongod service)")
+        print("2. Or MongoDB Atlas connection string is configured in .env")
+    return db
+
+
+def _parse_value(text):
+    """--where values: JSON where it parses (numbers, true, null), a string otherwise."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+
+def _parse_day(text):
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected YYYY-MM-DD[THH:MM], got {text!r}")
+
+
+def build_query(collection, email=None, since=None, until=None, where=None):
+    """Mongo filter for the viewer's command-line filters."""
+    spec = COLLECTIONS[collection]
+    query = {}
+    if email:
+        query[spec["email_field"]] = email
+    if since or until:
+        query[spec["time_field"]] = {}
+        if since:
+            query[spec["time_field"]]["$gte"] = since
+        if until:
+            query[spec["time_field"]]["$lt"] = until
+    health = []
+    for item in where or []:
+        field, sep, value = item.partition("=")
+        if not sep:
+            raise ValueError(f"--where expects FIELD=VALUE, got {item!r}")
+        head, _, form_field = field.partition(".")
+        if collection == "predictions" and head == "health_data" and form_field:
+            # Compact documents keep the form under short keys with category codes.
+            if form_field not in doc_schema.HEALTH_FIELDS:
+                raise ValueError(f"unknown health form field {form_field!r}")
+            health.append(doc_schema.health_filter(form_field, _parse_value(value)))
+        else:
+            query[field] = _parse_value(value)
+    if health:
+        query["$and"] = health
+    return query
+
+
+def stream(db, collection, query=None, fields=None, limit=0, newest_first=True, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Iterate over documents with a batched cursor.
+
+    Documents are ordered by _id (their creation time), which is always
+    indexed, rather than by a timestamp field that would need an in-memory
+    sort of the whole collection. Predictions are decoded to the full layout
+    whichever layout they were stored in.
+
+    Args:
+        db: Database handle
+        collection (str): 'users' or 'predictions'
+        query (dict, optional): Mongo filter
+        fields (list, optional): Fields to fetch (dotted paths allowed); all when omitted
+        limit (int): Maximum number of documents, 0 for no limit
+        newest_first (bool): Sort order
+        batch_size (int): Documents fetched per round trip
+
+    Returns:
+        iterator: Lazily fetched documents
+    """
+    if collection == "predictions":
+        projection = doc_schema.projection(fields)
+    else:
+        projection = {field: 1 for field in fields} if fields else {"password_hash": 0}
+    cursor = db[collection].find(query or {}, projection).sort("_id", -1 if newest_first else 1)
+    if limit:
+        cursor = cursor.limit(limit)
+    cursor = cursor.batch_size(min(batch_size, limit) if limit else batch_size)
+    return map(doc_schema.decode_prediction, cursor) if collection == "predictions" else cursor
+
+
+class Throughput:
+    """Counts streamed documents and reports the rate on stderr."""
+
+    def __init__(self, label, every=PROGRESS_EVERY):
+        self.label = label
+        self.every = every
+        self.count = 0
+        self.start = time.perf_counter()
+
+    def tick(self):
+        self.count += 1
+        if self.every and self.count % self.every == 0:
+            self.report()
+
+    def report(self, final=False):
+        elapsed = time.perf_counter() - self.start
+        rate = self.count / elapsed if elapsed else 0.0
+        prefix = "✅" if final else "  "
+        print(f"{prefix} {self.label}: {self.count:,} documents in {elapsed:.1f}s ({rate:,.0f} docs/s)", file=sys.stderr)
+
+
+def _lookup(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def export(docs, out, fmt, fields, progress):
+    """
+    Write documents to `out` one at a time as JSON lines or CSV.
+
+    CSV columns are `fields` (dotted paths into nested documents); nested
+    values that remain dicts or lists are written as JSON.
+    """
+    if fmt == "csv":
+        writer = csv.writer(out)
+        writer.writerow(["_id", *fields])
+        for doc in docs:
+            row = [str(doc.get("_id"))]
+            for field in fields:
+                value = _lookup(doc, field)
+                if isinstance(value, (dict, list)):
+                    value = json.dumps(value, default=_json_default)
+                elif isinstance(value, datetime):
+                    value = value.isoformat()
+                row.append("" if value is None else value)
+            writer.writerow(row)
+            progress.tick()
+    else:
+        for doc in docs:
+            out.write(json.dumps(doc, default=_json_default))
+            out.write("\n")
+            progress.tick()
+
+
+def print_user(i, user):
+    print(f"┌─ User #{i} " + "─"*80)
+    print(f"│  📧 Email: {user.get('email')}")
+    print(f"│  👤 Name: {user.get('name')}")
+    print(f"│  📅 Created: {user.get('created_at')}")
+    print(f"│  🔐 Last Login: {user.get('last_login') or 'Never logged in yet'}")
+    print(f"│  🔑 _id: {user.get('_id')}")
+    print(f"└" + "─"*90 + "\n")
+
+
+def print_prediction(i, pred):
+    print(f"┌─ Prediction #{i} " + "─"*75)
+    print(f"│  📧 User: {pred.get('user_email', 'guest@wellwise.com')}")
+    print(f"│  ⏰ Submitted: {pred.get('timestamp')}")
+    print(f"│  👤 Current Age: {pred.get('current_age')} years")
+    print(f"│  🎯 Predicted Life Expectancy: {pred.get('prediction')} years")
+    print(f"│  📍 State: {pred.get('state')}")
+
+    # Show health data
+    health_data = pred.get('health_data', {})
+    if health_data:
+        print(f"│  ")
+        print(f"│  📊 Health Metrics:")
+        print(f"│     - Weight: {health_data.get('Weight')} kg")
+        print(f"│     - Height: {health_data.get('Height')} cm")
+        print(f"│     - BMI: {health_data.get('BMI')}")
+        print(f"│     - Smoking: {health_data.get('Smoking')}")
+        print(f"│     - Alcohol: {health_data.get('Alcohol')}")
+        print(f"│     - Exercise: {health_data.get('Exercise Type')}")
+        print(f"│     - Sleep: {health_data.get('Sleep Duration')} hours")
+
+    # Health scores
+    health_scores = pred.get('health_scores', {})
+    if health_scores:
+        print(f"│  ")
+        print(f"│  ⭐ Health Scores (out of 5.0):")
+        for key, value in health_scores.items():
+            filled = max(0, min(5, int(value)))
+            bars = "█" * filled + "░" * (5 - filled)
+            print(f"│     - {key}: {value:.1f}/5.0 {bars}")
+
+    # Top recommendations
+    recommendations = pred.get('recommendations', [])
+    if recommendations:
+        print(f"│  ")
+        print(f"│  💡 Top Recommendations:")
+        for j, rec in enumerate(recommendations[:3], 1):
+            print(f"│     {j}. {rec.get('title') or rec.get('recommendation', 'N/A')}")
+
+    print(f"│  🔑 _id: {pred.get('_id')}")
+    print(f"└" + "─"*90 + "\n")
+
+
+def view_users(db, query=None, fields=None, limit=0, batch_size=DEFAULT_BATCH_SIZE):
+    """Display registered users, newest first."""
+    print("\n" + "="*100)
+    print("👥 REGISTERED USERS (Signups)")
+    print("="*100 + "\n")
+
+    shown = 0
+    for shown, user in enumerate(stream(db, "users", query, fields, limit, batch_size=batch_size), 1):
+        print_user(shown, user)
+    if not shown:
+        print("⚠️  No users found. Try signing up at http://localhost:5173/signup\n")
+    else:
+        print(f"✅ Users shown: {shown}\n")
+
+
+def view_predictions(db, query=None, fields=None, limit=0, batch_size=DEFAULT_BATCH_SIZE):
+    """Display health predictions, newest first."""
+    print("\n" + "="*100)
+    print("🏥 HEALTH PREDICTIONS (Well AI Check-up Forms)")
+    print("="*100 + "\n")
+
+    shown = 0
+    for shown, pred in enumerate(stream(db, "predictions", query, fields, limit, batch_size=batch_size), 1):
+        print_prediction(shown, pred)
+    if not shown:
+        print("⚠️  No predictions found. Try filling the health form at http://localhost:5173/About\n")
+    else:
+        total = db.predictions.count_documents(query) if query else db.predictions.estimated_document_count()
+        print(f"✅ Total Predictions: {total}")
+        print(f"   (Showing latest {shown})\n")
+
+
+def view_stats(db, by=None):
+    """Display database statistics, optionally with population analytics broken down by `by`."""
+    print("\n" + "="*100)
     print("📊 DATABASE STATISTICS")
-    print("="*80 + "\n")
-    
-    user_count = db.users.count_documents({})
-    pred_count = db.predictions.count_documents({})
-    
-    print(f"Total Users: {user_count}")
-    print(f"Total Predictions: {pred_count}")
-    
-    if user_count > 0:
-        # Most active user
+    print("="*100 + "\n")
+
+    # Collection metadata, not a scan.
+    user_count = db.users.estimated_document_count()
+    pred_count = db.predictions.estimated_document_count()
+
+    print(f"👥 Total Users: {user_count}")
+    print(f"🏥 Total Predictions: {pred_count}")
+
+    if user_count > 0 and pred_count > 0:
+        avg_predictions = pred_count / user_count
+        print(f"📈 Average Predictions per User: {avg_predictions:.1f}")
+
+        # Grouped on the server over the (user_email, ...) index.
         pipeline = [
             {"$group": {"_id": "$user_email", "count": {"$sum": 1}}},
             {"$sort": {"count": -1}},
             {"$limit": 1}
         ]
-        most_active = list(db.predictions.aggregate(pipeline))
+        most_active = list(db.predictions.aggregate(pipeline, allowDiskUse=True))
         if most_active:
-            print(f"Most Active User: {most_active[0]['_id']} ({most_active[0]['count']} predictions)")
-    
+            print(f"🏆 Most Active User: {most_active[0]['_id']} ({most_active[0]['count']} predictions)")
+
+    if by:
+        import analytics
+
+        analytics.refresh_rollups(db)
+        print()
+        analytics.print_report(analytics.report(by, db=db), by)
     print()
 
-def main():
-    """Main menu."""
+
+def view_all(db, limit=20):
+    """Users, the latest `limit` predictions and statistics."""
+    view_users(db)
+    view_predictions(db, limit=limit)
+    view_stats(db)
+
+
+def menu(db):
+    """Interactive menu."""
     while True:
         print("\n" + "="*80)
         print("🗄️  WELLWISE MONGODB VIEWER")
@@ -120,25 +339,89 @@ def main():
         print("3. View Database Statistics")
         print("4. View Everything")
         print("5. Exit")
-        
+
         choice = input("\nEnter your choice (1-5): ").strip()
-        
+
         if choice == '1':
-            view_users()
+            view_users(db)
         elif choice == '2':
-            view_predictions()
+            view_predictions(db)
         elif choice == '3':
-            view_stats()
+            view_stats(db)
         elif choice == '4':
-            view_users()
-            view_predictions()
-            view_stats()
+            view_users(db)
+            view_predictions(db)
+            view_stats(db)
         elif choice == '5':
             print("\n👋 Goodbye!\n")
             break
         else:
             print("\n❌ Invalid choice. Please try again.")
 
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="View, filter and export WellWise MongoDB data.")
+    sub = parser.add_subparsers(dest="command")
+    for name in COLLECTIONS:
+        p = sub.add_parser(name, help=f"Stream {name}")
+        p.add_argument("--email", help="Only this user's documents")
+        p.add_argument("--since", type=_parse_day, help="From this date (inclusive)")
+        p.add_argument("--until", type=_parse_day, help="Before this date")
+        p.add_argument("--where", nargs="*", default=[], metavar="FIELD=VALUE",
+                       help="Exact-match filters; values are parsed as JSON when possible. "
+                            "health_data.<form field> also matches compact documents")
+        p.add_argument("--fields", nargs="*", help="Fields to fetch (dotted paths allowed)")
+        p.add_argument("--limit", type=int, default=0, help="Maximum documents (default: all)")
+        p.add_argument("--oldest-first", action="store_true")
+        p.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+        p.add_argument("--export", metavar="PATH", help="Write to a file ('-' for stdout) instead of printing")
+        p.add_argument("--format", choices=["jsonl", "csv"],
+                       help="Export format (default: from the file extension, else jsonl)")
+    stats = sub.add_parser("stats", help="Collection statistics")
+    stats.add_argument("--by", nargs="*", help="Also report population analytics by these dimensions")
+    all_parser = sub.add_parser("all", help="Users, latest predictions and statistics")
+    all_parser.add_argument("--limit", type=int, default=20, help="Predictions to show")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    db = _connect()
+    if db is None:
+        return 1
+
+    if args.command is None:
+        menu(db)
+    elif args.command == "stats":
+        view_stats(db, args.by)
+    elif args.command == "all":
+        view_all(db, args.limit)
+    else:
+        try:
+            query = build_query(args.command, args.email, args.since, args.until, args.where)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 2
+        if not args.export:
+            view = view_users if args.command == "users" else view_predictions
+            view(db, query, args.fields, args.limit, args.batch_size)
+            return 0
+
+        fmt = args.format or ("csv" if args.export.endswith(".csv") else "jsonl")
+        fields = args.fields or COLLECTIONS[args.command]["fields"]
+        # JSON lines carry whole documents unless fields were asked for; CSV needs fixed columns.
+        projection = args.fields if fmt == "jsonl" else fields
+        docs = stream(db, args.command, query, projection, args.limit, not args.oldest_first, args.batch_size)
+        progress = Throughput(f"Exported {args.command}")
+        if args.export == "-":
+            export(docs, sys.stdout, fmt, fields, progress)
+        else:
+            with open(args.export, "w", newline="", encoding="utf-8") as out:
+                export(docs, out, fmt, fields, progress)
+        progress.report(final=True)
+    return 0
+
+
 if __name__ == "__main__":
-    print("\n🚀 Connecting to MongoDB...")
-    main()
+    print("\n🚀 Connecting to MongoDB...", file=sys.stderr)
+    sys.exit(main())